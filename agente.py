@@ -3,37 +3,31 @@
 # --- Imports ---
 import sqlite3 # Usado para conexão local
 import pandas as pd
-import traceback
 import re
 import os # Para getenv e paths locais
-from langchain.tools import tool
+from typing import Literal # Valores aceitos nos parâmetros das ferramentas (vira 'enum' no esquema enviado ao LLM)
+import time
+from langchain_core.tools import tool # Mesmo decorador de langchain.tools, sem importar o pacote langchain inteiro
 from datetime import datetime, date # Adicionado date
 import base64 # Para embutir imagens no HTML
 import io # Para gerar imagens em memória
-
-# Imports Langchain Core / OpenAI / Community
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.utilities import SQLDatabase
-from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
-from langchain_community.vectorstores import Chroma
-from langchain.tools.retriever import create_retriever_tool
-import chromadb
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory, ConversationBufferWindowMemory
-
-# Import para gráficos (precisa instalar: pip install plotly kaleido)
-try:
-    import plotly.express as px
-    import plotly.io as pio # <<< ADICIONADO IMPORT DE pio
-except ImportError:
-    print("--- AVISO: Biblioteca 'plotly' não encontrada. Gráficos não funcionarão. Instale com 'pip install plotly kaleido' ---")
-    px = None
-    pio = None # Define pio como None se o import falhar
+from conexao_sqlite import conexao_leitura, versao_banco # Pool de conexões de leitura (PRAGMAs de leitura, reuso entre consultas)
+from cache_consultas import CacheResultados # Cache dos resultados, invalidado quando o banco muda
+from motor_colunar import obter_motor # Métricas em arrays NumPy na memória (opcional, recarrega a cada carga)
+from registro_recursos import registro # Recursos pesados do processo, compartilhados entre as sessões
+from artefatos import guardar_artefato # Relatório HTML fica no armazém da sessão; a conversa recebe só a referência
+from rastreamento import obter_logger, rastrear, rastreador, anotar, resumir_sql # Logging por nível + spans (turno, llm, ferramenta, sql, gráfico)
+from sql_protegido import executar_sql_protegido # SQL livre do LLM: só leitura, custo/tempo/linhas limitados
+
+# LangChain (OpenAI, agentes, Chroma) e plotly são importados só nas fábricas abaixo
+# (obter_llm, obter_agente, obter_ferramentas, obter_plotly): importar este módulo para usar
+# uma função auxiliar não carrega nada disso. aquecer() constrói tudo de uma vez.
 
 # Para variáveis de ambiente (MELHOR PRÁTICA LOCAL)
 from dotenv import load_dotenv
 
+log = obter_logger("agente")
+
 # --- Constantes Locais ---
 NOME_BANCO_SQLITE = 'meus_dados.db' # Caminho relativo para o arquivo local
 NOME_TABELA_PRINCIPAL_SQL = 'minha_tabela_principal'
@@ -41,17 +35,14 @@ NOME_COLECAO_CHROMA = 'minha_colecao_textos'
 CHROMA_DB_PATH_LOCAL = "./chroma_db_storage" # Caminho relativo local
 
 # --- Constantes das Colunas ---
-REGIME_COL = 'servico_regime' # <<< NOVA CONSTANTE PARA O FILTRO >>>
-SALES_VALUE_COL = 'valor_venda_total'; SALES_DATE_COL = 'data_recebimento_po'
-BM_LIBERACAO_COL = 'data_liberacao_bm'; BM_DATE_COL = 'data_envio_relatorios'
-REPORT_ENVIO_COL = 'data_envio_relatorios'; REPORT_DATE_COL = 'data_final_atendimento'
-FAT_DATE_COL = 'data_faturamento'; FAT_STATUS_COL = 'atendimento_andamento'
-FAT_GROSS_VALUE_COL = 'valor_venda_total'; FAT_NET_VALUE_COL = 'valor_venda_servico_desc'
-FAT_VALID_STATUSES = "'Falta Recebimento', 'Finalizado Com Faturamento'"
-# Condições base (serão combinadas com o filtro de regime)
-FAT_BASE_CONDITIONS_LIST = [f"{FAT_DATE_COL} IS NOT NULL", f"{FAT_STATUS_COL} IN ({FAT_VALID_STATUSES})"]
-REPORT_PENDING_CONDITION_LIST = [f"{REPORT_ENVIO_COL} IS NULL"]
-BM_PENDING_CONDITION_LIST = [f"{BM_LIBERACAO_COL} IS NULL", f"{BM_DATE_COL} IS NOT NULL"]
+# Definidas em consultas_metricas.py (montagem das consultas com parâmetros)
+from consultas_metricas import (
+    REGIME_COL, SALES_VALUE_COL, SALES_DATE_COL, BM_LIBERACAO_COL, BM_DATE_COL, REPORT_ENVIO_COL, REPORT_DATE_COL,
+    FAT_DATE_COL, FAT_STATUS_COL, FAT_GROSS_VALUE_COL, FAT_NET_VALUE_COL, FAT_VALID_STATUSES,
+    FAT_BASE_CONDITIONS_LIST, REPORT_PENDING_CONDITION_LIST, BM_PENDING_CONDITION_LIST,
+    NOME_TABELA_CUBO, consulta_metrica, consulta_metrica_cubo, montar_where, normalizar_regime, resolver_mes, MESES_PT,
+    CONSULTA_RELATORIO_GERENCIAL, params_relatorio_gerencial,
+)
 
 
 # --- Carregamento da Chave API (Local via .env) ---
@@ -59,21 +50,24 @@ load_dotenv() # Carrega variáveis do arquivo .env local
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 if not OPENAI_API_KEY:
-    print("--- ERRO CRÍTICO: Chave API OpenAI não encontrada no arquivo .env! ---")
-    print("Certifique-se de que existe um arquivo '.env' na pasta Zero com a linha:")
-    print('OPENAI_API_KEY="sua_chave_api_aqui"')
+    log.error("Chave API OpenAI não encontrada no arquivo .env! Crie um arquivo '.env' na pasta Zero com a linha: OPENAI_API_KEY=\"sua_chave_api_aqui\"")
 
 
 # --- Funções de Execução SQL (Usando sqlite3 Local) ---
-def execute_direct_sql(query: str) -> float | int | str | None:
-    """ Executa SQL local que retorna uma única célula (SUM, COUNT). """
-    conn = None
+# Os dados só mudam quando o organizador_dados.py roda: resultados repetidos vêm do cache
+cache_resultados = CacheResultados(versao_banco)
+
+@rastrear('sql')
+def execute_direct_sql(query: str, params: tuple | list | dict = ()) -> float | int | str | None:
+    """ Executa SQL local que retorna uma única célula (SUM, COUNT). Valores entram como parâmetros (?). """
     try:
-        conn = sqlite3.connect(NOME_BANCO_SQLITE) # Conecta ao DB local
-        cursor = conn.cursor()
-        cursor.execute(query)
-        result = cursor.fetchone()
-        conn.close() # Fecha conexão após uso
+        chave_cache = cache_resultados.chave(query, params)
+        encontrado, result = cache_resultados.obter(chave_cache)
+        if not encontrado:
+            with conexao_leitura() as conn: # Conexão reaproveitada do pool (ver conexao_sqlite.py)
+                result = conn.execute(query, params).fetchone()
+            cache_resultados.guardar(chave_cache, result)
+        anotar(cache='acerto' if encontrado else 'falha', linhas=1 if result else 0)
         if result and result[0] is not None:
             try:
                 if isinstance(result[0], str) and '.' in result[0]: return float(result[0])
@@ -86,45 +80,86 @@ def execute_direct_sql(query: str) -> float | int | str | None:
         else:
             return 0 if "COUNT" in query.upper() else 0.0
     except sqlite3.Error as e:
-        error_msg = f"Erro SQL Local: {e}"; print(f"DEBUG LOCAL SQL ERROR (direct): {error_msg}\nQuery: {query}"); return error_msg
+        error_msg = f"Erro SQL Local: {e}"; log.error("SQL (direct): %s | Query: %s | Params: %s", error_msg, query, params); anotar(erro=error_msg); return error_msg
     except Exception as e:
-        error_msg = f"Erro inesperado (direct_sql local): {e}"; print(f"DEBUG LOCAL UNEXPECTED ERROR (direct): {error_msg}\nQuery: {query}"); traceback.print_exc(); return error_msg
-    finally: # Garante fechamento mesmo se try falhar antes
-        if conn:
-            try: conn.close()
-            except Exception: pass
-
-def execute_query_fetch_all(query: str) -> pd.DataFrame | str:
-    """ Executa SQL local e retorna todos os resultados como DataFrame. """
-    conn = None
+        error_msg = f"Erro inesperado (direct_sql local): {e}"; log.exception("Erro inesperado (direct): %s | Query: %s", error_msg, query); anotar(erro=error_msg); return error_msg
+
+@rastrear('sql')
+def execute_query_fetch_all(query: str, params: tuple | list | dict = ()) -> pd.DataFrame | str:
+    """ Executa SQL local e retorna todos os resultados como DataFrame. Valores entram como parâmetros (?). """
     try:
-        conn = sqlite3.connect(NOME_BANCO_SQLITE) # Conecta ao DB local
-        df = pd.read_sql_query(query, conn)
-        conn.close() # Fecha conexão após uso
+        chave_cache = cache_resultados.chave(query, params)
+        encontrado, df = cache_resultados.obter(chave_cache)
+        if not encontrado:
+            with conexao_leitura() as conn: # Conexão reaproveitada do pool (ver conexao_sqlite.py)
+                df = pd.read_sql_query(query, conn, params=params if isinstance(params, dict) else list(params))
+            cache_resultados.guardar(chave_cache, df)
+        anotar(cache='acerto' if encontrado else 'falha', linhas=len(df))
         return df
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        error_msg = f"Erro SQL Local (fetch all): {e}"; log.error("SQL (fetch all): %s | Query: %s | Params: %s", error_msg, query, params); anotar(erro=error_msg); return error_msg
+    except Exception as e:
+        error_msg = f"Erro inesperado (fetch all local): {e}"; log.exception("Erro inesperado (fetch all): %s | Query: %s", error_msg, query); anotar(erro=error_msg); return error_msg
+
+@rastrear('sql')
+def execute_query_fetch_rows(query: str, params: tuple | list | dict = ()) -> list[tuple] | str:
+    """ Executa SQL local e retorna as linhas como tuplas (tipos do SQLite, sem passar pelo pandas). """
+    try:
+        chave_cache = cache_resultados.chave(query, params)
+        encontrado, rows = cache_resultados.obter(chave_cache)
+        if not encontrado:
+            with conexao_leitura() as conn: # Conexão reaproveitada do pool (ver conexao_sqlite.py)
+                rows = conn.execute(query, params).fetchall()
+            cache_resultados.guardar(chave_cache, rows)
+        anotar(cache='acerto' if encontrado else 'falha', linhas=len(rows))
+        return list(rows)
     except sqlite3.Error as e:
-        error_msg = f"Erro SQL Local (fetch all): {e}"; print(f"DEBUG LOCAL SQL ERROR (fetch all): {error_msg}\nQuery: {query}"); return error_msg
+        error_msg = f"Erro SQL Local (fetch rows): {e}"; log.error("SQL (fetch rows): %s | Query: %s | Params: %s", error_msg, query, params); anotar(erro=error_msg); return error_msg
     except Exception as e:
-        error_msg = f"Erro inesperado (fetch all local): {e}"; print(f"DEBUG LOCAL UNEXPECTED ERROR (fetch all): {error_msg}\nQuery: {query}"); traceback.print_exc(); return error_msg
-    finally: # Garante fechamento
-        if conn:
-            try: conn.close()
-            except Exception: pass
-
-# --- Helper Function for WHERE clause ---
-def build_where_clause(base_conditions: list[str], regime: str | None = None) -> tuple[str, str]:
-    """Constrói a cláusula WHERE combinando condições base e filtro de regime opcional."""
-    conditions = list(base_conditions) # Cria cópia
-    regime_label = ""
-    safe_regime = None
-    if regime:
-        test_regime = regime.strip().capitalize()
-        if test_regime in ['Naval', 'Offshore']:
-            safe_regime = test_regime
-            conditions.append(f"{REGIME_COL} = '{safe_regime}'")
-            regime_label = f"{safe_regime} "
-    if not conditions: return "", regime_label
-    else: return "WHERE " + " AND ".join(conditions), regime_label
+        error_msg = f"Erro inesperado (fetch rows local): {e}"; log.exception("Erro inesperado (fetch rows): %s | Query: %s", error_msg, query); anotar(erro=error_msg); return error_msg
+
+# --- Consultas de Métricas (cubo pré-agregado, com a tabela principal como reserva) ---
+def metrics_cube_available() -> bool:
+    """True se o banco tem o cubo_metricas (criado pelo organizador_dados.py). Resultado fica no cache até a próxima carga."""
+    result = execute_direct_sql("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (NOME_TABELA_CUBO,))
+    return result == 1
+
+def _execute_metric(executor, metrica: str, periodo: str, regime: str | None, ano: int | None, mes: int | None):
+    if metrics_cube_available():
+        sql, params = consulta_metrica_cubo(metrica, periodo, regime, ano=ano, mes=mes)
+        result = executor(sql, params)
+        if not isinstance(result, str): return result
+        log.warning("Falha ao consultar o cubo de métricas; usando a tabela principal.")
+    sql, params = consulta_metrica(metrica, periodo, regime, ano=ano, mes=mes)
+    return executor(sql, params)
+
+def execute_metric_value(metrica: str, periodo: str, regime: str | None = None, ano: int | None = None, mes: int | None = None):
+    """Valor único (SUM/COUNT) de uma métrica; mesmo retorno de execute_direct_sql."""
+    motor = obter_motor()
+    if motor is not None:
+        try: return motor.valor(metrica, periodo, regime, ano=ano, mes=mes)
+        except Exception as e_motor: log.warning("Falha no motor colunar (%s); usando o SQLite.", e_motor)
+    return _execute_metric(execute_direct_sql, metrica, periodo, regime, ano, mes)
+
+def execute_metric_table(metrica: str, regime: str | None = None) -> pd.DataFrame | str:
+    """Métrica agrupada por mês (colunas Mes, Total); mesmo retorno de execute_query_fetch_all."""
+    motor = obter_motor()
+    if motor is not None:
+        try: return motor.tabela_por_mes(metrica, regime)
+        except Exception as e_motor: log.warning("Falha no motor colunar (%s); usando o SQLite.", e_motor)
+    return _execute_metric(execute_query_fetch_all, metrica, 'por_mes', regime, None, None)
+
+# --- Helper Functions for WHERE clause ---
+def resolve_regime_filter(regime: str | None = None) -> tuple[str | None, str]:
+    """Normaliza o regime ('Naval'/'Offshore' ou None) e devolve também o rótulo usado nas respostas."""
+    safe_regime = normalizar_regime(regime)
+    return safe_regime, (f"{safe_regime} " if safe_regime else "")
+
+def build_where_clause(base_conditions: list[str], regime: str | None = None) -> tuple[str, str, list]:
+    """Constrói a cláusula WHERE combinando condições base e filtro de regime opcional (como parâmetro '?')."""
+    safe_regime, regime_label = resolve_regime_filter(regime)
+    where_clause, params = montar_where(base_conditions, safe_regime)
+    return where_clause, regime_label, params
 
 # --- Helper Function for Currency Formatting ---
 def format_currency_brl(value) -> str:
@@ -149,7 +184,7 @@ def get_agent_capabilities() -> str:
     'no que você é útil', 'suas habilidades', 'listar funções', 'capacidades'.
     NÃO usar para nenhum outro tipo de pergunta ou saudação. Apenas descreve capacidades.
     """
-    print("--- DEBUG: [Tool Called] get_agent_capabilities ---")
+    log.debug("[Tool Called] get_agent_capabilities")
     capabilities = """
     Olá! Eu sou a Marina, sua assistente de dados da Supply Marine. Minhas principais funções são:
 
@@ -166,360 +201,131 @@ def get_agent_capabilities() -> str:
     return capabilities.strip()
 
 
-# --- Ferramentas de Vendas (Com regime) ---
-@tool
-def get_total_sales_overall(regime: str | None = None) -> str:
-    """Calcula o valor total GERAL de vendas, opcionalmente filtrado por regime (Naval/Offshore). Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_total_sales_overall (Regime: {regime}) ---")
-    base_conditions = [f"{SALES_DATE_COL} IS NOT NULL"]
-    where_clause, regime_label = build_where_clause(base_conditions, regime)
-    sql = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-    result = execute_direct_sql(sql)
-    value = result if isinstance(result, (int, float)) else 0.0
-    if isinstance(result, str): return f"Erro ao calcular total geral de vendas {regime_label}: {result}"
-    else: return f"O total geral de vendas {regime_label}(baseado na data de recebimento da PO) é {format_currency_brl(value)}"
-
-@tool
-def get_total_sales_for_year(year: int, regime: str | None = None) -> str:
-    """Calcula o valor total de vendas para um ANO específico, opcionalmente filtrado por regime (Naval/Offshore). Args: year (int): O ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_total_sales_for_year (Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); start_date = f"{year}-01-01"; end_date = f"{year+1}-01-01"
-        base_conditions = [f"{SALES_DATE_COL} >= '{start_date}'", f"{SALES_DATE_COL} < '{end_date}'", f"{SALES_DATE_COL} IS NOT NULL"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-        result = execute_direct_sql(sql)
-        value = result if isinstance(result, (int, float)) else 0.0
-        if isinstance(result, str): return f"Erro ao calcular vendas {regime_label}para {year}: {result}"
-        else: return f"O total de vendas {regime_label}para {year} foi {format_currency_brl(value)}"
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar vendas anuais {regime_label}para {year}: {e}"
-
-@tool
-def get_total_sales_for_month_year(month_input: str, year: int, regime: str | None = None) -> str:
-    """Calcula o valor total de vendas para um MÊS e ANO específicos, opcionalmente filtrado por regime (Naval/Offshore). Args: month_input (str): Mês (nome/número). year (int): Ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_total_sales_for_month_year (Mês: {month_input}, Ano: {year}, Regime: {regime}) ---")
+# --- Ferramenta de Métricas (Vendas, BMs, Relatórios Pendentes, Faturamento; com regime) ---
+# Uma ferramenta só, parametrizada, para todas as métricas: o esquema (nome, descrição e
+# parâmetros) de cada ferramenta vai em toda chamada ao LLM, então menos ferramentas = prompt menor.
+# Por métrica: (sucesso, erro) de cada período, nome usado nas mensagens e coluna da tabela mensal.
+METRIC_TEXTS = {
+    'vendas': {
+        'nome': 'vendas', 'resumo': 'das vendas', 'coluna': 'Vendas_no_Mês', 'moeda': True,
+        'anual': 'vendas anuais', 'mensal': 'vendas mensais',
+        'total': ("O total geral de vendas {regime_label}(baseado na data de recebimento da PO) é {valor}",
+                  "Erro ao calcular total geral de vendas {regime_label}: {erro}"),
+        'ano': ("O total de vendas {regime_label}para {year} foi {valor}",
+                "Erro ao calcular vendas {regime_label}para {year}: {erro}"),
+        'mes': ("O total de vendas {regime_label}para {mes} de {year} foi {valor}",
+                "Erro ao calcular vendas {regime_label}para {mes}/{year}: {erro}"),
+    },
+    'bms_pendentes': {
+        'nome': 'BMs pendentes', 'resumo': 'de BMs pendentes', 'coluna': 'Qtd_Pendentes', 'moeda': False,
+        'anual': 'BMs pendentes', 'mensal': 'BMs pendentes',
+        'total': ("O número total de BMs pendentes {regime_label}é: {valor}",
+                  "Não foi possível calcular o total de BMs pendentes {regime_label}. Erro: {erro}"),
+        'ano': ("O número de BMs pendentes {regime_label}para o ano {year} é: {valor}",
+                "Não foi possível calcular BMs pendentes {regime_label}para {year}. Erro: {erro}"),
+        'mes': ("O número de BMs pendentes {regime_label}para {mes} de {year} é: {valor}",
+                "Não foi possível calcular BMs pendentes {regime_label}para {mes}/{year}. Erro: {erro}"),
+    },
+    'relatorios_pendentes': {
+        'nome': 'relatórios pendentes', 'resumo': 'de relatórios pendentes', 'coluna': 'Qtd_Pendentes', 'moeda': False,
+        'anual': 'relatórios pendentes', 'mensal': 'relatórios pendentes',
+        'total': ("O número total de relatórios pendentes {regime_label}de envio é: {valor}",
+                  "Não foi possível calcular o total de relatórios pendentes {regime_label}. Erro: {erro}"),
+        'ano': ("O número de relatórios pendentes {regime_label}para o ano {year} é: {valor}",
+                "Não foi possível calcular relatórios pendentes {regime_label}para {year}. Erro: {erro}"),
+        'mes': ("O número de relatórios pendentes {regime_label}para {mes} de {year} é: {valor}",
+                "Não foi possível calcular relatórios pendentes {regime_label}para {mes}/{year}. Erro: {erro}"),
+    },
+    'faturamento_bruto': {
+        'nome': 'faturamento bruto', 'resumo': 'do faturamento bruto', 'coluna': 'Faturamento_Bruto', 'moeda': True,
+        'anual': 'faturamento bruto anual', 'mensal': 'faturamento bruto mensal',
+        'total': ("O faturamento bruto total {regime_label}é {valor}",
+                  "Erro ao calcular faturamento bruto total {regime_label}: {erro}"),
+        'ano': ("O faturamento bruto {regime_label}para {year} foi {valor}",
+                "Erro ao calcular faturamento bruto {regime_label}para {year}: {erro}"),
+        'mes': ("O faturamento bruto {regime_label}para {mes} de {year} foi {valor}",
+                "Erro ao calcular faturamento bruto {regime_label}para {mes}/{year}: {erro}"),
+    },
+    'faturamento_liquido': {
+        'nome': 'faturamento líquido', 'resumo': 'do faturamento líquido', 'coluna': 'Faturamento_Liquido', 'moeda': True,
+        'anual': 'faturamento líquido anual', 'mensal': 'faturamento líquido mensal',
+        'total': ("O faturamento líquido total {regime_label}é {valor}",
+                  "Erro ao calcular faturamento líquido total {regime_label}: {erro}"),
+        'ano': ("O faturamento líquido {regime_label}para {year} foi {valor}",
+                "Erro ao calcular faturamento líquido {regime_label}para {year}: {erro}"),
+        'mes': ("O faturamento líquido {regime_label}para {mes} de {year} foi {valor}",
+                "Erro ao calcular faturamento líquido {regime_label}para {mes}/{year}: {erro}"),
+    },
+}
+
+def format_metric_value(metrica: str, periodo: str, regime_label: str, result, year: int | None = None, mes: str | None = None) -> str:
+    """Texto de resposta de um valor (SUM em R$ ou COUNT) já calculado por execute_metric_value."""
+    texts = METRIC_TEXTS[metrica]
+    sucesso, erro = texts[periodo]
+    if isinstance(result, str): return erro.format(regime_label=regime_label, year=year, mes=mes, erro=result)
+    if texts['moeda']: valor = format_currency_brl(result if isinstance(result, (int, float)) else 0.0)
+    else: valor = result if isinstance(result, int) else 0
+    return sucesso.format(regime_label=regime_label, year=year, mes=mes, valor=valor)
+
+def metric_value_answer(metrica: str, regime: str | None = None, year=None, month_input=None) -> str:
+    """Total geral, do ano (year) ou do mês (month_input + year) de uma métrica, já formatado."""
+    texts = METRIC_TEXTS[metrica]
+    regime, regime_label = resolve_regime_filter(regime)
+    periodo = 'total' if year is None else ('ano' if month_input is None else 'mes')
+    if periodo == 'total':
+        return format_metric_value(metrica, 'total', regime_label, execute_metric_value(metrica, 'total', regime))
     try:
-        year = int(year); months_map = {'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04', 'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09', 'outubro': '10', 'novembro': '11', 'dezembro': '12'}
-        month_num_str_input = str(month_input).lower().strip(); month_num = months_map.get(month_num_str_input) or (month_num_str_input if month_num_str_input.isdigit() else None)
-        if month_num and 1 <= int(month_num) <= 12:
-            month_num_str = f"{int(month_num):02d}"; next_month_year = year; next_month_num = int(month_num_str) + 1
-            if next_month_num > 12: next_month_num = 1; next_month_year += 1
-            start_date = f"{year}-{month_num_str}-01"; end_date = f"{next_month_year:04d}-{next_month_num:02d}-01"
-            base_conditions = [f"{SALES_DATE_COL} >= '{start_date}'", f"{SALES_DATE_COL} < '{end_date}'", f"{SALES_DATE_COL} IS NOT NULL"]
-            where_clause, regime_label = build_where_clause(base_conditions, regime)
-            sql = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-            result = execute_direct_sql(sql)
-            value = result if isinstance(result, (int, float)) else 0.0
-            display_month = next((k for k, v in months_map.items() if v == month_num_str), month_num_str)
-            if isinstance(result, str): return f"Erro ao calcular vendas {regime_label}para {display_month.capitalize()}/{year}: {result}"
-            else: return f"O total de vendas {regime_label}para {display_month.capitalize()} de {year} foi {format_currency_brl(value)}"
-        else: return f"Mês inválido fornecido: '{month_input}'."
+        year = int(year)
+        if periodo == 'ano':
+            return format_metric_value(metrica, 'ano', regime_label, execute_metric_value(metrica, 'ano', regime, ano=year), year=year)
+        month_num = resolver_mes(month_input)
+        if month_num is None: return f"Mês inválido fornecido: '{month_input}'."
+        display_month = next(nome for nome, numero in MESES_PT.items() if numero == month_num).capitalize()
+        result = execute_metric_value(metrica, 'mes', regime, ano=year, mes=month_num)
+        return format_metric_value(metrica, 'mes', regime_label, result, year=year, mes=display_month)
     except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar vendas mensais {regime_label}para {month_input}/{year}: {e}"
-
-@tool
-def get_sales_per_month_dataframe(regime: str | None = None) -> str:
-    """Busca o total de vendas AGRUPADO POR MÊS, opcionalmente filtrado por regime (Naval/Offshore). Retorna tabela markdown. Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_sales_per_month_dataframe (Regime: {regime}) ---")
-    try:
-        grouping_date_col = SALES_DATE_COL; date_format_func = "strftime('%Y-%m', {date_col})"
-        base_conditions = [f"{grouping_date_col} IS NOT NULL"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT {date_format_func.format(date_col=grouping_date_col)} AS Mes, SUM({SALES_VALUE_COL}) AS Total_Vendas_Mes FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause} GROUP BY Mes ORDER BY Mes;"
-        df_result = execute_query_fetch_all(sql)
-        if isinstance(df_result, pd.DataFrame):
-            if not df_result.empty:
-                if 'Total_Vendas_Mes' in df_result.columns:
-                    try: df_result['Total_Vendas_Mes_fmt'] = df_result['Total_Vendas_Mes'].apply(format_currency_brl)
-                    except Exception: df_result['Total_Vendas_Mes_fmt'] = 'Erro fmt'
-                else: df_result['Total_Vendas_Mes_fmt'] = 'N/A'
-                df_display = df_result[['Mes', 'Total_Vendas_Mes_fmt']].rename(columns={'Total_Vendas_Mes_fmt': 'Vendas_no_Mês'})
-                markdown_table = df_display.to_markdown(index=False)
-                return f"Aqui está o resumo das vendas {regime_label}por mês:\n{markdown_table}"
-            else: return f"Não encontrei dados de vendas {regime_label}para agrupar por mês."
-        else: return f"Erro ao buscar vendas {regime_label}por mês: {df_result}"
     except Exception as e:
-        error_type = type(e).__name__; error_details = str(e); print(f"--- ERRO DETALHADO (LOCAL) [get_sales_per_month_dataframe]: {error_type}: {error_details} ---"); traceback.print_exc(); print(f"---")
-        return f"Desculpe, ocorreu um erro interno ({error_type}) ao processar 'Vendas {regime_label}por mês'. Verifique os logs."
-
-# --- Ferramentas de BMs Pendentes (Com regime) ---
-@tool
-def get_pending_bms_total(regime: str | None = None) -> str:
-    """Calcula a quantidade TOTAL GERAL de BMs 'pendentes', opcionalmente filtrado por regime (Naval/Offshore). Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_bms_total (Regime: {regime}) ---")
-    where_clause, regime_label = build_where_clause(BM_PENDING_CONDITION_LIST, regime)
-    sql = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-    result = execute_direct_sql(sql)
-    value = result if isinstance(result, int) else 0
-    if isinstance(result, str): return f"Não foi possível calcular o total de BMs pendentes {regime_label}. Erro: {result}"
-    else: return f"O número total de BMs pendentes {regime_label}é: {value}"
-
-@tool
-def get_pending_bms_for_year(year: int, regime: str | None = None) -> str:
-    """Calcula a quantidade de BMs 'pendentes' para um ANO específico, opcionalmente filtrado por regime (Naval/Offshore). Args: year (int): O ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_bms_for_year (Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); start_date = f"{year}-01-01"; end_date = f"{year+1}-01-01"; filter_date_col = BM_DATE_COL
-        base_conditions = BM_PENDING_CONDITION_LIST + [f"{filter_date_col} >= '{start_date}'", f"{filter_date_col} < '{end_date}'"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-        result = execute_direct_sql(sql)
-        value = result if isinstance(result, int) else 0
-        if isinstance(result, str): return f"Não foi possível calcular BMs pendentes {regime_label}para {year}. Erro: {result}"
-        else: return f"O número de BMs pendentes {regime_label}para o ano {year} é: {value}"
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar BMs pendentes {regime_label}para {year}: {e}"
-
-@tool
-def get_pending_bms_per_month(regime: str | None = None) -> str:
-    """Busca a quantidade de BMs 'pendentes' AGRUPADOS POR MÊS, opcionalmente filtrado por regime (Naval/Offshore). Retorna tabela markdown. Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_bms_per_month (Regime: {regime}) ---")
-    try:
-        grouping_date_col = BM_DATE_COL; date_format_func = "strftime('%Y-%m', {date_col})"
-        base_conditions = BM_PENDING_CONDITION_LIST + [f"{grouping_date_col} IS NOT NULL"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT {date_format_func.format(date_col=grouping_date_col)} AS Mes, COUNT(*) AS Total_Pendentes_No_Mes FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause} GROUP BY Mes ORDER BY Mes;"
-        df_result = execute_query_fetch_all(sql)
-        if isinstance(df_result, pd.DataFrame):
-            if not df_result.empty:
-                df_result = df_result.rename(columns={'Total_Pendentes_No_Mes': 'Qtd_Pendentes'})
-                markdown_table = df_result.to_markdown(index=False)
-                return f"Aqui está o resumo de BMs pendentes {regime_label}por mês:\n{markdown_table}"
-            else: return f"Não encontrei dados de BMs pendentes {regime_label}para agrupar por mês."
-        else: return f"Erro ao buscar BMs pendentes {regime_label}por mês: {df_result}"
-    except Exception as e:
-        error_type = type(e).__name__; error_details = str(e); print(f"--- ERRO DETALHADO (LOCAL) [get_pending_bms_per_month]: {error_type}: {error_details} ---"); traceback.print_exc(); print(f"---")
-        return f"Desculpe, ocorreu um erro interno ({error_type}) ao processar 'BMs pendentes {regime_label}por mês'. Verifique os logs."
-
-# --- FIM DA PARTE 1 ---
-# agente.py (PARTE 2 de 4) - Cole após o final da Parte 1
-
-# --- Ferramentas de Relatórios Pendentes (Com regime) ---
-@tool
-def get_pending_reports_total(regime: str | None = None) -> str:
-    """Calcula a quantidade TOTAL GERAL de relatórios 'pendentes de envio', opcionalmente filtrado por regime (Naval/Offshore). Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_reports_total (Regime: {regime}) ---")
-    where_clause, regime_label = build_where_clause(REPORT_PENDING_CONDITION_LIST, regime)
-    sql = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-    result = execute_direct_sql(sql)
-    value = result if isinstance(result, int) else 0
-    if isinstance(result, str): return f"Não foi possível calcular o total de relatórios pendentes {regime_label}. Erro: {result}"
-    else: return f"O número total de relatórios pendentes {regime_label}de envio é: {value}"
-
-@tool
-def get_pending_reports_for_year(year: int, regime: str | None = None) -> str:
-    """Calcula a quantidade de relatórios 'pendentes de envio' para um ANO específico, opcionalmente filtrado por regime (Naval/Offshore). Args: year (int): O ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_reports_for_year (Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); start_date = f"{year}-01-01"; end_date = f"{year+1}-01-01"; filter_date_col = REPORT_DATE_COL
-        base_conditions = REPORT_PENDING_CONDITION_LIST + [f"{filter_date_col} IS NOT NULL", f"{filter_date_col} >= '{start_date}'", f"{filter_date_col} < '{end_date}'"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-        result = execute_direct_sql(sql)
-        value = result if isinstance(result, int) else 0
-        if isinstance(result, str): return f"Não foi possível calcular relatórios pendentes {regime_label}para {year}. Erro: {result}"
-        else: return f"O número de relatórios pendentes {regime_label}para o ano {year} é: {value}"
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar relatórios pendentes {regime_label}para {year}: {e}"
-
-@tool
-def get_pending_reports_for_month_year(month_input: str, year: int, regime: str | None = None) -> str:
-    """Calcula a quantidade de relatórios 'pendentes de envio' para um MÊS e ANO específicos, opcionalmente filtrado por regime (Naval/Offshore). Args: month_input (str): Mês (nome/número). year (int): Ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_reports_for_month_year (Mês: {month_input}, Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); months_map = {'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04', 'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09', 'outubro': '10', 'novembro': '11', 'dezembro': '12'}
-        month_num_str_input = str(month_input).lower().strip(); month_num = months_map.get(month_num_str_input) or (month_num_str_input if month_num_str_input.isdigit() else None)
-        if month_num and 1 <= int(month_num) <= 12:
-            month_num_str = f"{int(month_num):02d}"; next_month_year = year; next_month_num = int(month_num_str) + 1
-            if next_month_num > 12: next_month_num = 1; next_month_year += 1
-            start_date = f"{year}-{month_num_str}-01"; end_date = f"{next_month_year:04d}-{next_month_num:02d}-01"; filter_date_col = REPORT_DATE_COL
-            base_conditions = REPORT_PENDING_CONDITION_LIST + [f"{filter_date_col} IS NOT NULL", f"{filter_date_col} >= '{start_date}'", f"{filter_date_col} < '{end_date}'"]
-            where_clause, regime_label = build_where_clause(base_conditions, regime)
-            sql = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-            result = execute_direct_sql(sql)
-            value = result if isinstance(result, int) else 0
-            display_month = next((k for k, v in months_map.items() if v == month_num_str), month_num_str)
-            if isinstance(result, str): return f"Não foi possível calcular relatórios pendentes {regime_label}para {display_month.capitalize()}/{year}. Erro: {result}"
-            else: return f"O número de relatórios pendentes {regime_label}para {display_month.capitalize()} de {year} é: {value}"
-        else: return f"Mês inválido fornecido: '{month_input}'."
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar relatórios pendentes {regime_label}para {month_input}/{year}: {e}"
-
-@tool
-def get_pending_reports_per_month(regime: str | None = None) -> str:
-    """Busca a quantidade de relatórios 'pendentes de envio' AGRUPADOS POR MÊS, opcionalmente filtrado por regime (Naval/Offshore). Retorna tabela markdown. Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_pending_reports_per_month (Regime: {regime}) ---")
-    try:
-        grouping_date_col = REPORT_DATE_COL; date_format_func = "strftime('%Y-%m', {date_col})"
-        base_conditions = REPORT_PENDING_CONDITION_LIST + [f"{grouping_date_col} IS NOT NULL"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT {date_format_func.format(date_col=grouping_date_col)} AS Mes, COUNT(*) AS Total_RP_No_Mes FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause} GROUP BY Mes ORDER BY Mes;"
-        df_result = execute_query_fetch_all(sql)
-        if isinstance(df_result, pd.DataFrame):
-            if not df_result.empty:
-                df_result = df_result.rename(columns={'Total_RP_No_Mes': 'Qtd_Pendentes'})
-                markdown_table = df_result.to_markdown(index=False)
-                return f"Aqui está o resumo de relatórios pendentes {regime_label}por mês:\n{markdown_table}"
-            else: return f"Não encontrei dados de relatórios pendentes {regime_label}para agrupar por mês."
-        else: return f"Erro ao buscar relatórios pendentes {regime_label}por mês: {df_result}"
-    except Exception as e:
-        error_type = type(e).__name__; error_details = str(e); print(f"--- ERRO DETALHADO (LOCAL) [get_pending_reports_per_month]: {error_type}: {error_details} ---"); traceback.print_exc(); print(f"---")
-        return f"Desculpe, ocorreu um erro interno ({error_type}) ao processar 'Relatórios pendentes {regime_label}por mês'. Verifique os logs."
-
-# --- Ferramentas de Faturamento (Com regime) ---
-@tool
-def get_gross_revenue_total(regime: str | None = None) -> str:
-    """Calcula o Faturamento BRUTO total geral, opcionalmente filtrado por regime (Naval/Offshore). Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_gross_revenue_total (Regime: {regime}) ---")
-    where_clause, regime_label = build_where_clause(FAT_BASE_CONDITIONS_LIST, regime)
-    sql = f"SELECT SUM({FAT_GROSS_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-    result = execute_direct_sql(sql)
-    value = result if isinstance(result, (int, float)) else 0.0
-    if isinstance(result, str): return f"Erro ao calcular faturamento bruto total {regime_label}: {result}"
-    else: return f"O faturamento bruto total {regime_label}é {format_currency_brl(value)}"
-
-@tool
-def get_gross_revenue_for_year(year: int, regime: str | None = None) -> str:
-    """Calcula o Faturamento BRUTO para um ANO específico, opcionalmente filtrado por regime (Naval/Offshore). Args: year (int): O ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_gross_revenue_for_year (Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); start_date = f"{year}-01-01"; end_date = f"{year+1}-01-01"
-        base_conditions = FAT_BASE_CONDITIONS_LIST + [f"{FAT_DATE_COL} >= '{start_date}'", f"{FAT_DATE_COL} < '{end_date}'"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT SUM({FAT_GROSS_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-        result = execute_direct_sql(sql)
-        value = result if isinstance(result, (int, float)) else 0.0
-        if isinstance(result, str): return f"Erro ao calcular faturamento bruto {regime_label}para {year}: {result}"
-        else: return f"O faturamento bruto {regime_label}para {year} foi {format_currency_brl(value)}"
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar faturamento bruto anual {regime_label}para {year}: {e}"
-
-@tool
-def get_gross_revenue_for_month_year(month_input: str, year: int, regime: str | None = None) -> str:
-    """Calcula o Faturamento BRUTO para um MÊS e ANO específicos, opcionalmente filtrado por regime (Naval/Offshore). Args: month_input (str): Mês (nome/número). year (int): Ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_gross_revenue_for_month_year (Mês: {month_input}, Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); months_map = {'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04', 'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09', 'outubro': '10', 'novembro': '11', 'dezembro': '12'}
-        month_num_str_input = str(month_input).lower().strip(); month_num = months_map.get(month_num_str_input) or (month_num_str_input if month_num_str_input.isdigit() else None)
-        if month_num and 1 <= int(month_num) <= 12:
-            month_num_str = f"{int(month_num):02d}"; next_month_year = year; next_month_num = int(month_num_str) + 1
-            if next_month_num > 12: next_month_num = 1; next_month_year += 1
-            start_date = f"{year}-{month_num_str}-01"; end_date = f"{next_month_year:04d}-{next_month_num:02d}-01"
-            base_conditions = FAT_BASE_CONDITIONS_LIST + [f"{FAT_DATE_COL} >= '{start_date}'", f"{FAT_DATE_COL} < '{end_date}'"]
-            where_clause, regime_label = build_where_clause(base_conditions, regime)
-            sql = f"SELECT SUM({FAT_GROSS_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-            result = execute_direct_sql(sql)
-            value = result if isinstance(result, (int, float)) else 0.0
-            display_month = next((k for k, v in months_map.items() if v == month_num_str), month_num_str)
-            if isinstance(result, str): return f"Erro ao calcular faturamento bruto {regime_label}para {display_month.capitalize()}/{year}: {result}"
-            else: return f"O faturamento bruto {regime_label}para {display_month.capitalize()} de {year} foi {format_currency_brl(value)}"
-        else: return f"Mês inválido fornecido: '{month_input}'."
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar faturamento bruto mensal {regime_label}para {month_input}/{year}: {e}"
+        if periodo == 'ano': return f"Erro inesperado ao processar {texts['anual']} {regime_label}para {year}: {e}"
+        return f"Erro inesperado ao processar {texts['mensal']} {regime_label}para {month_input}/{year}: {e}"
 
-@tool
-def get_gross_revenue_per_month(regime: str | None = None) -> str:
-    """Busca o Faturamento BRUTO AGRUPADO POR MÊS, opcionalmente filtrado por regime (Naval/Offshore). Retorna tabela markdown. Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_gross_revenue_per_month (Regime: {regime}) ---")
+def metric_table_answer(metrica: str, regime: str | None = None) -> str:
+    """Métrica agrupada por mês como tabela markdown (valores em R$ formatados; contagens como estão)."""
+    texts = METRIC_TEXTS[metrica]
+    regime, regime_label = resolve_regime_filter(regime)
     try:
-        grouping_date_col = FAT_DATE_COL; date_format_func = "strftime('%Y-%m', {date_col})"
-        base_conditions = FAT_BASE_CONDITIONS_LIST + [f"{grouping_date_col} IS NOT NULL"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT {date_format_func.format(date_col=grouping_date_col)} AS Mes, SUM({FAT_GROSS_VALUE_COL}) AS Total_FB_Mes FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause} GROUP BY Mes ORDER BY Mes;"
-        df_result = execute_query_fetch_all(sql)
+        df_result = execute_metric_table(metrica, regime)
         if isinstance(df_result, pd.DataFrame):
             if not df_result.empty:
-                if 'Total_FB_Mes' in df_result.columns:
-                    try: df_result['Total_FB_Mes_fmt'] = df_result['Total_FB_Mes'].apply(format_currency_brl)
-                    except Exception: df_result['Total_FB_Mes_fmt'] = 'Erro fmt'
-                else: df_result['Total_FB_Mes_fmt'] = 'N/A'
-                df_display = df_result[['Mes', 'Total_FB_Mes_fmt']].rename(columns={'Total_FB_Mes_fmt': 'Faturamento_Bruto'})
+                if texts['moeda']:
+                    if 'Total' in df_result.columns:
+                        try: df_result['Total_fmt'] = df_result['Total'].apply(format_currency_brl)
+                        except Exception: df_result['Total_fmt'] = 'Erro fmt'
+                    else: df_result['Total_fmt'] = 'N/A'
+                    df_display = df_result[['Mes', 'Total_fmt']].rename(columns={'Total_fmt': texts['coluna']})
+                else:
+                    df_display = df_result.rename(columns={'Total': texts['coluna']})
                 markdown_table = df_display.to_markdown(index=False)
-                return f"Aqui está o resumo do faturamento bruto {regime_label}por mês:\n{markdown_table}"
-            else: return f"Não encontrei dados de faturamento bruto {regime_label}para agrupar por mês."
-        else: return f"Erro ao buscar faturamento bruto {regime_label}por mês: {df_result}"
+                return f"Aqui está o resumo {texts['resumo']} {regime_label}por mês:\n{markdown_table}"
+            else: return f"Não encontrei dados de {texts['nome']} {regime_label}para agrupar por mês."
+        else: return f"Erro ao buscar {texts['nome']} {regime_label}por mês: {df_result}"
     except Exception as e:
-        error_type = type(e).__name__; error_details = str(e); print(f"--- ERRO DETALHADO (LOCAL) [get_gross_revenue_per_month]: {error_type}: {error_details} ---"); traceback.print_exc(); print(f"---")
-        return f"Desculpe, ocorreu um erro interno ({error_type}) ao processar 'Faturamento bruto {regime_label}por mês'. Verifique os logs."
-
-# --- FIM DA PARTE 2 ---
-# agente.py (PARTE 3 de 4) - Cole após o final da Parte 2
+        error_type = type(e).__name__; error_details = str(e); log.exception("[get_metric/%s/por_mes] %s: %s", metrica, error_type, error_details)
+        return f"Desculpe, ocorreu um erro interno ({error_type}) ao processar '{texts['nome'][0].upper() + texts['nome'][1:]} {regime_label}por mês'. Verifique os logs."
 
 @tool
-def get_net_revenue_total(regime: str | None = None) -> str:
-    """Calcula o Faturamento LÍQUIDO total geral, opcionalmente filtrado por regime (Naval/Offshore). Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_net_revenue_total (Regime: {regime}) ---")
-    where_clause, regime_label = build_where_clause(FAT_BASE_CONDITIONS_LIST, regime)
-    sql = f"SELECT SUM({FAT_NET_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-    result = execute_direct_sql(sql)
-    value = result if isinstance(result, (int, float)) else 0.0
-    if isinstance(result, str): return f"Erro ao calcular faturamento líquido total {regime_label}: {result}"
-    else: return f"O faturamento líquido total {regime_label}é {format_currency_brl(value)}"
-
-@tool
-def get_net_revenue_for_year(year: int, regime: str | None = None) -> str:
-    """Calcula o Faturamento LÍQUIDO para um ANO específico, opcionalmente filtrado por regime (Naval/Offshore). Args: year (int): O ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_net_revenue_for_year (Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); start_date = f"{year}-01-01"; end_date = f"{year+1}-01-01"
-        base_conditions = FAT_BASE_CONDITIONS_LIST + [f"{FAT_DATE_COL} >= '{start_date}'", f"{FAT_DATE_COL} < '{end_date}'"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT SUM({FAT_NET_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-        result = execute_direct_sql(sql)
-        value = result if isinstance(result, (int, float)) else 0.0
-        if isinstance(result, str): return f"Erro ao calcular faturamento líquido {regime_label}para {year}: {result}"
-        else: return f"O faturamento líquido {regime_label}para {year} foi {format_currency_brl(value)}"
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar faturamento líquido anual {regime_label}para {year}: {e}"
-
-@tool
-def get_net_revenue_for_month_year(month_input: str, year: int, regime: str | None = None) -> str:
-    """Calcula o Faturamento LÍQUIDO para um MÊS e ANO específicos, opcionalmente filtrado por regime (Naval/Offshore). Args: month_input (str): Mês (nome/número). year (int): Ano. regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_net_revenue_for_month_year (Mês: {month_input}, Ano: {year}, Regime: {regime}) ---")
-    try:
-        year = int(year); months_map = {'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04', 'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09', 'outubro': '10', 'novembro': '11', 'dezembro': '12'}
-        month_num_str_input = str(month_input).lower().strip(); month_num = months_map.get(month_num_str_input) or (month_num_str_input if month_num_str_input.isdigit() else None)
-        if month_num and 1 <= int(month_num) <= 12:
-            month_num_str = f"{int(month_num):02d}"; next_month_year = year; next_month_num = int(month_num_str) + 1
-            if next_month_num > 12: next_month_num = 1; next_month_year += 1
-            start_date = f"{year}-{month_num_str}-01"; end_date = f"{next_month_year:04d}-{next_month_num:02d}-01"
-            base_conditions = FAT_BASE_CONDITIONS_LIST + [f"{FAT_DATE_COL} >= '{start_date}'", f"{FAT_DATE_COL} < '{end_date}'"]
-            where_clause, regime_label = build_where_clause(base_conditions, regime)
-            sql = f"SELECT SUM({FAT_NET_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause};"
-            result = execute_direct_sql(sql)
-            value = result if isinstance(result, (int, float)) else 0.0
-            display_month = next((k for k, v in months_map.items() if v == month_num_str), month_num_str)
-            if isinstance(result, str): return f"Erro ao calcular faturamento líquido {regime_label}para {display_month.capitalize()}/{year}: {result}"
-            else: return f"O faturamento líquido {regime_label}para {display_month.capitalize()} de {year} foi {format_currency_brl(value)}"
-        else: return f"Mês inválido fornecido: '{month_input}'."
-    except ValueError: return f"Ano inválido fornecido: {year}."
-    except Exception as e: return f"Erro inesperado ao processar faturamento líquido mensal {regime_label}para {month_input}/{year}: {e}"
-
-@tool
-def get_net_revenue_per_month(regime: str | None = None) -> str:
-    """Busca o Faturamento LÍQUIDO AGRUPADO POR MÊS, opcionalmente filtrado por regime (Naval/Offshore). Retorna tabela markdown. Args: regime (str | None): Opcional. Filtra por 'Naval' ou 'Offshore'."""
-    print(f"--- DEBUG: [Tool Called] get_net_revenue_per_month (Regime: {regime}) ---")
-    try:
-        grouping_date_col = FAT_DATE_COL; date_format_func = "strftime('%Y-%m', {date_col})"
-        base_conditions = FAT_BASE_CONDITIONS_LIST + [f"{grouping_date_col} IS NOT NULL"]
-        where_clause, regime_label = build_where_clause(base_conditions, regime)
-        sql = f"SELECT {date_format_func.format(date_col=grouping_date_col)} AS Mes, SUM({FAT_NET_VALUE_COL}) AS Total_FL_Mes FROM {NOME_TABELA_PRINCIPAL_SQL} {where_clause} GROUP BY Mes ORDER BY Mes;"
-        df_result = execute_query_fetch_all(sql)
-        if isinstance(df_result, pd.DataFrame):
-            if not df_result.empty:
-                if 'Total_FL_Mes' in df_result.columns:
-                    try: df_result['Total_FL_Mes_fmt'] = df_result['Total_FL_Mes'].apply(format_currency_brl)
-                    except Exception: df_result['Total_FL_Mes_fmt'] = 'Erro fmt'
-                else: df_result['Total_FL_Mes_fmt'] = 'N/A'
-                df_display = df_result[['Mes', 'Total_FL_Mes_fmt']].rename(columns={'Total_FL_Mes_fmt': 'Faturamento_Liquido'})
-                markdown_table = df_display.to_markdown(index=False)
-                return f"Aqui está o resumo do faturamento líquido {regime_label}por mês:\n{markdown_table}"
-            else: return f"Não encontrei dados de faturamento líquido {regime_label}para agrupar por mês."
-        else: return f"Erro ao buscar faturamento líquido {regime_label}por mês: {df_result}"
-    except Exception as e:
-        error_type = type(e).__name__; error_details = str(e); print(f"--- ERRO DETALHADO (LOCAL) [get_net_revenue_per_month]: {error_type}: {error_details} ---"); traceback.print_exc(); print(f"---")
-        return f"Desculpe, ocorreu um erro interno ({error_type}) ao processar 'Faturamento líquido {regime_label}por mês'. Verifique os logs."
+def get_metric(metric: Literal['vendas', 'faturamento_bruto', 'faturamento_liquido', 'bms_pendentes', 'relatorios_pendentes'],
+               year: int | None = None, month: str | None = None, regime: str | None = None,
+               group_by: Literal['mes'] | None = None) -> str:
+    """Vendas e faturamento bruto/líquido (soma em R$), BMs e relatórios pendentes (quantidade). Sem year: total geral; year: ano; month (nome ou número) + year: mês; group_by='mes': tabela mensal (sem year/month). regime: 'Naval' ou 'Offshore' (opcional)."""
+    log.debug("[Tool Called] get_metric (Métrica: %s, Ano: %s, Mês: %s, Regime: %s, Agrupar: %s)", metric, year, month, regime, group_by)
+    if group_by:
+        if year is not None or month is not None: return "A tabela por mês cobre todo o período e não filtra por ano/mês: chame sem year/month, ou sem group_by."
+        return metric_table_answer(metric, regime)
+    if month is not None and year is None: return f"Informe o ano (year) junto com o mês '{month}'."
+    return metric_value_answer(metric, regime, year, month)
+
+# Parâmetro fora do esquema (métrica desconhecida, ano que não é número...) volta para o LLM como texto em vez de interromper o agente
+get_metric.handle_validation_error = lambda e: f"Parâmetros inválidos para get_metric: {e.errors()[0]['loc']} {e.errors()[0]['msg']}"
 
 # --- NOVA FERRAMENTA: Relatório Gerencial ---
 @tool
@@ -530,8 +336,9 @@ def generate_daily_management_report() -> str:
     'consolidado diário', 'resumo gerencial do dia', ou solicitações muito similares.
     Não use para perguntas sobre um único indicador ou com filtro Naval/Offshore (use as ferramentas específicas).
     """
-    print("--- DEBUG: [Tool Called] generate_daily_management_report ---")
+    log.debug("[Tool Called] generate_daily_management_report")
 
+    px, pio = obter_plotly()
     if px is None or pio is None: # Verifica se plotly e pio foram importados
         return "Erro: A biblioteca Plotly é necessária para gerar os gráficos deste relatório, mas não foi encontrada. Por favor, instale com 'pip install plotly kaleido'."
     try:
@@ -542,7 +349,7 @@ def generate_daily_management_report() -> str:
         end_of_period = today.strftime('%Y-%m-%d') # YTD
         ytd_months_num = list(range(1, today.month + 1))
         month_map_br = {1: 'JAN', 2: 'FEV', 3: 'MAR', 4: 'ABR', 5: 'MAI', 6: 'JUN', 7: 'JUL', 8: 'AGO', 9: 'SET', 10: 'OUT', 11: 'NOV', 12: 'DEZ'}
-        print(f"--- DEBUG [Report]: Período YTD: {start_of_year} a {end_of_period} ---")
+        log.debug("[Report] Período YTD: %s a %s", start_of_year, end_of_period)
 
         # --- 2. Inicializar Dicionário de Dados ---
         report_data = {f'{cat}_{month_map_br[m].lower()}': (0.0 if cat in ['faturamento', 'vendas'] else 0) for cat in ['faturamento', 'vendas', 'bm_pendente', 'relatorios_pendentes'] for m in range(1, 13)}
@@ -556,70 +363,26 @@ def generate_daily_management_report() -> str:
         month_map_num_to_key = {m: month_map_br[m].lower() for m in range(1, 13)}
 
         # --- 3. Buscar Dados do Banco ---
-        print(f"--- DEBUG [Report]: Buscando dados... ---")
+        # Todos os indicadores (YTD, mensais e históricos) numa única consulta que devolve pares
+        # (chave de report_data, valor): ver consultas_metricas.CONSULTA_RELATORIO_GERENCIAL.
+        # Com o motor colunar carregado, os mesmos pares saem dos arrays em memória.
+        log.debug("[Report] Buscando dados (consulta única)...")
         try:
-            # Faturamento YTD Total e Mensal
-            fat_ytd_conditions = FAT_BASE_CONDITIONS_LIST + [f"{FAT_DATE_COL} >= '{start_of_year}'", f"{FAT_DATE_COL} <= '{end_of_period}'"]
-            where_fat_ytd, _ = build_where_clause(fat_ytd_conditions)
-            sql_fat_total = f"SELECT SUM({FAT_GROSS_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_fat_ytd};"
-            fat_total = execute_direct_sql(sql_fat_total)
-            report_data['faturamento_total_periodo'] = fat_total if isinstance(fat_total, (int, float)) else 0.0
-            sql_fat_mensal = f"SELECT strftime('%m', {FAT_DATE_COL}) as mes_num, SUM({FAT_GROSS_VALUE_COL}) as total FROM {NOME_TABELA_PRINCIPAL_SQL} {where_fat_ytd} GROUP BY mes_num;"
-            df_fat_mensal = execute_query_fetch_all(sql_fat_mensal)
-            if isinstance(df_fat_mensal, pd.DataFrame) and not df_fat_mensal.empty:
-                for _, row in df_fat_mensal.iterrows():
-                    mes_num = int(row['mes_num'])
-                    if mes_num in month_map_num_to_key: report_data[f"faturamento_{month_map_num_to_key[mes_num]}"] = row['total'] or 0.0
-            # Vendas YTD Total e Mensal
-            sales_ytd_conditions = [f"{SALES_DATE_COL} >= '{start_of_year}'", f"{SALES_DATE_COL} <= '{end_of_period}'", f"{SALES_DATE_COL} IS NOT NULL"]
-            where_sales_ytd, _ = build_where_clause(sales_ytd_conditions)
-            sql_sales_total = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_sales_ytd};"
-            sales_total = execute_direct_sql(sql_sales_total)
-            report_data['vendas_total_periodo'] = sales_total if isinstance(sales_total, (int, float)) else 0.0
-            sql_sales_mensal = f"SELECT strftime('%m', {SALES_DATE_COL}) as mes_num, SUM({SALES_VALUE_COL}) as total FROM {NOME_TABELA_PRINCIPAL_SQL} {where_sales_ytd} GROUP BY mes_num;"
-            df_sales_mensal = execute_query_fetch_all(sql_sales_mensal)
-            if isinstance(df_sales_mensal, pd.DataFrame) and not df_sales_mensal.empty:
-                 for _, row in df_sales_mensal.iterrows():
-                    mes_num = int(row['mes_num'])
-                    if mes_num in month_map_num_to_key: report_data[f"vendas_{month_map_num_to_key[mes_num]}"] = row['total'] or 0.0
-            # BM Pendente YTD e Histórico
-            bm_ytd_conditions = BM_PENDING_CONDITION_LIST + [f"{BM_DATE_COL} >= '{start_of_year}'", f"{BM_DATE_COL} <= '{end_of_period}'"]
-            where_bm_ytd, _ = build_where_clause(bm_ytd_conditions)
-            sql_bm_count_total_ytd = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_bm_ytd};"
-            sql_bm_value_total_ytd = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_bm_ytd};"
-            report_data['bm_pendente_itens_total_periodo'] = execute_direct_sql(sql_bm_count_total_ytd) or 0
-            report_data['bm_pendente_valor_total_periodo'] = execute_direct_sql(sql_bm_value_total_ytd) or 0.0
-            sql_bm_mensal = f"SELECT strftime('%m', {BM_DATE_COL}) as mes_num, COUNT(*) as total FROM {NOME_TABELA_PRINCIPAL_SQL} {where_bm_ytd} GROUP BY mes_num;"
-            df_bm_mensal = execute_query_fetch_all(sql_bm_mensal)
-            if isinstance(df_bm_mensal, pd.DataFrame) and not df_bm_mensal.empty:
-                 for _, row in df_bm_mensal.iterrows():
-                    mes_num = int(row['mes_num'])
-                    if mes_num in month_map_num_to_key: report_data[f"bm_pendente_{month_map_num_to_key[mes_num]}"] = row['total'] or 0
-            bm_hist_conditions = BM_PENDING_CONDITION_LIST + [f"{BM_DATE_COL} >= '2019-01-01'"]
-            where_bm_hist, _ = build_where_clause(bm_hist_conditions)
-            sql_bm_value_hist = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_bm_hist};"
-            report_data['bm_pendente_valor_total_historico'] = execute_direct_sql(sql_bm_value_hist) or 0.0
-            # Relatórios Pendentes YTD e Histórico
-            rp_ytd_conditions = REPORT_PENDING_CONDITION_LIST + [f"{REPORT_DATE_COL} >= '{start_of_year}'", f"{REPORT_DATE_COL} <= '{end_of_period}'", f"{REPORT_DATE_COL} IS NOT NULL"]
-            where_rp_ytd, _ = build_where_clause(rp_ytd_conditions)
-            sql_rp_count_total_ytd = f"SELECT COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_rp_ytd};"
-            sql_rp_value_total_ytd = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_rp_ytd};"
-            report_data['relatorios_pendentes_itens_total_periodo'] = execute_direct_sql(sql_rp_count_total_ytd) or 0
-            report_data['relatorios_pendentes_valor_total_periodo'] = execute_direct_sql(sql_rp_value_total_ytd) or 0.0
-            sql_rp_mensal = f"SELECT strftime('%m', {REPORT_DATE_COL}) as mes_num, COUNT(*) as total FROM {NOME_TABELA_PRINCIPAL_SQL} {where_rp_ytd} GROUP BY mes_num;"
-            df_rp_mensal = execute_query_fetch_all(sql_rp_mensal)
-            if isinstance(df_rp_mensal, pd.DataFrame) and not df_rp_mensal.empty:
-                 for _, row in df_rp_mensal.iterrows():
-                    mes_num = int(row['mes_num'])
-                    if mes_num in month_map_num_to_key: report_data[f"relatorios_pendentes_{month_map_num_to_key[mes_num]}"] = row['total'] or 0
-            rp_hist_conditions = REPORT_PENDING_CONDITION_LIST + [f"{REPORT_DATE_COL} >= '2019-01-01'", f"{REPORT_DATE_COL} IS NOT NULL"]
-            where_rp_hist, _ = build_where_clause(rp_hist_conditions)
-            sql_rp_value_hist = f"SELECT SUM({SALES_VALUE_COL}) FROM {NOME_TABELA_PRINCIPAL_SQL} {where_rp_hist};"
-            report_data['relatorios_pendentes_valor_total_historico'] = execute_direct_sql(sql_rp_value_hist) or 0.0
-
-            print(f"--- DEBUG [Report]: Dados buscados. ---")
+            motor = obter_motor()
+            rows = None
+            if motor is not None:
+                try: rows = list(motor.relatorio_gerencial(start_of_year, end_of_period).items())
+                except Exception as e_motor: log.warning("Falha no motor colunar (%s); usando o SQLite.", e_motor)
+            if rows is None:
+                rows = execute_query_fetch_rows(CONSULTA_RELATORIO_GERENCIAL, params_relatorio_gerencial(start_of_year, end_of_period))
+            if isinstance(rows, list):
+                fetched = dict(rows); fetched.pop(None, None) # Chave NULL = mês de data inválida
+                report_data.update(fetched)
+                log.debug("[Report] Dados buscados.")
+            else:
+                log.error("[Report] Falha ao buscar dados: %s", rows)
         except Exception as fetch_err:
-            print(f"--- ERRO [Report]: Falha ao buscar dados: {fetch_err} ---"); traceback.print_exc()
+            log.exception("[Report] Falha ao buscar dados: %s", fetch_err)
 
         # --- 4. Formatar Dados para o Template ---
         report_data_str = {'current_year': current_year}
@@ -631,11 +394,11 @@ def generate_daily_management_report() -> str:
                  report_data_str[f"{k}_str"] = str(v) if v is not None else '0'
 
         # --- 5. Gerar Gráficos ---
-        print(f"--- DEBUG [Report]: Gerando gráficos... ---")
+        log.debug("[Report] Gerando gráficos...")
         try:
             if pio: # Garante que pio (plotly.io) foi importado com sucesso
                 pio.kaleido.scope.plotlyjs = "https://cdn.plot.ly/plotly-latest.min.js"
-                print(f"--- DEBUG [Report]: Kaleido plotlyjs scope DENTRO DA FUNÇÃO configurado para CDN. ---")
+                log.debug("[Report] Kaleido plotlyjs scope DENTRO DA FUNÇÃO configurado para CDN.")
 
             mes_labels_ytd = [month_map_br[m] for m in ytd_months_num]
             fat_chart_data = {'Mes': mes_labels_ytd, 'Faturamento': [report_data[f'faturamento_{month_map_num_to_key[m]}'] for m in ytd_months_num]}
@@ -649,30 +412,34 @@ def generate_daily_management_report() -> str:
                 fig_fat = px.bar(df_fat_chart, x='Mes', y='Faturamento', text_auto=True, title="Faturamento Mensal YTD")
                 fig_fat.update_traces(texttemplate='%{text:.2s}', textposition='outside')
                 fig_fat.update_layout(yaxis_title="Valor (R$)", yaxis_tickprefix="R$ ", xaxis_title=None, title_x=0.5, height=chart_args["height"])
-                img_bytes_fat = fig_fat.to_image(format="png", **chart_args)
+                with rastreador.span('grafico', 'faturamento'):
+                    img_bytes_fat = fig_fat.to_image(format="png", **chart_args)
+                    anotar(bytes=len(img_bytes_fat))
                 report_data_str['faturamento_chart_base64'] = "data:image/png;base64," + base64.b64encode(img_bytes_fat).decode('utf-8')
-                print(f"--- DEBUG [Report]: Gráfico Faturamento gerado. ---")
-            else: print(f"--- DEBUG [Report]: Sem dados de Faturamento para plotar. ---"); report_data_str['faturamento_chart_base64'] = ""
+                log.debug("[Report] Gráfico Faturamento gerado.")
+            else: log.debug("[Report] Sem dados de Faturamento para plotar."); report_data_str['faturamento_chart_base64'] = ""
 
             if not df_ven_chart.empty and df_ven_chart['Vendas'].sum() > 0:
                 fig_ven = px.bar(df_ven_chart, x='Mes', y='Vendas', text_auto=True, title="Vendas Mensais YTD")
                 fig_ven.update_traces(texttemplate='%{text:.2s}', textposition='outside', marker_color='rgba(22, 163, 74, 0.8)')
                 fig_ven.update_layout(yaxis_title="Valor (R$)", yaxis_tickprefix="R$ ", xaxis_title=None, title_x=0.5, height=chart_args["height"])
-                img_bytes_ven = fig_ven.to_image(format="png", **chart_args)
+                with rastreador.span('grafico', 'vendas'):
+                    img_bytes_ven = fig_ven.to_image(format="png", **chart_args)
+                    anotar(bytes=len(img_bytes_ven))
                 report_data_str['vendas_chart_base64'] = "data:image/png;base64," + base64.b64encode(img_bytes_ven).decode('utf-8')
-                print(f"--- DEBUG [Report]: Gráfico Vendas gerado. ---")
-            else: print(f"--- DEBUG [Report]: Sem dados de Vendas para plotar. ---"); report_data_str['vendas_chart_base64'] = ""
+                log.debug("[Report] Gráfico Vendas gerado.")
+            else: log.debug("[Report] Sem dados de Vendas para plotar."); report_data_str['vendas_chart_base64'] = ""
         except ImportError:
-             print("--- ERRO [Report]: Plotly ou Kaleido não instalados? ---")
+             log.error("[Report] Plotly ou Kaleido não instalados?")
              report_data_str['faturamento_chart_base64'] = "data:text/plain;base64," + base64.b64encode(b"Erro: Plotly/Kaleido nao instalado").decode('utf-8')
              report_data_str['vendas_chart_base64'] = report_data_str['faturamento_chart_base64']
         except Exception as chart_err:
-            print(f"--- ERRO [Report]: Falha ao gerar gráficos: {chart_err} ---"); traceback.print_exc()
+            log.exception("[Report] Falha ao gerar gráficos: %s", chart_err)
             report_data_str['faturamento_chart_base64'] = ""
             report_data_str['vendas_chart_base64'] = ""
 
         # --- 6. Definir e Preencher Template HTML ---
-        print(f"--- DEBUG [Report]: Preenchendo template HTML... ---")
+        log.debug("[Report] Preenchendo template HTML...")
         # COLE AQUI O TEXTO COMPLETO DA VARIÁVEL 'HTML_TEMPLATE' (A STRING GIGANTE DO HTML)
         # DA VERSÃO ANTERIOR CORRETA.
         # DEVE COMEÇAR COM: <!DOCTYPE html><html lang="pt-BR">...
@@ -696,43 +463,74 @@ def generate_daily_management_report() -> str:
         final_data_for_template['vendas_chart_base64'] = report_data_str.get('vendas_chart_base64', '')
 
         final_html = HTML_TEMPLATE.format(**final_data_for_template)
-        print(f"--- DEBUG [Report]: Template HTML preenchido. ---")
-        return final_html
+        log.debug("[Report] Template HTML preenchido.")
+        # Com armazém de sessão (app), o HTML (gráficos em base64) não volta ao LLM nem à memória:
+        # vai a referência com os totais, que bastam para perguntas de acompanhamento
+        resumo = (f"Relatório gerencial YTD {current_year} (até {report_data_str['data_atualizacao_str']}): "
+                  f"faturamento {report_data_str['faturamento_total_periodo_str']}, vendas {report_data_str['vendas_total_periodo_str']}, "
+                  f"BM pendente {report_data_str['bm_pendente_valor_total_periodo_str']} ({report_data_str['bm_pendente_itens_total_periodo_str']} itens), "
+                  f"relatórios pendentes {report_data_str['relatorios_pendentes_valor_total_periodo_str']} ({report_data_str['relatorios_pendentes_itens_total_periodo_str']} itens)")
+        return guardar_artefato('html', final_html, resumo)
     except ImportError:
-         print("--- ERRO [Report]: Plotly ou Kaleido não instalados? ---")
+         log.error("[Report] Plotly ou Kaleido não instalados?")
          return "Erro: Bibliotecas Plotly/Kaleido não instaladas..."
     except Exception as report_err:
-        print(f"--- ERRO GERAL [Report]: Falha ao gerar relatório: {report_err} ---"); traceback.print_exc()
+        log.exception("[Report] Falha ao gerar relatório: %s", report_err)
         return f"Desculpe, ocorreu um erro inesperado ao gerar o relatório: {report_err}"
 
 # --- FIM DA NOVA FERRAMENTA ---
 
 # --- Configuração das Ferramentas Gerais (LOCAL) ---
-sql_query_tool = None # <<< ESTA LINHA (e a próxima) RESOLVE O NameError
-db = None
-try:
-    db_uri_local = f"sqlite:///{NOME_BANCO_SQLITE}"
-    if os.path.exists(NOME_BANCO_SQLITE):
-        db = SQLDatabase.from_uri(db_uri_local)
-        sql_query_tool = QuerySQLDataBaseTool(db=db) 
-        sql_query_tool.name = "sql_database_query_tool"
-        sql_query_tool.description = (f"Use APENAS para SQL SELECT complexo no banco local '{NOME_BANCO_SQLITE}'. Priorize ferramentas específicas.")
-        print(f"--- DEBUG: SQL Tool (LOCAL) configurada para '{NOME_BANCO_SQLITE}'. ---")
-    else:
-        print(f"--- AVISO: DB local '{NOME_BANCO_SQLITE}' não encontrado. SQL Tool DESABILITADA. ---")
-        # sql_query_tool permanece None se o DB não existe
-except Exception as e:
-    print(f"--- ERRO: Configurar SQL Tool (LOCAL): {e} ---")
-    traceback.print_exc()
-    sql_query_tool = None # Garante que é None em caso de erro
-
-vector_search_tool = None # <<< ESTA LINHA (e a próxima para Chroma) SÃO IMPORTANTES
-try:
-    if os.path.exists(CHROMA_DB_PATH_LOCAL):
+@tool
+def sql_database_query_tool(query: str) -> str:
+    """Executa uma consulta SQL SELECT no banco local (descrição final definida abaixo)."""
+    log.debug("[Tool Called] sql_database_query_tool")
+    # Recusa o que não é leitura ou é caro demais (EXPLAIN QUERY PLAN), interrompe após o tempo
+    # máximo e corta o resultado em linhas/bytes (ver sql_protegido.py)
+    with rastreador.span('sql', 'executar_sql_protegido', sql=resumir_sql(query)):
+        return executar_sql_protegido(query)
+
+sql_database_query_tool.description = (f"Use APENAS para SQL SELECT complexo no banco local '{NOME_BANCO_SQLITE}'. Priorize ferramentas específicas. "
+                                        f"Consultas caras, lentas ou com resultado grande são recusadas ou truncadas: use filtros, agregações e LIMIT.")
+
+# --- Lista Final de Ferramentas ---
+custom_tools = [
+    get_agent_capabilities,
+    get_metric,
+    generate_daily_management_report
+]
+
+# --- Fábricas dos Componentes Pesados (construídos na primeira vez que são pedidos) ---
+# Cada componente é construído uma vez por processo (registro_recursos) e compartilhado por todas
+# as sessões, inclusive quando falha (None): o LLM não aparece sozinho sem a chave e o Chroma não
+# é reaberto a cada sessão. Por sessão fica só a memória da conversa (inicializar_agent_executor).
+
+def _construir_plotly():
+    # Import para gráficos (precisa instalar: pip install plotly kaleido)
+    try:
+        import plotly.express as px
+        import plotly.io as pio
+        return px, pio
+    except ImportError:
+        log.warning("Biblioteca 'plotly' não encontrada. Gráficos não funcionarão. Instale com 'pip install plotly kaleido'")
+        return None, None
+
+def obter_plotly():
+    """(plotly.express, plotly.io), ou (None, None) sem plotly."""
+    return registro.obter('plotly', _construir_plotly)
+
+def _construir_ferramenta_documentos():
+    if not os.path.exists(CHROMA_DB_PATH_LOCAL):
+        log.warning("ChromaDB local '%s' não encontrado. Vector tool DESABILITADA.", CHROMA_DB_PATH_LOCAL)
+        return None
+    try:
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+        from langchain.tools.retriever import create_retriever_tool
         chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH_LOCAL)
-        print(f"--- DEBUG: Cliente ChromaDB (LOCAL) conectado a '{CHROMA_DB_PATH_LOCAL}'. ---")
+        log.debug("Cliente ChromaDB (LOCAL) conectado a '%s'.", CHROMA_DB_PATH_LOCAL)
         embedding_function = None # Defina sua função de embedding aqui se usar
-        collection = chroma_client.get_collection(NOME_COLECAO_CHROMA, embedding_function=embedding_function)
+        chroma_client.get_collection(NOME_COLECAO_CHROMA, embedding_function=embedding_function) # Falha aqui se a coleção não existe
         vector_store = Chroma(client=chroma_client, collection_name=NOME_COLECAO_CHROMA, embedding_function=embedding_function)
         retriever_chroma = vector_store.as_retriever(search_kwargs={"k": 3})
         vector_search_tool = create_retriever_tool(
@@ -740,61 +538,53 @@ try:
             "busca_documentos_supply_marine", # Nome da ferramenta
             "Use para buscar informações contextuais em documentos locais sobre processos, produtos ou informações gerais da Supply Marine. NÃO use para cálculos ou dados SQL." # Descrição
         )
-        print(f"--- DEBUG: Vector Tool (LOCAL) configurada para coleção '{NOME_COLECAO_CHROMA}'. ---")
-    else:
-        print(f"--- AVISO: ChromaDB local '{CHROMA_DB_PATH_LOCAL}' não encontrado. Vector tool DESABILITADA. ---")
-        # vector_search_tool permanece None
-except ImportError:
-    print(f"--- AVISO: Biblioteca 'chromadb' não encontrada. Vector tool DESABILITADA. Instale com 'pip install chromadb'. ---")
-    vector_search_tool = None
-except Exception as e_chroma:
-    print(f"--- AVISO GERAL: Falha ao configurar ChromaDB/Ferramenta Vetorial (LOCAL): {e_chroma}. ---")
-    traceback.print_exc()
-    vector_search_tool = None
+        log.debug("Vector Tool (LOCAL) configurada para coleção '%s'.", NOME_COLECAO_CHROMA)
+        return vector_search_tool
+    except ImportError:
+        log.warning("Biblioteca 'chromadb' não encontrada. Vector tool DESABILITADA. Instale com 'pip install chromadb'.")
+    except Exception as e_chroma:
+        log.exception("Falha ao configurar ChromaDB/Ferramenta Vetorial (LOCAL): %s.", e_chroma)
+    return None
 
+def obter_ferramenta_documentos():
+    """Ferramenta de busca nos documentos (Chroma), ou None se o Chroma não estiver disponível."""
+    return registro.obter('ferramenta_documentos', _construir_ferramenta_documentos)
 
-# --- Lista Final de Ferramentas ---
-# COLE ESTE BLOCO NO LUGAR DA DEFINIÇÃO ATUAL DA LISTA custom_tools:
-
-custom_tools = [
-    get_agent_capabilities,
-    get_total_sales_overall,
-    get_total_sales_for_year,
-    get_total_sales_for_month_year,
-    get_sales_per_month_dataframe,
-    get_pending_bms_total,
-    get_pending_bms_for_year,
-    get_pending_bms_per_month,
-    get_pending_reports_total,
-    get_pending_reports_for_year,
-    get_pending_reports_for_month_year,
-    get_pending_reports_per_month,
-    get_gross_revenue_total,
-    get_gross_revenue_for_year,
-    get_gross_revenue_for_month_year,
-    get_gross_revenue_per_month,
-    get_net_revenue_total,
-    get_net_revenue_for_year,
-    get_net_revenue_for_month_year,
-    get_net_revenue_per_month,
-    generate_daily_management_report
-]
-tools = list(custom_tools)
-if sql_query_tool: tools.append(sql_query_tool)
-if vector_search_tool: tools.append(vector_search_tool)
-print(f"--- DEBUG: Total de ferramentas carregadas para teste LOCAL: {len(tools)} ---")
-
-# --- Configuração da Memória, Prompt, LLM e Agente Executor (LOCAL) ---
-llm = None; agent = None
-if OPENAI_API_KEY:
+def _construir_ferramentas() -> list:
+    tools = list(custom_tools)
+    if os.path.exists(NOME_BANCO_SQLITE):
+        tools.append(sql_database_query_tool)
+        log.debug("SQL Tool (LOCAL) configurada para '%s'.", NOME_BANCO_SQLITE)
+    else:
+        log.warning("DB local '%s' não encontrado. SQL Tool DESABILITADA.", NOME_BANCO_SQLITE)
+    vector_search_tool = obter_ferramenta_documentos()
+    if vector_search_tool: tools.append(vector_search_tool)
+    log.debug("Total de ferramentas carregadas para teste LOCAL: %s", len(tools))
+    return tools
+
+def obter_ferramentas() -> list:
+    """Ferramentas do agente: custom_tools + SQL (se o banco existe) + documentos (se o Chroma existe)."""
+    return registro.obter('ferramentas', _construir_ferramentas)
+
+def _construir_llm():
+    if not OPENAI_API_KEY:
+        log.error("LLM não pode ser inicializado (verifique API Key no .env).")
+        return None
     try:
-        llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, openai_api_key=OPENAI_API_KEY)
-        print(f"--- DEBUG: LLM ({llm.model_name}) inicializado para teste LOCAL. ---")
-    except Exception as e: print(f"--- ERRO CRÍTICO (LOCAL): Falha ao inicializar LLM: {e} ---"); traceback.print_exc()
-else: print("--- ERRO CRÍTICO (LOCAL): LLM não pode ser inicializado (verifique API Key no .env). ---")
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, openai_api_key=OPENAI_API_KEY, streaming=True, stream_usage=True) # streaming: tokens chegam aos callbacks (app) conforme são gerados; stream_usage: contagem de tokens para o rastreamento
+        log.debug("LLM (%s) inicializado para teste LOCAL.", llm.model_name)
+        return llm
+    except Exception as e:
+        log.exception("Falha ao inicializar LLM: %s", e)
+        return None
+
+def obter_llm():
+    """ChatOpenAI configurado, ou None sem chave/erro."""
+    return registro.obter('llm', _construir_llm)
 
+# --- Configuração da Memória, Prompt e Agente Executor (LOCAL) ---
 MEMORY_KEY = "chat_history"
-# COLE ESTE BLOCO NO LUGAR DO PLACEHOLDER DO SYSTEM_PROMPT:
 
 SYSTEM_PROMPT = """Você é 'Marina', uma assistente especialista em análise de dados da Supply Marine (em teste local).
 
@@ -807,7 +597,7 @@ Suas capacidades incluem:
 Instruções Importantes para o Agente:
 - Objetivo Principal: Fornecer respostas precisas e úteis baseadas nos dados disponíveis, utilizando as ferramentas fornecidas.
 - Seleção de Ferramentas:
-    - Priorize SEMPRE o uso das ferramentas específicas (get_total_sales_overall, get_sales_for_year, get_pending_bms_total, generate_daily_management_report, etc.) quando a pergunta do usuário corresponder diretamente à capacidade de uma dessas ferramentas.
+    - Priorize SEMPRE o uso das ferramentas específicas (get_metric para vendas, faturamento, BMs e relatórios pendentes; generate_daily_management_report) quando a pergunta do usuário corresponder diretamente à capacidade de uma dessas ferramentas.
     - Para o relatório gerencial consolidado YTD, use EXCLUSIVAMENTE a ferramenta `generate_daily_management_report`. Não tente montar este relatório usando outras ferramentas. Acione-a para pedidos como 'relatório gerencial', 'relatório do dia', 'consolidado diário'.
     - A ferramenta `sql_database_query_tool` só deve ser usada como ÚLTIMO RECURSO para consultas SQL SELECT complexas que não podem ser respondidas pelas ferramentas específicas. Evite usá-la para simples agregações que as outras ferramentas já cobrem.
     - A ferramenta `busca_documentos_supply_marine` deve ser usada para perguntas que buscam informações textuais, explicações ou contexto que podem estar em documentos, e não para cálculos ou dados numéricos diretos do banco.
@@ -823,35 +613,84 @@ Instruções Importantes para o Agente:
     - Seja sempre cordial e profissional.
     - Se não tiver certeza ou se uma pergunta for ambígua, peça esclarecimentos.
     - Se uma ferramenta retornar um erro ou dados não encontrados, informe o usuário de forma clara.
-    - INSTRUÇÃO CRÍTICA PARA RELATÓRIOS HTML: Quando a ferramenta `generate_daily_management_report` for usada e retornar um código HTML, sua resposta FINAL para o usuário deve ser APENAS e EXATAMENTE esse código HTML. Não adicione nenhum texto introdutório, resumo, ou links. Apenas o HTML bruto.
+    - INSTRUÇÃO CRÍTICA PARA RELATÓRIOS HTML: Quando a ferramenta `generate_daily_management_report` for usada e retornar um código HTML, sua resposta FINAL para o usuário deve ser APENAS e EXATAMENTE esse código HTML. Não adicione nenhum texto introdutório, resumo, ou links. Apenas o HTML bruto. Se ela retornar uma linha '[artefato:...]', responda APENAS com essa linha, exatamente como veio (a interface mostra o relatório).
     - INSTRUÇÃO CRÍTICA PARA CAPACIDADES: Se a pergunta do usuário for EXCLUSIVAMENTE sobre suas capacidades, funções ou o que você pode fazer (como 'o que você faz?', 'quais suas funções?', 'como me ajuda?'), é OBRIGATÓRIO e ESSENCIAL usar a ferramenta `get_agent_capabilities`. É PROIBIDO tentar responder a essas perguntas diretamente ou usar qualquer outra ferramenta. Invoque `get_agent_capabilities` imediatamente nesses casos.
 - Data de Referência: Assuma que "hoje" ou "data atual" é a data em que você está processando a pergunta, a menos que o usuário especifique um período diferente. Para o relatório gerencial, ele sempre usará o ano corrente até a data atual (YTD).
 """
-prompt = ChatPromptTemplate.from_messages(
-    [("system", SYSTEM_PROMPT), MessagesPlaceholder(variable_name=MEMORY_KEY),
-     ("user", "{input}"), MessagesPlaceholder(variable_name="agent_scratchpad")]
-)
-print("--- DEBUG: Prompt do Agente (LOCAL) definido. ---")
-
-if llm and tools:
+def _construir_prompt():
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    prompt = ChatPromptTemplate.from_messages(
+        [("system", SYSTEM_PROMPT), MessagesPlaceholder(variable_name=MEMORY_KEY),
+         ("user", "{input}"), MessagesPlaceholder(variable_name="agent_scratchpad")]
+    )
+    log.debug("Prompt do Agente (LOCAL) definido.")
+    return prompt
+
+def obter_prompt():
+    return registro.obter('prompt', _construir_prompt)
+
+def _construir_agente(llm=None):
+    llm, tools = llm or obter_llm(), obter_ferramentas()
+    if not (llm and tools):
+        log.error("Agente não criado (LLM ou Tools falhou).")
+        return None
     try:
-        agent = create_openai_tools_agent(llm, tools, prompt)
-        print(f"--- DEBUG: Agente (LOCAL) criado com {len(tools)} ferramentas. ---")
-    except Exception as e: print(f"--- ERRO CRÍTICO (LOCAL): Falha ao criar o agente: {e} ---"); traceback.print_exc(); agent = None
-else: print("--- ERRO (LOCAL): Agente não criado (LLM ou Tools falhou). ---")
+        from langchain.agents import create_openai_tools_agent
+        agent = create_openai_tools_agent(llm, tools, obter_prompt())
+        log.debug("Agente (LOCAL) criado com %s ferramentas.", len(tools))
+        return agent
+    except Exception as e:
+        log.exception("Falha ao criar o agente: %s", e)
+        return None
 
-def inicializar_agent_executor(chat_message_history):
-    if not agent or not llm: print("--- ERRO FATAL AO INICIALIZAR EXECUTOR (LOCAL): Componentes não prontos! ---"); return None
+def obter_agente():
+    """Agente (LLM + ferramentas + prompt), ou None se algum componente faltar."""
+    return registro.obter('agente', _construir_agente)
+
+def inicializar_agent_executor(chat_message_history, llm=None):
+    """
+    Executor de uma sessão. Agente, LLM e ferramentas vêm do registro do processo (compartilhados);
+    só a memória (orçamento de tokens sobre o chat_message_history da sessão) é criada aqui.
+    llm: outro modelo de chat no lugar do ChatOpenAI (ex: o modelo roteirizado do benchmark_agente.py);
+    o agente montado com ele não vai para o registro.
+    """
+    agent = _construir_agente(llm) if llm is not None else obter_agente()
+    if not agent: log.error("Não foi possível inicializar o executor: componentes não prontos!"); return None
     try:
-        memory_for_executor = ConversationBufferWindowMemory(k=2, chat_memory=chat_message_history, memory_key=MEMORY_KEY, return_messages=True)
-        agent_executor_instance = AgentExecutor(
-            agent=agent, tools=tools, memory=memory_for_executor, verbose=True,
+        from memoria_conversa import MemoriaOrcamentoTokens # Histórico com orçamento de tokens + resumo dos turnos antigos
+        from executor_paralelo import AgentExecutorParalelo # AgentExecutor que roda juntas as ferramentas de um mesmo passo
+        memory_for_executor = MemoriaOrcamentoTokens(chat_memory=chat_message_history, memory_key=MEMORY_KEY, return_messages=True,
+                                                     llm_resumo=llm if llm is not None else obter_llm())
+        agent_executor_instance = AgentExecutorParalelo(
+            agent=agent, tools=obter_ferramentas(), memory=memory_for_executor, verbose=True,
             handle_parsing_errors="Desculpe, tive um problema ao processar sua solicitação. Poderia reformular?",
             max_iterations=10, max_execution_time=120
         )
-        print("--- DEBUG: Instância AgentExecutor (LOCAL) criada. ---")
+        log.debug("Instância AgentExecutor (LOCAL) criada.")
         return agent_executor_instance
-    except Exception as e: print(f"--- ERRO CRÍTICO (LOCAL): Falha ao criar instância AgentExecutor: {e} ---"); traceback.print_exc(); return None
+    except Exception as e: log.exception("Falha ao criar instância AgentExecutor: %s", e); return None
 
+def _aquecer_tokenizador():
+    from memoria_conversa import contar_tokens # Carrega a codificação do tiktoken (orçamento da memória)
+    return contar_tokens("Marina")
 
-print(f"--- DEBUG: Arquivo {__name__} (config. LOCAL com filtro regime e relatório) carregado. ---")
\ No newline at end of file
+def aquecer() -> dict:
+    """
+    Constrói de uma vez o que a primeira pergunta usaria (agente, ferramentas, plotly, motor
+    colunar, conexão do pool, tokenizador da memória) para ela não pagar esse custo. Retorna {componente: ms}.
+    """
+    tempos = {}
+    for nome, construir in (('agente', obter_agente), ('plotly', obter_plotly), ('motor_colunar', obter_motor),
+                            ('conexao', lambda: execute_direct_sql("SELECT 1")), ('tokenizador', _aquecer_tokenizador)):
+        inicio = time.perf_counter()
+        try: construir()
+        except Exception as e: log.warning("Aquecimento de '%s' falhou: %s", nome, e)
+        tempos[nome] = (time.perf_counter() - inicio) * 1000
+    log.info("Aquecimento concluído: %s", ', '.join(f'{n} {ms:.0f} ms' for n, ms in tempos.items()))
+    return tempos
+
+
+log.debug("Arquivo %s (config. LOCAL com filtro regime e relatório) carregado.", __name__)
+if __name__ == "__main__":
+    # python agente.py: constrói tudo e mostra quanto cada componente custou
+    aquecer()
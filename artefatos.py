@@ -0,0 +1,166 @@
+# artefatos.py
+# Saídas grandes (relatório gerencial em HTML com os gráficos em base64, tabelas markdown
+# longas) ficam num armazém da sessão, fora da conversa. A memória do agente recebe só uma
+# linha "[artefato:id] resumo" (a janela de 2 turnos deixa de reenviar o HTML ao LLM) e o app
+# troca a referência pelo conteúdo na hora de mostrar.
+
+import contextvars
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from langchain_core.chat_history import BaseChatMessageHistory
+
+# --- Constantes ---
+MAX_ARTEFATOS_SESSAO = 50 # Acima disso (ou de MAX_BYTES_SESSAO) os mais antigos saem
+MAX_BYTES_SESSAO = 20 * 1024 * 1024
+MIN_CARACTERES_TABELA = 1500 # Tabelas menores continuam na conversa (o LLM usa os números nas perguntas seguintes)
+MAX_CARACTERES_RESUMO = 300
+
+PADRAO_REFERENCIA = re.compile(r"\[artefato:([0-9a-f]{8})\][^\n]*")
+PADRAO_TABELA = re.compile(r"(?:^[ \t]*\|.*\|[ \t]*(?:\n|$)){3,}", re.MULTILINE) # Cabeçalho + separador + linhas
+PADRAO_TITULO_HTML = re.compile(r"<title>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass
+class Artefato:
+    id: str
+    tipo: str # 'html' ou 'tabela'
+    conteudo: str
+    resumo: str
+    criado: float = field(default_factory=time.time)
+
+
+def _celulas(linha: str) -> list[str]:
+    return [celula.strip() for celula in linha.strip().strip('|').split('|')]
+
+
+def resumir_tabela(tabela: str) -> str:
+    """'tabela com 64 linhas (Mes, Total); de 2019-01 (R$ 10,00) a 2024-05 (R$ 20,00)'"""
+    linhas = [linha for linha in tabela.strip().splitlines() if linha.strip()]
+    cabecalho, dados = _celulas(linhas[0]), [_celulas(linha) for linha in linhas[2:]]
+    resumo = f"tabela com {len(dados)} linhas ({', '.join(cabecalho)})"
+    if dados and len(dados[0]) >= 2:
+        resumo += f"; de {dados[0][0]} ({dados[0][-1]}) a {dados[-1][0]} ({dados[-1][-1]})"
+    return resumo
+
+
+class ArmazemArtefatos:
+    """Artefatos de uma sessão {id: Artefato}, em ordem de criação, com limite de quantidade e de bytes."""
+
+    def __init__(self, max_itens: int = MAX_ARTEFATOS_SESSAO, max_bytes: int = MAX_BYTES_SESSAO):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self.itens = OrderedDict()
+        self.bytes = 0
+        self._trava = threading.Lock() # Ferramentas de um mesmo passo rodam em threads (executor_paralelo)
+
+    def guardar(self, tipo: str, conteudo: str, resumo: str) -> str:
+        artefato = Artefato(uuid.uuid4().hex[:8], tipo, conteudo, " ".join(resumo.split())[:MAX_CARACTERES_RESUMO])
+        with self._trava:
+            self.itens[artefato.id] = artefato
+            self.bytes += len(conteudo)
+            while len(self.itens) > 1 and (len(self.itens) > self.max_itens or self.bytes > self.max_bytes):
+                _, antigo = self.itens.popitem(last=False)
+                self.bytes -= len(antigo.conteudo)
+        return artefato.id
+
+    def obter(self, id_artefato: str) -> Artefato | None:
+        return self.itens.get(id_artefato)
+
+    def referencia(self, id_artefato: str) -> str:
+        """Linha que vai para a conversa no lugar do conteúdo."""
+        artefato = self.itens[id_artefato]
+        return f"[artefato:{artefato.id}] {artefato.resumo}"
+
+    def externalizar(self, texto: str) -> str:
+        """Troca o relatório HTML ou as tabelas longas do texto por referências. Texto pequeno volta igual (o mesmo objeto)."""
+        if not texto or PADRAO_REFERENCIA.search(texto):
+            return texto
+        if texto.lstrip().startswith("<!DOCTYPE html>"):
+            titulo = PADRAO_TITULO_HTML.search(texto)
+            resumo = f"{titulo.group(1).strip() if titulo else 'Relatório'} (HTML, {len(texto) // 1024} KB)"
+            return self.referencia(self.guardar('html', texto, resumo))
+
+        def trocar_tabela(encontrada):
+            tabela = encontrada.group(0)
+            if len(tabela) < MIN_CARACTERES_TABELA:
+                return tabela
+            final = "\n" if tabela.endswith("\n") else ""
+            return self.referencia(self.guardar('tabela', tabela.rstrip("\n"), resumir_tabela(tabela))) + final
+        novo = PADRAO_TABELA.sub(trocar_tabela, texto)
+        return texto if novo == texto else novo
+
+    def partes(self, texto: str) -> list[tuple[str, str | Artefato | None]]:
+        """
+        Texto da conversa em pedaços para o app mostrar: ('texto', str), ('artefato', Artefato)
+        ou ('ausente', id) quando o artefato já saiu do armazém (limite) ou é de outra sessão.
+        """
+        if not isinstance(texto, str) or '[artefato:' not in texto:
+            return [('texto', texto)]
+        pedacos, posicao = [], 0
+        for encontrada in PADRAO_REFERENCIA.finditer(texto):
+            if texto[posicao:encontrada.start()].strip():
+                pedacos.append(('texto', texto[posicao:encontrada.start()]))
+            artefato = self.obter(encontrada.group(1))
+            pedacos.append(('artefato', artefato) if artefato else ('ausente', encontrada.group(1)))
+            posicao = encontrada.end()
+        if texto[posicao:].strip():
+            pedacos.append(('texto', texto[posicao:]))
+        return pedacos
+
+    def expandir(self, texto: str) -> str:
+        """Texto com as referências trocadas pelo conteúdo (cache em disco, botão de gráfico)."""
+        if not isinstance(texto, str) or '[artefato:' not in texto:
+            return texto
+        return PADRAO_REFERENCIA.sub(lambda m: self.obter(m.group(1)).conteudo if self.obter(m.group(1)) else m.group(0), texto)
+
+    def limpar(self) -> None:
+        with self._trava:
+            self.itens.clear(); self.bytes = 0
+
+
+# Armazém da sessão que está sendo atendida: as ferramentas (compartilhadas entre as sessões) guardam nele
+_armazem_atual = contextvars.ContextVar("marina_armazem_artefatos", default=None)
+
+
+def definir_armazem(armazem: ArmazemArtefatos | None) -> None:
+    """Chame no início de cada execução do script (Streamlit) ou de cada turno. Threads do executor_paralelo herdam."""
+    _armazem_atual.set(armazem)
+
+
+def guardar_artefato(tipo: str, conteudo: str, resumo: str) -> str:
+    """Referência para a ferramenta devolver, ou o próprio conteúdo sem armazém (CLI, testes)."""
+    armazem = _armazem_atual.get()
+    if armazem is None:
+        return conteudo
+    return armazem.referencia(armazem.guardar(tipo, conteudo, resumo))
+
+
+class HistoricoComArtefatos(BaseChatMessageHistory):
+    """
+    Histórico que externaliza as respostas grandes antes de gravar (em volta do
+    StreamlitChatMessageHistory da sessão). Vale para todos os caminhos: agente, roteador e cache.
+    """
+
+    def __init__(self, historico: BaseChatMessageHistory, armazem: ArmazemArtefatos):
+        self.historico = historico
+        self.armazem = armazem
+
+    @property
+    def messages(self):
+        return self.historico.messages
+
+    def add_message(self, message) -> None:
+        if message.type == "ai" and isinstance(message.content, str):
+            conteudo = self.armazem.externalizar(message.content)
+            if conteudo is not message.content:
+                message = message.model_copy(update={'content': conteudo})
+        self.historico.add_message(message)
+
+    def clear(self) -> None:
+        self.historico.clear()
+        self.armazem.limpar()
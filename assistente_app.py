@@ -4,24 +4,36 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import io
-import traceback
 import os
 import re
 
 from langchain_community.chat_message_histories import StreamlitChatMessageHistory
+from rastreamento import obter_logger # Logging por nível (LOG_LEVEL=DEBUG mostra as mensagens de depuração)
+
+from artefatos import ArmazemArtefatos, HistoricoComArtefatos, definir_armazem # Relatórios/tabelas grandes fora da memória da conversa
+
+log = obter_logger("app")
 
 # <<< Importa a função de inicialização do agente.py >>>
 agent_module_imported = False
 inicializar_agent_executor = None
+roteador = None
+cache_respostas = None
+StreamlitRespostaHandler = None
+STREAMING_RESPOSTAS = False
 try:
     # Garante que agente.py está completo e sem erros de sintaxe antes de importar
-    print("--- DEBUG APP: Tentando importar 'inicializar_agent_executor' de 'agente.py'... ---")
+    log.debug("Tentando importar 'inicializar_agent_executor' de 'agente.py'...")
     import sys
     # Adiciona o diretório atual ao path para garantir a importação correta
     sys.path.insert(0, os.path.dirname(__file__)) 
-    from agente import inicializar_agent_executor
-    print("--- DEBUG APP: Função 'inicializar_agent_executor' importada com sucesso. ---")
+    from agente import inicializar_agent_executor, custom_tools, aquecer
+    log.debug("Função 'inicializar_agent_executor' importada com sucesso.")
     agent_module_imported = True
+    from roteador_intencoes import obter_roteador
+    roteador = obter_roteador(custom_tools) # Perguntas de métrica comuns respondidas sem o LLM
+    from cache_respostas import cache_respostas # Respostas do agente guardadas em disco (pergunta normalizada + versão do banco)
+    from streaming_respostas import StreamlitRespostaHandler, STREAMING_RESPOSTAS # Progresso das ferramentas e tokens na tela durante a execução
 except ModuleNotFoundError:
     st.error("Erro Crítico: O arquivo 'agente.py' não foi encontrado.")
     st.info("Certifique-se de que 'agente.py' está no mesmo diretório que 'assistente_app.py'.")
@@ -29,11 +41,11 @@ except ModuleNotFoundError:
 except ImportError as e:
     st.error(f"Erro Crítico ao importar ou durante a inicialização do 'agente.py': {e}")
     st.info("Isso pode ser um erro de sintaxe DENTRO do 'agente.py' ou uma dependência faltando. Verifique o terminal.")
-    traceback.print_exc(); st.stop()
+    log.exception("Falha ao importar 'agente.py'"); st.stop()
 except Exception as e: # Pega outros erros que podem ocorrer durante a carga do agente.py
     st.error(f"Erro inesperado ao importar/configurar 'agente.py': {e}")
     st.info("Verifique o console/terminal para detalhes do erro em 'agente.py'.")
-    traceback.print_exc(); st.stop()
+    log.exception("Falha ao importar/configurar 'agente.py'"); st.stop()
 
 # <<< Bloco para tratar pergunta sobre capacidades diretamente >>>
 CAPABILITIES_TEXT = """
@@ -65,6 +77,21 @@ def check_for_capabilities_question(prompt: str) -> bool:
             if len(prompt_lower) < len(trigger) + 15: return True 
     return False
 
+def store_table_if_present(response_content) -> None:
+    """Guarda a resposta na sessão se ela tiver uma tabela markdown (habilita o botão de gráfico)."""
+    is_html_report = isinstance(response_content, str) and response_content.strip().startswith("<!DOCTYPE html>")
+    has_multiple_pipes = isinstance(response_content, str) and response_content.count('|') > 4
+    has_separator_line = isinstance(response_content, str) and any(sep in response_content for sep in ["\n|---", "\n|:---", "\n| ---", "\n| :---"])
+    if not is_html_report and has_multiple_pipes and has_separator_line:
+        log.debug("TABELA DETECTADA (genérico) na resposta. Armazenando markdown para botão de gráfico.")
+        st.session_state.last_table_markdown = response_content
+        st.session_state.plot_fig = None
+
+@st.cache_resource(show_spinner=False)
+def warm_up_shared_resources() -> dict:
+    """Uma vez por processo, não por sessão: LLM, ferramentas, Chroma, plotly e motor colunar ficam no registro do agente.py."""
+    return aquecer()
+
 # --- Configuração da Página ---
 st.set_page_config(
     page_title="Marina Supply", 
@@ -77,6 +104,8 @@ if 'last_table_markdown' not in st.session_state: st.session_state.last_table_ma
 if 'plot_fig' not in st.session_state: st.session_state.plot_fig = None
 if 'user_input_trigger' not in st.session_state: st.session_state.user_input_trigger = False
 if 'clicked_suggestion' not in st.session_state: st.session_state.clicked_suggestion = None
+if 'artefatos' not in st.session_state: st.session_state.artefatos = ArmazemArtefatos() # Relatórios e tabelas longas desta sessão
+definir_armazem(st.session_state.artefatos) # Ferramentas chamadas nesta execução do script guardam aqui
 
 
 # --- Título e Interface ---
@@ -102,6 +131,10 @@ Ferramenta experimental para consulta de dados da Supply Marine.
 
 *Use linguagem natural para suas perguntas.*
 """)
+if roteador and roteador.perguntas:
+    st.sidebar.caption(f"Respostas diretas (sem LLM): {roteador.roteadas}/{roteador.perguntas} ({roteador.taxa_roteamento():.0%})")
+if cache_respostas and cache_respostas.acertos:
+    st.sidebar.caption(f"Respostas do cache: {cache_respostas.acertos}")
 st.sidebar.markdown("---") 
 if st.sidebar.button("🗑️ Limpar Histórico", key="clear_history_button"):
     # Limpa o histórico da Langchain/Streamlit e outros estados relacionados
@@ -113,7 +146,8 @@ if st.sidebar.button("🗑️ Limpar Histórico", key="clear_history_button"):
     st.session_state.last_table_markdown = None 
     st.session_state.user_input_trigger = False
     st.session_state.clicked_suggestion = None
-    print("--- DEBUG APP: Histórico e estados relacionados limpos pelo botão. ---")
+    st.session_state.artefatos.limpar()
+    log.debug("Histórico e estados relacionados limpos pelo botão.")
     st.rerun() # Recarrega a página para refletir a limpeza
 
 
@@ -139,23 +173,24 @@ else:
     st.warning("Módulo do agente não foi carregado corretamente, sugestões desabilitadas.")
 
 # --- Gerenciamento da Memória e Histórico de Chat ---
-# A chave agora é usada para buscar/criar o histórico
-msgs = StreamlitChatMessageHistory(key="langchain_chat_history_supply_final_v2") 
+# A chave agora é usada para buscar/criar o histórico. Respostas grandes entram como referência ao armazém da sessão
+msgs = HistoricoComArtefatos(StreamlitChatMessageHistory(key="langchain_chat_history_supply_final_v2"), st.session_state.artefatos)
 
 # --- Inicialização do Agente Executor (apenas uma vez por sessão) ---
 agent_executor = None
 if inicializar_agent_executor:
     if 'agent_executor_initialized' not in st.session_state:
-        print("--- DEBUG APP: Tentando inicializar Agent Executor pela primeira vez... ---")
+        log.debug("Tentando inicializar Agent Executor pela primeira vez...")
         with st.spinner("Inicializando a Marina... 🚀"):
+            warm_up_shared_resources() # Só a primeira sessão do processo espera; as outras reaproveitam
             # Passa o objeto de histórico 'msgs' para o inicializador
             st.session_state.agent_executor_initialized = inicializar_agent_executor(chat_message_history=msgs) 
         if not st.session_state.agent_executor_initialized:
             st.error("Falha Crítica: Não foi possível inicializar o Agente Executor. Verifique a chave API no .env e os logs do terminal para erros detalhados em agente.py.")
-            print("--- ERRO APP: inicializar_agent_executor retornou None. Verifique erros em agente.py ou no terminal. ---")
+            log.error("inicializar_agent_executor retornou None. Verifique erros em agente.py ou no terminal.")
             st.stop()
         else:
-             print("--- DEBUG APP: Agent Executor inicializado com sucesso e armazenado na sessão. ---")
+             log.debug("Agent Executor inicializado com sucesso e armazenado na sessão.")
     # Sempre pega o executor da sessão depois de inicializado ou se já existia
     agent_executor = st.session_state.get('agent_executor_initialized') 
 else:
@@ -179,23 +214,31 @@ with chat_display_area:
     # Exibe mensagens do histórico
     for msg_idx, msg in enumerate(msgs.messages):
         with st.chat_message(msg.type):
-            if msg.type == "ai" and isinstance(msg.content, str) and msg.content.strip().startswith("<!DOCTYPE html>"):
-                print(f"--- DEBUG APP: Renderizando mensagem AI (índice {msg_idx}) como HTML. ---")
-                st.markdown(msg.content, unsafe_allow_html=True)
-            else:
-                st.write(msg.content) # Renderiza como texto/markdown padrão
+            for part_type, part in st.session_state.artefatos.partes(msg.content): # Referências [artefato:id] viram o conteúdo guardado
+                if part_type == 'artefato' and part.tipo == 'html':
+                    log.debug("Renderizando mensagem AI (índice %s) como HTML (artefato %s).", msg_idx, part.id)
+                    st.markdown(part.conteudo, unsafe_allow_html=True)
+                elif part_type == 'artefato':
+                    st.markdown(part.conteudo)
+                elif part_type == 'ausente':
+                    st.caption(f"(O conteúdo '{part}' não está mais disponível nesta sessão.)")
+                elif msg.type == "ai" and isinstance(part, str) and part.strip().startswith("<!DOCTYPE html>"):
+                    log.debug("Renderizando mensagem AI (índice %s) como HTML.", msg_idx)
+                    st.markdown(part, unsafe_allow_html=True)
+                else:
+                    st.write(part) # Renderiza como texto/markdown padrão
 
     # Lógica do Botão Gerar Gráfico (só aparece se houver tabela na última resposta AI)
     if st.session_state.last_table_markdown:
         st.markdown("---")
         if st.button("📊 Gerar Gráfico", key="plot_button_final_v3"): # Nova chave
-            print(f"--- DEBUG APP: Botão Gerar Gráfico clicado. Markdown guardado: {st.session_state.last_table_markdown[:200]}...")
+            log.debug("Botão Gerar Gráfico clicado. Markdown guardado: %s...", st.session_state.last_table_markdown[:200])
             markdown_content = st.session_state.last_table_markdown
             # Regex para extrair a tabela markdown (simplificada)
             table_match = re.search(r"(\s*\|.*\|\s*\n\s*\|(?: *\:?-+?\:? *\|)+?\s*\n(?: *\|.*\|\s*\n?)+)", markdown_content, re.MULTILINE)
             if table_match:
                 table_md = table_match.group(1).strip()
-                print(f"--- DEBUG APP: Markdown da tabela extraído para plotagem:\n{table_md}")
+                log.debug("Markdown da tabela extraído para plotagem:\n%s", table_md)
                 try:
                     # Usa StringIO para ler o markdown como se fosse um CSV com separador |
                     lines = table_md.split('\n')
@@ -211,7 +254,7 @@ with chat_display_area:
                     
                     # Limpa espaços extras em todas as células
                     df = df.map(lambda x: x.strip() if isinstance(x, str) else x)
-                    print(f"--- DEBUG APP: DataFrame parseado para plotagem:\n{df.head()}")
+                    log.debug("DataFrame parseado para plotagem:\n%s", df.head())
 
                     if df.empty or len(df.columns) < 2:
                         st.warning("Não foi possível extrair dados válidos da tabela para o gráfico.")
@@ -233,7 +276,7 @@ with chat_display_area:
                         df_plot[y_col] = clean_numeric_column(df_plot[y_col])
                         df_plot.dropna(subset=[y_col], inplace=True) # Remove linhas onde Y não pôde ser convertido
                         
-                        print(f"--- DEBUG APP: DataFrame para plotar (Y limpo):\n{df_plot.head()}")
+                        log.debug("DataFrame para plotar (Y limpo):\n%s", df_plot.head())
 
                         if not df_plot.empty:
                             title = f"Gráfico: {y_col.replace('_', ' ').title()} por {x_col.title()}"
@@ -242,20 +285,18 @@ with chat_display_area:
                                 fig.update_traces(textposition='outside')
                                 fig.update_layout(xaxis_title=x_col.title(), yaxis_title=y_col.replace('_', ' ').title())
                                 st.session_state.plot_fig = fig # Armazena a figura na sessão
-                                print(f"--- DEBUG APP: Gráfico Plotly gerado e armazenado na sessão. ---")
+                                log.debug("Gráfico Plotly gerado e armazenado na sessão.")
                             except Exception as plot_err:
                                 st.error(f"Erro ao gerar o gráfico com Plotly: {plot_err}")
-                                print(f"--- ERRO APP: Plotly falhou: {plot_err} ---")
-                                traceback.print_exc()
+                                log.exception("Plotly falhou: %s", plot_err)
                         else:
                             st.warning("Não há dados numéricos válidos para plotar na coluna Y após a limpeza.")
                 except Exception as parse_err:
                     st.error(f"Erro ao processar a tabela Markdown para o gráfico: {parse_err}")
-                    print(f"--- ERRO APP: Parsing da tabela para gráfico falhou: {parse_err} ---")
-                    traceback.print_exc()
+                    log.exception("Parsing da tabela para gráfico falhou: %s", parse_err)
             else:
                 st.warning("Não encontrei uma tabela formatada na última resposta para gerar o gráfico.")
-                print(f"--- AVISO APP: Regex (plotagem) não encontrou tabela no markdown guardado. ---")
+                log.warning("Regex (plotagem) não encontrou tabela no markdown guardado.")
             st.session_state.last_table_markdown = None # Limpa para o botão sumir após tentativa
             st.rerun() # Roda novamente para exibir o gráfico (ou erro) e remover o botão
 
@@ -275,19 +316,19 @@ with chat_display_area:
         user_prompt = st.session_state.clicked_suggestion
         st.session_state.clicked_suggestion = None # Limpa a sugestão clicada
         st.session_state.user_input_trigger = True # Indica que houve um input
-        print(f"--- DEBUG APP: Input via SUGESTÃO: {user_prompt} ---")
+        log.debug("Input via SUGESTÃO: %s", user_prompt)
 
     # Input via campo de chat
     if prompt_from_field := st.chat_input("Faça sua pergunta sobre os dados...", key="user_text_input_final_v3"): # Nova chave
         user_prompt = prompt_from_field
         st.session_state.user_input_trigger = True # Indica que houve um input
-        print(f"--- DEBUG APP: Input via CAMPO DE TEXTO: {user_prompt} ---")
+        log.debug("Input via CAMPO DE TEXTO: %s", user_prompt)
 
     # --- Processamento do Input e Interação com Agente ---
     if user_prompt:
         # Limpa plot/tabela anterior se usuário iniciou nova interação
         if st.session_state.user_input_trigger:
-            print(f"--- DEBUG APP: Novo prompt '{user_prompt[:50]}...', limpando plot_fig e last_table_markdown ANTES do processamento do agente. ---")
+            log.debug("Novo prompt '%s...', limpando plot_fig e last_table_markdown ANTES do processamento do agente.", user_prompt[:50])
             st.session_state.plot_fig = None
             st.session_state.last_table_markdown = None
 
@@ -299,52 +340,69 @@ with chat_display_area:
 
         # Verifica se é pergunta sobre capacidades
         if check_for_capabilities_question(user_prompt):
-            print(f"--- DEBUG APP: Pergunta sobre capacidades ('{user_prompt}'). Respondendo direto. ---")
+            log.debug("Pergunta sobre capacidades ('%s'). Respondendo direto.", user_prompt)
             st.chat_message("ai").write(CAPABILITIES_TEXT)
             msgs.add_ai_message(CAPABILITIES_TEXT)
             st.session_state.user_input_trigger = False # Reseta o trigger aqui
             st.rerun() # Re-renderiza para mostrar a resposta
 
+        # Pergunta de métrica reconhecida pelo roteador: resposta direto da ferramenta, sem o LLM
+        elif roteador and (routed_response := roteador.responder(user_prompt)) is not None:
+            msgs.add_ai_message(routed_response)
+            store_table_if_present(st.session_state.artefatos.expandir(routed_response))
+            st.session_state.user_input_trigger = False
+            st.rerun()
+
+        # Mesma pergunta já respondida pelo agente com os dados atuais: resposta do cache em disco
+        elif cache_respostas and (cached_response := cache_respostas.obter(
+                cache_key := cache_respostas.chave(user_prompt, sum(1 for m in msgs.messages[:-1] if m.type == "human")))) is not None:
+            log.debug("Resposta do cache para '%s...'", user_prompt[:50])
+            msgs.add_ai_message(cached_response)
+            store_table_if_present(cached_response)
+            st.session_state.user_input_trigger = False
+            st.rerun()
+
         # Se não for pergunta sobre capacidades e o agente estiver pronto, invoca o agente
         elif agent_executor:
-            with st.spinner("Marina está pensando... 🧠"):
+            # Streaming: etapas e tokens aparecem no balão da resposta; senão, spinner até o fim
+            response_container = st.chat_message("ai") if STREAMING_RESPOSTAS else st.spinner("Marina está pensando... 🧠")
+            with response_container:
+                stream_handler = StreamlitRespostaHandler() if STREAMING_RESPOSTAS else None
                 try:
-                    print(f"--- DEBUG APP: Invocando agente com input: '{user_prompt[:100]}...' ---")
+                    log.debug("Invocando agente com input: '%s...'", user_prompt[:100])
                     agent_input = {"input": user_prompt} 
-                    response = agent_executor.invoke(agent_input) # <<< CHAMADA REAL AO AGENTE >>>
+                    agent_config = {"callbacks": [stream_handler]} if stream_handler else None
+                    response = agent_executor.invoke(agent_input, config=agent_config) # <<< CHAMADA REAL AO AGENTE >>>
+                    if stream_handler: stream_handler.finalizar()
 
                     ai_response_content = "Desculpe, não obtive uma resposta válida." 
                     if response and isinstance(response, dict) and 'output' in response:
                         ai_response_content = response['output']
-                        print(f"--- DEBUG APP: Resposta recebida do agente (tipo: {type(ai_response_content)}). Trecho: {str(ai_response_content)[:200]}... ---")
-                        
-                        is_html_report = isinstance(ai_response_content, str) and ai_response_content.strip().startswith("<!DOCTYPE html>")
-                        has_multiple_pipes = isinstance(ai_response_content, str) and ai_response_content.count('|') > 4 
-                        has_separator_line = isinstance(ai_response_content, str) and any(sep in ai_response_content for sep in ["\n|---", "\n|:---", "\n| ---", "\n| :---"])
-
-                        if not is_html_report and has_multiple_pipes and has_separator_line:
-                             print(f"--- DEBUG APP: TABELA DETECTADA (genérico) na resposta do AGENTE. Armazenando markdown para botão de gráfico. ---")
-                             st.session_state.last_table_markdown = ai_response_content
-                             st.session_state.plot_fig = None 
+                        log.debug("Resposta recebida do agente (tipo: %s). Trecho: %s...", type(ai_response_content), str(ai_response_content)[:200])
+                        full_response = st.session_state.artefatos.expandir(ai_response_content) # Conteúdo, não a referência: vale em outra sessão
+                        store_table_if_present(full_response)
+                        if cache_respostas:
+                            cache_respostas.guardar(cache_key, user_prompt, full_response)
                     
                     # A LINHA ABAIXO FOI REMOVIDA/COMENTADA PARA EVITAR DUPLICAÇÃO
                     # msgs.add_ai_message(ai_response_content) 
 
                 except Exception as e:
+                    if stream_handler: stream_handler.finalizar(erro=True)
                     error_type_str = type(e).__name__
                     error_details = str(e)
                     st.error(f"Ocorreu um erro técnico ({error_type_str}) ao processar sua pergunta.")
-                    print(f"--- ERRO APP: agent_executor.invoke falhou: ---"); traceback.print_exc(); print(f"---")
+                    log.exception("agent_executor.invoke falhou:")
                     # Adiciona mensagem de erro ao histórico também
                     msgs.add_ai_message(f"Desculpe, encontrei um erro técnico ({error_type_str}) ao tentar responder. Detalhes: {error_details}")
 
             # Após processar (ou falhar), reseta o trigger e re-renderiza
             st.session_state.user_input_trigger = False 
-            print(f"--- DEBUG APP: Solicitando rerun após invoke/erro do agente. ---")
+            log.debug("Solicitando rerun após invoke/erro do agente.")
             st.rerun()
 
         elif not agent_executor: # Caso o agente não tenha inicializado corretamente
             st.error("O agente não está pronto. Verifique os logs do terminal.")
             st.session_state.user_input_trigger = False # Reseta mesmo se falhar
 
-    print("--- DEBUG APP: Fim do script principal assistente_app.py ---")
\ No newline at end of file
+    log.debug("Fim do script principal assistente_app.py")
\ No newline at end of file
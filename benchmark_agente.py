@@ -0,0 +1,295 @@
+# benchmark_agente.py
+# Latência de ponta a ponta da Marina sem a OpenAI: o inicializar_agent_executor roda com um
+# modelo de chat local e determinístico que repete chamadas de ferramenta roteirizadas (as que
+# o roteador de intenções escolheria, ou um roteiro fixo). Mede p50/p95/p99 por turno, por
+# ferramenta e por comando SQL e grava tudo em JSON para comparar versões.
+#
+#   python benchmark_agente.py                          -> bench_agente.json
+#   python benchmark_agente.py --comparar base.json     -> aponta regressões (código de saída 1)
+
+import argparse
+import ast
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+import agente
+from artefatos import ArmazemArtefatos, HistoricoComArtefatos, definir_armazem
+from cache_consultas import normalizar_sql
+from consultas_metricas import NOME_TABELA_PRINCIPAL_SQL, REGIME_COL, SALES_VALUE_COL
+from roteador_intencoes import interpretar
+
+# --- Constantes ---
+ARQUIVO_RESULTADOS = "bench_agente.json"
+VERSAO_FORMATO = 1 # Aumente se mudar a estrutura do JSON
+REPETICOES = 5 # Vezes que cada pergunta é medida (depois de uma rodada de aquecimento)
+PERGUNTAS_SINTETICAS = 30
+SEMENTE = 42
+TOLERANCIA_REGRESSAO = 0.20 # p95 20% pior que a base (e pelo menos MIN_DIFERENCA_MS) = regressão
+MIN_DIFERENCA_MS = 1.0
+MAX_CARACTERES_SQL = 120 # Chave de cada comando SQL no relatório
+
+# Perguntas que o roteador não entende, com as chamadas que o modelo de verdade faria
+ROTEIRO_FIXO = {
+    "O que você pode fazer?": [('get_agent_capabilities', {})],
+    "Compare as vendas de 2023 e 2024": [('get_metric', {'metric': 'vendas', 'year': 2023}), ('get_metric', {'metric': 'vendas', 'year': 2024})],
+    "Faturamento bruto e líquido de 2024": [('get_metric', {'metric': 'faturamento_bruto', 'year': 2024}),
+                                            ('get_metric', {'metric': 'faturamento_liquido', 'year': 2024})],
+    "Vendas Naval x Offshore em 2024": [('get_metric', {'metric': 'vendas', 'year': 2024, 'regime': 'Naval'}),
+                                        ('get_metric', {'metric': 'vendas', 'year': 2024, 'regime': 'Offshore'})],
+    "Quantas linhas existem por regime?": [('sql_database_query_tool', {'query': f"SELECT {REGIME_COL}, COUNT(*) AS linhas FROM {NOME_TABELA_PRINCIPAL_SQL} GROUP BY {REGIME_COL}"})],
+    "Quais os 5 maiores valores de venda?": [('sql_database_query_tool', {'query': f"SELECT {SALES_VALUE_COL} FROM {NOME_TABELA_PRINCIPAL_SQL} ORDER BY {SALES_VALUE_COL} DESC LIMIT 5"})],
+    "Olá, tudo bem?": [],
+}
+
+
+def perguntas_sugestoes(caminho_app: str = "assistente_app.py") -> list[str]:
+    """A lista 'suggestions = [...]' do app (lida do código, sem executar o Streamlit)."""
+    with open(caminho_app, encoding="utf-8") as arquivo:
+        arvore = ast.parse(arquivo.read())
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Assign) and any(getattr(alvo, 'id', None) == 'suggestions' for alvo in no.targets):
+            return list(ast.literal_eval(no.value))
+    return []
+
+
+def perguntas_sinteticas(quantidade: int = PERGUNTAS_SINTETICAS, semente: int = SEMENTE) -> list[str]:
+    """Mistura fixa (semente) de perguntas de métrica: métrica x regime x período."""
+    metricas = ["vendas", "faturamento bruto", "faturamento líquido", "BMs pendentes", "relatórios pendentes"]
+    regimes = ["", "naval", "offshore"]
+    periodos = ["", "2023", "2024", "maio 2024", "03/2023", "por mes"]
+    combinacoes = [" ".join(p for p in (m, r, per) if p) for m in metricas for r in regimes for per in periodos]
+    sorteio = random.Random(semente)
+    return sorteio.sample(combinacoes, min(quantidade, len(combinacoes))) + list(ROTEIRO_FIXO)
+
+
+def roteiro(pergunta: str) -> list[tuple[str, dict]]:
+    """Chamadas de ferramenta que o modelo roteirizado faz para a pergunta ([] = responde direto)."""
+    if pergunta in ROTEIRO_FIXO:
+        return ROTEIRO_FIXO[pergunta]
+    rota = interpretar(pergunta)
+    return [(rota.ferramenta, rota.argumentos)] if rota.ferramenta else []
+
+
+class ModeloRoteirizado(BaseChatModel):
+    """
+    Modelo de chat local para o create_openai_tools_agent: no primeiro passo de cada pergunta
+    pede as ferramentas do roteiro (todas num passo só, como tool calls paralelas); no passo
+    seguinte responde com o texto das ferramentas. latencia_ms simula o tempo do modelo.
+    """
+
+    latencia_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "roteirizado"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        inicio_turno = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        pergunta = messages[inicio_turno].content
+        resultados = [m.content for m in messages[inicio_turno + 1:] if isinstance(m, ToolMessage)]
+        if not resultados and not any(isinstance(m, AIMessage) for m in messages[inicio_turno + 1:]):
+            disponiveis = {t['function']['name'] for t in kwargs.get('tools') or ()}
+            chamadas = [{'name': nome, 'args': args, 'id': f"call_{i}"} for i, (nome, args) in enumerate(roteiro(pergunta)) if nome in disponiveis]
+            if chamadas:
+                return ChatResult(generations=[ChatGeneration(message=AIMessage(content="", tool_calls=chamadas))])
+        if len(resultados) == 1 and resultados[0].lstrip().startswith("<!DOCTYPE html>"):
+            resposta = resultados[0] # Como manda o SYSTEM_PROMPT: o HTML do relatório, sem nada em volta
+        else:
+            resposta = "\n\n".join(resultados) or "Olá! Posso consultar vendas, faturamento, BMs e relatórios pendentes."
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=resposta))])
+
+
+class ColetorTempos(BaseCallbackHandler):
+    """Duração de cada ferramenta e de cada chamada ao modelo (callbacks do LangChain)."""
+
+    def __init__(self, amostras: dict):
+        self.amostras = amostras
+        self._inicios = {}
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs) -> None:
+        self._inicios[run_id] = ((serialized or {}).get('name', '?'), time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        if run_id in self._inicios:
+            nome, inicio = self._inicios.pop(run_id)
+            self.amostras['ferramentas'].setdefault(nome, []).append((time.perf_counter() - inicio) * 1000)
+
+    on_tool_error = on_tool_end
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._inicios[run_id] = ('llm', time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        if run_id in self._inicios:
+            _, inicio = self._inicios.pop(run_id)
+            self.amostras['llm'].append((time.perf_counter() - inicio) * 1000)
+
+
+class MedidorSQL:
+    """
+    Durante o 'with', as funções de SQL do agente.py (e o SQL livre protegido) passam por um
+    cronômetro; os tempos ficam por comando (SQL normalizado). Inclui acertos do cache de
+    resultados, como o agente os vê; use --sem-cache para medir sempre o SQLite.
+    """
+
+    FUNCOES = ('execute_direct_sql', 'execute_query_fetch_all', 'execute_query_fetch_rows', 'executar_sql_protegido')
+
+    def __init__(self, amostras: dict):
+        self.amostras = amostras
+        self._originais = {}
+
+    def _cronometrar(self, funcao):
+        def medida(query, *args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(query, *args, **kwargs)
+            finally:
+                chave = normalizar_sql(query)[:MAX_CARACTERES_SQL]
+                self.amostras['sql'].setdefault(chave, []).append((time.perf_counter() - inicio) * 1000)
+        return medida
+
+    def __enter__(self):
+        for nome in self.FUNCOES:
+            self._originais[nome] = getattr(agente, nome)
+            setattr(agente, nome, self._cronometrar(self._originais[nome]))
+        return self
+
+    def __exit__(self, *erro):
+        for nome, funcao in self._originais.items():
+            setattr(agente, nome, funcao)
+
+
+def resumo(valores_ms: list[float]) -> dict:
+    if not valores_ms:
+        return {'n': 0}
+    valores = np.asarray(valores_ms)
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {'n': int(valores.size), 'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3),
+            'media_ms': round(float(valores.mean()), 3), 'max_ms': round(float(valores.max()), 3)}
+
+
+def _commit_atual() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def executar(perguntas: list[str], repeticoes: int = REPETICOES, latencia_llm_ms: float = 0.0, sem_cache: bool = False) -> dict:
+    """Roda cada pergunta 1x (aquecimento, descartada) + `repeticoes` vezes, cada uma numa sessão nova."""
+    modelo = ModeloRoteirizado(latencia_ms=latencia_llm_ms)
+    amostras = {'turnos': [], 'por_pergunta': {}, 'ferramentas': {}, 'sql': {}, 'llm': []}
+    descartadas = {'turnos': [], 'por_pergunta': {}, 'ferramentas': {}, 'sql': {}, 'llm': []}
+    falhas = []
+    with MedidorSQL(amostras) as medidor:
+        for rodada in range(repeticoes + 1):
+            destino = descartadas if rodada == 0 else amostras
+            medidor.amostras = destino
+            coletor = ColetorTempos(destino)
+            for pergunta in perguntas:
+                armazem = ArmazemArtefatos() # Como no app: relatório no armazém da sessão, referência na conversa
+                definir_armazem(armazem)
+                executor = agente.inicializar_agent_executor(HistoricoComArtefatos(ChatMessageHistory(), armazem), llm=modelo)
+                if executor is None:
+                    raise SystemExit("Não foi possível montar o agente (veja o log acima).")
+                executor.verbose = False
+                if sem_cache:
+                    agente.cache_resultados.itens.clear()
+                inicio = time.perf_counter()
+                try:
+                    resposta = executor.invoke({"input": pergunta}, config={"callbacks": [coletor]})
+                    if rodada == 0 and str(resposta.get('output', '')).startswith(("Erro", "Desculpe")):
+                        falhas.append(pergunta)
+                except Exception as e:
+                    falhas.append(f"{pergunta}: {type(e).__name__}: {e}")
+                decorrido = (time.perf_counter() - inicio) * 1000
+                destino['turnos'].append(decorrido)
+                destino['por_pergunta'].setdefault(pergunta, []).append(decorrido)
+    return {
+        'versao_formato': VERSAO_FORMATO, 'quando': datetime.now().isoformat(timespec='seconds'), 'commit': _commit_atual(),
+        'python': platform.python_version(), 'repeticoes': repeticoes, 'latencia_llm_ms': latencia_llm_ms, 'sem_cache': sem_cache,
+        'perguntas': len(perguntas), 'falhas': falhas,
+        'turnos': {'geral': resumo(amostras['turnos']), 'por_pergunta': {p: resumo(v) for p, v in amostras['por_pergunta'].items()}},
+        'ferramentas': {nome: resumo(v) for nome, v in sorted(amostras['ferramentas'].items())},
+        'sql': {sql: resumo(v) for sql, v in sorted(amostras['sql'].items())},
+        'llm': resumo(amostras['llm']),
+    }
+
+
+def _pares_comparaveis(atual: dict, base: dict):
+    yield 'turno (geral)', atual['turnos']['geral'], base['turnos']['geral']
+    for secao in ('ferramentas', 'sql'):
+        for chave, resumo_atual in atual[secao].items():
+            if chave in base.get(secao, {}):
+                yield f"{secao}: {chave}", resumo_atual, base[secao][chave]
+    for pergunta, resumo_atual in atual['turnos']['por_pergunta'].items():
+        if pergunta in base['turnos'].get('por_pergunta', {}):
+            yield f"pergunta: {pergunta}", resumo_atual, base['turnos']['por_pergunta'][pergunta]
+
+
+def comparar(atual: dict, base: dict, tolerancia: float = TOLERANCIA_REGRESSAO) -> list[str]:
+    """Itens cujo p95 piorou mais que a tolerância (e mais que MIN_DIFERENCA_MS) em relação à base."""
+    regressoes = []
+    for nome, resumo_atual, resumo_base in _pares_comparaveis(atual, base):
+        if not resumo_atual.get('n') or not resumo_base.get('n'):
+            continue
+        p95, p95_base = resumo_atual['p95_ms'], resumo_base['p95_ms']
+        if p95 > p95_base * (1 + tolerancia) and p95 - p95_base > MIN_DIFERENCA_MS:
+            regressoes.append(f"{nome}: p95 {p95_base:.1f} -> {p95:.1f} ms ({(p95 / p95_base - 1) * 100:+.0f}%)")
+    return regressoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark offline da Marina (modelo de chat roteirizado, sem OpenAI).")
+    parser.add_argument("--saida", default=ARQUIVO_RESULTADOS, help="Arquivo JSON com os resultados.")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--sinteticas", type=int, default=PERGUNTAS_SINTETICAS, help="Perguntas sintéticas além das sugestões do app.")
+    parser.add_argument("--latencia-llm-ms", type=float, default=0.0, help="Tempo simulado de cada chamada ao modelo.")
+    parser.add_argument("--sem-cache", action="store_true", help="Limpa o cache de resultados SQL antes de cada turno.")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior: sai com código 1 se houver regressão.")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO)
+    args = parser.parse_args()
+
+    perguntas = list(dict.fromkeys(perguntas_sugestoes() + perguntas_sinteticas(args.sinteticas)))
+    print(f"--- Benchmark: {len(perguntas)} perguntas x {args.repeticoes} repetições ---")
+    agente.aquecer()
+    resultados = executar(perguntas, args.repeticoes, args.latencia_llm_ms, args.sem_cache)
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+
+    geral = resultados['turnos']['geral']
+    print(f"\nTurno: p50 {geral['p50_ms']:.1f} ms | p95 {geral['p95_ms']:.1f} ms | p99 {geral['p99_ms']:.1f} ms ({geral['n']} turnos)")
+    for nome, r in resultados['ferramentas'].items():
+        print(f"  {nome:<35} p50 {r['p50_ms']:8.2f} | p95 {r['p95_ms']:8.2f} | p99 {r['p99_ms']:8.2f} ms (n={r['n']})")
+    print(f"  {len(resultados['sql'])} comandos SQL distintos; detalhes em {args.saida}")
+    if resultados['falhas']:
+        print(f"--- AVISO: {len(resultados['falhas'])} pergunta(s) com erro: {resultados['falhas']} ---")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        if any(base.get(chave) != resultados[chave] for chave in ('latencia_llm_ms', 'sem_cache')):
+            print("--- AVISO: a base foi medida com outra --latencia-llm-ms/--sem-cache; a comparação pode enganar. ---")
+        regressoes = comparar(resultados, base, args.tolerancia)
+        for linha in regressoes:
+            print(f"--- REGRESSÃO: {linha} ---")
+        if regressoes:
+            raise SystemExit(1)
+        print("--- Sem regressões em relação à base. ---")
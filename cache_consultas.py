@@ -0,0 +1,85 @@
+# cache_consultas.py
+# Cache LRU dos resultados das consultas do agente. A chave inclui a versão do banco
+# (conexao_sqlite.versao_banco), então uma carga nova invalida tudo automaticamente.
+
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# --- Constantes ---
+MAX_ITENS_CACHE = 256 # Resultados guardados (LRU)
+MAX_LINHAS_POR_RESULTADO = 5000 # DataFrames maiores que isso não entram no cache
+
+_ESPACOS = re.compile(r"\s+")
+
+
+def normalizar_sql(sql: str) -> str:
+    """Mesma consulta com espaços/quebras de linha/';' diferentes gera a mesma chave. Literais não mudam."""
+    return _ESPACOS.sub(" ", sql).strip().rstrip(";").rstrip()
+
+
+class CacheResultados:
+    """
+    {(sql normalizado, parâmetros): resultado} da versão atual do banco.
+    Quando a versão muda, o cache inteiro é descartado (os resultados antigos não servem mais).
+    DataFrames são copiados na entrada e na saída, para quem recebe poder alterá-los.
+    """
+
+    def __init__(self, funcao_versao, max_itens: int = MAX_ITENS_CACHE, max_linhas: int = MAX_LINHAS_POR_RESULTADO):
+        self.funcao_versao = funcao_versao
+        self.max_itens = max_itens
+        self.max_linhas = max_linhas
+        self.itens = OrderedDict()
+        self.versao = None
+        self._trava = threading.Lock()
+        self.acertos = self.falhas = self.descartes = self.invalidacoes = 0
+
+    def chave(self, sql: str, params: tuple | list | dict = ()) -> tuple:
+        """Chave da consulta na versão atual do banco. Calcule ANTES de executar a consulta."""
+        versao = self.funcao_versao()
+        with self._trava:
+            if versao != self.versao:
+                if self.itens:
+                    self.invalidacoes += 1
+                self.itens.clear()
+                self.versao = versao
+        chave_params = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params) # dict = parâmetros nomeados
+        return (versao, normalizar_sql(sql), chave_params)
+
+    def obter(self, chave: tuple) -> tuple[bool, object]:
+        """Retorna (encontrado, resultado)."""
+        with self._trava:
+            if chave in self.itens:
+                self.itens.move_to_end(chave)
+                self.acertos += 1
+                resultado = self.itens[chave]
+            else:
+                self.falhas += 1
+                return False, None
+        return True, (resultado.copy() if isinstance(resultado, pd.DataFrame) else resultado)
+
+    def guardar(self, chave: tuple, resultado) -> None:
+        if isinstance(resultado, pd.DataFrame):
+            if len(resultado) > self.max_linhas:
+                return
+            resultado = resultado.copy()
+        with self._trava:
+            if chave[0] != self.versao:
+                return # Banco mudou enquanto a consulta rodava
+            self.itens[chave] = resultado
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+                self.descartes += 1
+
+    def limpar(self) -> None:
+        with self._trava:
+            self.itens.clear()
+
+    def estatisticas(self) -> dict:
+        total = self.acertos + self.falhas
+        return {'itens': len(self.itens), 'acertos': self.acertos, 'falhas': self.falhas,
+                'taxa_acerto': self.acertos / total if total else 0.0,
+                'descartes': self.descartes, 'invalidacoes': self.invalidacoes}
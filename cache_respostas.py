@@ -0,0 +1,183 @@
+# cache_respostas.py
+# Cache em disco das respostas finais do agente. Perguntas repetidas ("vendas naval 2023",
+# os botões de sugestão do app) voltam na hora e sem custo de LLM. A chave é a pergunta
+# normalizada (acentos, caixa, espaços, sinônimos) + regime/período extraídos + versão do
+# banco; perguntas que dependem da conversa ("e em 2023?", "compare com isso") não usam o cache.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from conexao_sqlite import NOME_BANCO_SQLITE
+from roteador_intencoes import (
+    MESES_SEM_ACENTO, PALAVRAS_BRUTO, PALAVRAS_LIQUIDO, PALAVRAS_METRICA, PALAVRAS_NEUTRAS,
+    PALAVRAS_PENDENTE, PALAVRAS_POR_MES, PALAVRAS_REGIME, extrair_filtros, normalizar_texto,
+)
+from rastreamento import obter_logger
+
+# --- Constantes ---
+ARQUIVO_CACHE_RESPOSTAS = "./cache_respostas.db"
+TTL_RESPOSTA_S = 6 * 3600 # Resposta vale por 6h mesmo sem carga nova (o prompt/modelo pode mudar)
+MAX_RESPOSTAS = 500 # Acima disso as menos acessadas recentemente saem (LRU)
+MAX_BYTES_RESPOSTA = 256 * 1024 # Respostas maiores não entram no cache
+CACHE_RESPOSTAS_ATIVO = os.getenv("CACHE_RESPOSTAS", "1") != "0"
+
+# Sinônimos -> forma canônica ('vendemos' = 'vendas', 'maio' = 'mes_5', 'mensal' = 'por_mes'...).
+# Mês por nome não vira só o número: 'top 5 ... maio' e 'top ... maio' são perguntas diferentes.
+SINONIMOS = {
+    **PALAVRAS_METRICA,
+    **dict.fromkeys(PALAVRAS_LIQUIDO, 'liquido'), **dict.fromkeys(PALAVRAS_BRUTO, 'bruto'),
+    **dict.fromkeys(PALAVRAS_PENDENTE, 'pendente'), **dict.fromkeys(PALAVRAS_POR_MES, 'por_mes'),
+    **PALAVRAS_REGIME, **{nome: f'mes_{numero}' for nome, numero in MESES_SEM_ACENTO.items()},
+}
+# Resposta depende do dia de hoje: a data entra na chave
+PALAVRAS_TEMPO_RELATIVO = {
+    'hoje', 'ontem', 'atual', 'atualmente', 'corrente', 'recente', 'recentes', 'este', 'esta', 'deste', 'desta',
+    'neste', 'nesta', 'passado', 'passada', 'ultimo', 'ultima', 'ultimos', 'ultimas', 'semana', 'dia', 'diario', 'ytd',
+    'gerencial',
+}
+# Pergunta que remete à conversa anterior: a resposta não depende só do texto
+PALAVRAS_CONTEXTO = {
+    'isso', 'isto', 'disso', 'disto', 'nisso', 'esse', 'essa', 'esses', 'essas', 'desse', 'dessa', 'nesse', 'nessa',
+    'aquele', 'aquela', 'ele', 'ela', 'eles', 'elas', 'dele', 'dela', 'mesmo', 'mesma', 'anterior', 'anteriores', 'acima',
+    'tambem', 'compare', 'comparar', 'comparando', 'compara', 'agora',
+}
+MAX_PALAVRAS_SEM_METRICA = 3 # "naval?", "e 2023?" depois de outra pergunta = continuação
+
+log = obter_logger("cache_respostas")
+
+
+def versao_dados() -> tuple:
+    """(inode, mtime, tamanho) do banco e do -wal com conteúdo. Ao contrário de versao_banco(), sobrevive a reinícios."""
+    versao = []
+    for caminho in (NOME_BANCO_SQLITE, NOME_BANCO_SQLITE + "-wal"):
+        try:
+            info = os.stat(caminho)
+        except FileNotFoundError:
+            continue
+        if info.st_size:
+            versao.append((info.st_ino, info.st_mtime_ns, info.st_size))
+    return tuple(versao)
+
+
+def depende_da_conversa(palavras: list[str], turnos_anteriores: int) -> bool:
+    if not turnos_anteriores:
+        return False
+    if palavras[0] == 'e' or any(p in PALAVRAS_CONTEXTO for p in palavras):
+        return True
+    return len(palavras) <= MAX_PALAVRAS_SEM_METRICA and not any(p in PALAVRAS_METRICA for p in palavras)
+
+
+def texto_canonico(texto: str) -> str:
+    """
+    'Quanto vendemos em Maio de 2024?' -> 'vendas mes_5 2024' (sinônimos trocados, palavras neutras
+    fora). A ordem e as repetições ficam: 'offshore 2023 e naval 2024' != 'naval 2023 e offshore 2024'.
+    """
+    return ' '.join(SINONIMOS.get(p, p) for p in texto.replace('/', ' ').split() if p not in PALAVRAS_NEUTRAS)
+
+
+class CacheRespostas:
+    """
+    Tabela respostas(chave, pergunta, resposta, criado, acessado) num SQLite próprio.
+    Cada operação abre e fecha a conexão (o app roda várias sessões em threads).
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_CACHE_RESPOSTAS, ttl_s: float = TTL_RESPOSTA_S,
+                 max_itens: int = MAX_RESPOSTAS, funcao_versao=versao_dados):
+        self.caminho = caminho
+        self.ttl_s = ttl_s
+        self.max_itens = max_itens
+        self.funcao_versao = funcao_versao
+        self._trava = threading.Lock()
+        self._tabela_criada = False
+        self.acertos = self.falhas = self.ignoradas = 0
+
+    @contextmanager
+    def _conectar(self):
+        """Conexão curta: commit no fim do bloco (rollback se der erro) e fecha."""
+        conn = sqlite3.connect(self.caminho, timeout=5)
+        try:
+            if not self._tabela_criada:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY, pergunta TEXT, resposta TEXT, criado REAL, acessado REAL)""")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acessado ON respostas (acessado)")
+                self._tabela_criada = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def chave(self, pergunta: str, turnos_anteriores: int = 0) -> str | None:
+        """Chave da pergunta na versão atual dos dados, ou None se ela não pode usar o cache."""
+        texto = normalizar_texto(pergunta or '')
+        palavras = texto.replace('/', ' ').split()
+        if not palavras or depende_da_conversa(palavras, turnos_anteriores):
+            with self._trava: self.ignoradas += 1
+            return None
+        filtros = extrair_filtros(texto)
+        partes = {
+            'texto': texto_canonico(texto),
+            'regimes': sorted(filtros['regimes']), 'anos': sorted(filtros['anos']),
+            'meses': sorted(filtros['meses']), 'por_mes': filtros['por_mes'],
+            'versao': self.funcao_versao(),
+            'dia': date.today().isoformat() if any(p in PALAVRAS_TEMPO_RELATIVO for p in palavras) else None,
+        }
+        return hashlib.sha256(json.dumps(partes, sort_keys=True).encode()).hexdigest()
+
+    def obter(self, chave: str | None) -> str | None:
+        if chave is None:
+            return None
+        agora = time.time()
+        try:
+            with self._trava, self._conectar() as conn:
+                linha = conn.execute("SELECT resposta, criado FROM respostas WHERE chave = ?", (chave,)).fetchone()
+                if linha and agora - linha[1] <= self.ttl_s:
+                    conn.execute("UPDATE respostas SET acessado = ? WHERE chave = ?", (agora, chave))
+                    self.acertos += 1
+                    return linha[0]
+                if linha:
+                    conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,)) # Expirada
+                self.falhas += 1
+        except sqlite3.Error as e:
+            log.warning("Cache de respostas indisponível (%s)", e)
+        return None
+
+    def guardar(self, chave: str | None, pergunta: str, resposta) -> bool:
+        """Guarda só respostas de texto bem-sucedidas (erros e pedidos de desculpa não)."""
+        if chave is None or not isinstance(resposta, str) or not resposta.strip():
+            return False
+        if resposta.startswith(("Desculpe", "Erro")) or len(resposta.encode()) > MAX_BYTES_RESPOSTA:
+            return False
+        agora = time.time()
+        try:
+            with self._trava, self._conectar() as conn:
+                conn.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?)", (chave, pergunta, resposta, agora, agora))
+                conn.execute("DELETE FROM respostas WHERE criado < ?", (agora - self.ttl_s,))
+                conn.execute("""DELETE FROM respostas WHERE chave IN (
+                    SELECT chave FROM respostas ORDER BY acessado DESC LIMIT -1 OFFSET ?)""", (self.max_itens,))
+            return True
+        except sqlite3.Error as e:
+            log.warning("Não foi possível gravar no cache de respostas (%s)", e)
+            return False
+
+    def limpar(self) -> None:
+        with self._trava, self._conectar() as conn:
+            conn.execute("DELETE FROM respostas")
+
+    def estatisticas(self) -> dict:
+        try:
+            with self._trava, self._conectar() as conn:
+                itens = conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        except sqlite3.Error:
+            itens = None
+        return {'itens': itens, 'acertos': self.acertos, 'falhas': self.falhas, 'ignoradas': self.ignoradas}
+
+
+# Cache único do processo (compartilhado por todas as sessões do Streamlit)
+cache_respostas = CacheRespostas() if CACHE_RESPOSTAS_ATIVO else None
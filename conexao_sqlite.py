@@ -0,0 +1,156 @@
+# conexao_sqlite.py
+# Pool de conexões SQLite de leitura reaproveitadas entre as consultas das ferramentas
+# (e entre as sessões do Streamlit), com PRAGMAs de leitura e verificação de saúde.
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# --- Constantes ---
+NOME_BANCO_SQLITE = 'meus_dados.db'
+MMAP_SIZE_BYTES = 256 * 1024 * 1024 # Banco lido via memory map (o arquivo atual cabe inteiro)
+CACHE_SIZE_KIB = 64 * 1024 # Cache de páginas por conexão (PRAGMA cache_size negativo = KiB)
+STATEMENTS_EM_CACHE = 256 # Statements preparados guardados por conexão (padrão do sqlite3: 128)
+MAX_CONEXOES_OCIOSAS = 8 # Conexões guardadas no pool; as que sobrarem são fechadas na devolução
+
+PRAGMAS_LEITURA = (
+    "PRAGMA query_only = ON",
+    f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KIB}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class _ConexaoPool(sqlite3.Connection):
+    """Conexão com o atributo 'geracao_pool' (sqlite3.Connection não aceita atributos novos)."""
+    geracao_pool = None
+
+
+class PoolConexoesLeitura:
+    """
+    Cada conexão é usada por uma thread de cada vez (emprestada em conexao() e devolvida
+    no fim do bloco), então pode passar de uma thread para outra com segurança.
+    Conexões de uma geração antiga (reset()) ou de um arquivo que foi trocado no disco
+    são fechadas e reabertas na próxima vez que forem emprestadas.
+    """
+
+    def __init__(self, caminho: str = NOME_BANCO_SQLITE, max_ociosas: int = MAX_CONEXOES_OCIOSAS):
+        self.caminho = caminho
+        self.ociosas = queue.LifoQueue(maxsize=max_ociosas) # LIFO: reusa a conexão com cache mais quente
+        self.geracao = 0
+        self._trava = threading.Lock()
+        self.abertas = self.reaproveitadas = 0
+
+    def _identidade_arquivo(self) -> tuple[int, int] | None:
+        try:
+            info = os.stat(self.caminho)
+            return (info.st_dev, info.st_ino)
+        except FileNotFoundError:
+            return None
+
+    def _abrir(self) -> sqlite3.Connection:
+        # mode=rw: não cria um banco vazio se o arquivo não existir (erro claro em vez de "no such table")
+        caminho_uri = f"file:{os.path.abspath(self.caminho)}?mode=rw"
+        conn = sqlite3.connect(caminho_uri, uri=True, check_same_thread=False,
+                               cached_statements=STATEMENTS_EM_CACHE, factory=_ConexaoPool)
+        for pragma in PRAGMAS_LEITURA:
+            conn.execute(pragma)
+        conn.geracao_pool = (self.geracao, self._identidade_arquivo())
+        with self._trava:
+            self.abertas += 1
+        return conn
+
+    def _valida(self, conn: sqlite3.Connection) -> bool:
+        """Health check: mesma geração, mesmo arquivo e conexão respondendo."""
+        if conn.geracao_pool != (self.geracao, self._identidade_arquivo()):
+            return False
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _emprestar(self) -> sqlite3.Connection:
+        while True:
+            try:
+                conn = self.ociosas.get_nowait()
+            except queue.Empty:
+                return self._abrir()
+            if self._valida(conn):
+                with self._trava:
+                    self.reaproveitadas += 1
+                return conn
+            _fechar(conn)
+
+    def _devolver(self, conn: sqlite3.Connection) -> None:
+        if conn.geracao_pool[0] != self.geracao:
+            _fechar(conn); return
+        try:
+            self.ociosas.put_nowait(conn)
+        except queue.Full:
+            _fechar(conn)
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão de leitura. Se a consulta der erro de SQLite, a conexão é descartada."""
+        conn = self._emprestar()
+        try:
+            yield conn
+        except sqlite3.Error:
+            _fechar(conn); conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._devolver(conn)
+
+    def reset(self) -> None:
+        """Descarta todas as conexões (ex: depois de uma carga). As emprestadas são fechadas ao voltar."""
+        with self._trava:
+            self.geracao += 1
+        while True:
+            try:
+                _fechar(self.ociosas.get_nowait())
+            except queue.Empty:
+                return
+
+    def versao_banco(self) -> tuple:
+        """
+        Token que muda a cada carga: geração do pool + (inode, mtime, tamanho) do banco e do
+        arquivo -wal (em WAL os commits vão primeiro para o -wal). Custa dois os.stat().
+        """
+        versao = [self.geracao]
+        for caminho in (self.caminho, self.caminho + "-wal"):
+            try:
+                info = os.stat(caminho)
+                versao.append((info.st_ino, info.st_mtime_ns, info.st_size))
+            except FileNotFoundError:
+                versao.append(None)
+        return tuple(versao)
+
+    def estatisticas(self) -> dict:
+        return {'abertas': self.abertas, 'reaproveitadas': self.reaproveitadas, 'ociosas': self.ociosas.qsize(), 'geracao': self.geracao}
+
+
+def _fechar(conn: sqlite3.Connection) -> None:
+    try: conn.close()
+    except Exception: pass
+
+
+# Pool único do processo (compartilhado por todas as sessões do Streamlit)
+pool_leitura = PoolConexoesLeitura()
+
+
+def conexao_leitura():
+    """Atalho para pool_leitura.conexao(): 'with conexao_leitura() as conn: ...'."""
+    return pool_leitura.conexao()
+
+
+def versao_banco() -> tuple:
+    return pool_leitura.versao_banco()
+
+
+def resetar_conexoes() -> None:
+    """Hook para depois da ingestão: a próxima consulta abre conexões novas."""
+    pool_leitura.reset()
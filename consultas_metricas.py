@@ -0,0 +1,307 @@
+# consultas_metricas.py
+# Monta as consultas das ferramentas de métricas do agente (vendas, faturamento, BMs e
+# relatórios pendentes) como um conjunto FIXO de SQLs com parâmetros (?): ano, mês e
+# regime entram como valores, nunca no texto. O mesmo formato de pergunta reaproveita o
+# statement preparado do sqlite3 e a mesma chave no cache de resultados.
+# Também monta o cubo de métricas (métrica x regime x ano-mês) gravado na ingestão.
+
+import math
+import sqlite3
+from dataclasses import dataclass
+
+# --- Constantes Locais ---
+NOME_BANCO_SQLITE = 'meus_dados.db'
+NOME_TABELA_PRINCIPAL_SQL = 'minha_tabela_principal'
+NOME_TABELA_CUBO = 'cubo_metricas'
+
+# --- Constantes das Colunas ---
+REGIME_COL = 'servico_regime'
+SALES_VALUE_COL = 'valor_venda_total'; SALES_DATE_COL = 'data_recebimento_po'
+BM_LIBERACAO_COL = 'data_liberacao_bm'; BM_DATE_COL = 'data_envio_relatorios'
+REPORT_ENVIO_COL = 'data_envio_relatorios'; REPORT_DATE_COL = 'data_final_atendimento'
+FAT_DATE_COL = 'data_faturamento'; FAT_STATUS_COL = 'atendimento_andamento'
+FAT_GROSS_VALUE_COL = 'valor_venda_total'; FAT_NET_VALUE_COL = 'valor_venda_servico_desc'
+FAT_VALID_STATUS_LIST = ('Falta Recebimento', 'Finalizado Com Faturamento')
+FAT_VALID_STATUSES = ", ".join(f"'{status}'" for status in FAT_VALID_STATUS_LIST)
+# Condições base (serão combinadas com o filtro de regime)
+FAT_BASE_CONDITIONS_LIST = [f"{FAT_DATE_COL} IS NOT NULL", f"{FAT_STATUS_COL} IN ({FAT_VALID_STATUSES})"]
+REPORT_PENDING_CONDITION_LIST = [f"{REPORT_ENVIO_COL} IS NULL"]
+BM_PENDING_CONDITION_LIST = [f"{BM_LIBERACAO_COL} IS NULL", f"{BM_DATE_COL} IS NOT NULL"]
+
+REGIMES_VALIDOS = ('Naval', 'Offshore')
+PERIODOS = ('total', 'ano', 'mes', 'por_mes')
+MESES_PT = {'janeiro': 1, 'fevereiro': 2, 'março': 3, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6,
+            'julho': 7, 'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12}
+
+
+@dataclass(frozen=True)
+class Metrica:
+    coluna_data: str # Data usada nos filtros de ano/mês e no agrupamento mensal
+    agregacao: str # SUM(...) ou COUNT(*)
+    condicoes: tuple[str, ...] # Sempre aplicadas
+    condicoes_periodo: tuple[str, ...] = () # Aplicadas só quando há filtro/agrupamento por data
+
+
+METRICAS = {
+    'vendas': Metrica(SALES_DATE_COL, f"SUM({SALES_VALUE_COL})", (f"{SALES_DATE_COL} IS NOT NULL",)),
+    'faturamento_bruto': Metrica(FAT_DATE_COL, f"SUM({FAT_GROSS_VALUE_COL})", tuple(FAT_BASE_CONDITIONS_LIST)),
+    'faturamento_liquido': Metrica(FAT_DATE_COL, f"SUM({FAT_NET_VALUE_COL})", tuple(FAT_BASE_CONDITIONS_LIST)),
+    'bms_pendentes': Metrica(BM_DATE_COL, "COUNT(*)", tuple(BM_PENDING_CONDITION_LIST)),
+    'relatorios_pendentes': Metrica(REPORT_DATE_COL, "COUNT(*)", tuple(REPORT_PENDING_CONDITION_LIST),
+                                    (f"{REPORT_DATE_COL} IS NOT NULL",)),
+}
+
+
+def normalizar_regime(regime: str | None) -> str | None:
+    """'naval ' -> 'Naval'. Qualquer coisa fora de REGIMES_VALIDOS vira None (sem filtro)."""
+    if not regime:
+        return None
+    regime = str(regime).strip().capitalize()
+    return regime if regime in REGIMES_VALIDOS else None
+
+
+def resolver_mes(month_input) -> int | None:
+    """Nome em português ou número -> 1..12 (None se inválido)."""
+    texto = str(month_input).lower().strip()
+    mes = MESES_PT.get(texto) or (int(texto) if texto.isdigit() else None)
+    return mes if mes and 1 <= mes <= 12 else None
+
+
+def intervalo_datas(ano: int, mes: int | None = None) -> tuple[str, str]:
+    """[início, fim) em texto ISO, do ano inteiro ou de um mês."""
+    if mes is None:
+        return f"{ano:04d}-01-01", f"{ano + 1:04d}-01-01"
+    proximo_ano, proximo_mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return f"{ano:04d}-{mes:02d}-01", f"{proximo_ano:04d}-{proximo_mes:02d}-01"
+
+
+def montar_where(condicoes: list[str] | tuple[str, ...], regime: str | None = None) -> tuple[str, list]:
+    """WHERE com as condições fixas + 'regime = ?'. Retorna (clausula, params)."""
+    condicoes, params = list(condicoes), []
+    if regime:
+        condicoes.append(f"{REGIME_COL} = ?"); params.append(regime)
+    return ("WHERE " + " AND ".join(condicoes) if condicoes else ""), params
+
+
+def _sql_metrica(metrica: Metrica, periodo: str, com_regime: bool) -> str:
+    condicoes = list(metrica.condicoes)
+    if periodo != 'total':
+        condicoes += metrica.condicoes_periodo
+    if periodo in ('ano', 'mes'):
+        condicoes += [f"{metrica.coluna_data} >= ?", f"{metrica.coluna_data} < ?"]
+    elif periodo == 'por_mes':
+        condicoes.append(f"{metrica.coluna_data} IS NOT NULL")
+    if com_regime:
+        condicoes.append(f"{REGIME_COL} = ?")
+    where = "WHERE " + " AND ".join(dict.fromkeys(condicoes)) # dict.fromkeys: remove repetidas, mantém a ordem
+    if periodo == 'por_mes':
+        return (f"SELECT strftime('%Y-%m', {metrica.coluna_data}) AS Mes, {metrica.agregacao} AS Total "
+                f"FROM {NOME_TABELA_PRINCIPAL_SQL} {where} GROUP BY Mes ORDER BY Mes;")
+    return f"SELECT {metrica.agregacao} FROM {NOME_TABELA_PRINCIPAL_SQL} {where};"
+
+
+# Todos os formatos possíveis, montados uma vez: {(metrica, periodo, com_regime): sql}
+CONSULTAS = {(nome, periodo, com_regime): _sql_metrica(metrica, periodo, com_regime)
+             for nome, metrica in METRICAS.items() for periodo in PERIODOS for com_regime in (False, True)}
+
+
+def consulta_metrica(metrica: str, periodo: str = 'total', regime: str | None = None,
+                     ano: int | None = None, mes: int | None = None) -> tuple[str, list]:
+    """
+    Retorna (sql, params) de uma métrica. periodo: 'total', 'ano' (precisa de ano),
+    'mes' (ano e mes) ou 'por_mes' (colunas Mes, Total). regime já normalizado ou None.
+    """
+    if metrica not in METRICAS:
+        raise ValueError(f"Métrica desconhecida: {metrica}")
+    if periodo not in PERIODOS:
+        raise ValueError(f"Período desconhecido: {periodo}")
+    params = []
+    if periodo == 'ano':
+        params += intervalo_datas(int(ano))
+    elif periodo == 'mes':
+        params += intervalo_datas(int(ano), int(mes))
+    if regime:
+        params.append(regime)
+    return CONSULTAS[(metrica, periodo, bool(regime))], params
+
+
+# --- Relatório Gerencial (uma consulta, um plano compartilhado) ---
+# Todos os indicadores saem de UMA consulta: um UNION ALL de agregações, cada uma usando o
+# índice de cobertura da sua métrica (ver esquema_dados.INDICES), que devolve pares
+# (chave, valor) com a chave já igual à de report_data ('faturamento_total_periodo',
+# 'vendas_mai', ...). Parâmetros nomeados: :inicio e :fim (YTD, fim inclusivo, como no
+# relatório) e :inicio_historico (totais "desde 2019").
+MESES_RELATORIO = ('jan', 'fev', 'mar', 'abr', 'mai', 'jun', 'jul', 'ago', 'set', 'out', 'nov', 'dez')
+INICIO_HISTORICO_RELATORIO = '2019-01-01'
+
+
+def _sql_relatorio_gerencial() -> str:
+    tabela = NOME_TABELA_PRINCIPAL_SQL
+    ytd = lambda col: [f"{col} >= :inicio", f"{col} <= :fim"]
+    where = lambda condicoes: "WHERE " + " AND ".join(condicoes)
+    fat_ytd = where(FAT_BASE_CONDITIONS_LIST + ytd(FAT_DATE_COL))
+    vendas_ytd = where(ytd(SALES_DATE_COL) + [f"{SALES_DATE_COL} IS NOT NULL"])
+    bm_ytd = where(BM_PENDING_CONDITION_LIST + ytd(BM_DATE_COL))
+    bm_hist = where(BM_PENDING_CONDITION_LIST + [f"{BM_DATE_COL} >= :inicio_historico"])
+    rp_ytd = where(REPORT_PENDING_CONDITION_LIST + ytd(REPORT_DATE_COL) + [f"{REPORT_DATE_COL} IS NOT NULL"])
+    rp_hist = where(REPORT_PENDING_CONDITION_LIST + [f"{REPORT_DATE_COL} >= :inicio_historico", f"{REPORT_DATE_COL} IS NOT NULL"])
+    # '05' -> 'mai' (texto de data inválido -> chave NULL, ignorada como no relatório antigo)
+    mes = lambda col: f"substr('{''.join(MESES_RELATORIO)}', strftime('%m', {col}) * 3 - 2, 3)"
+    partes = [
+        f"SELECT 'faturamento_total_periodo', COALESCE(SUM({FAT_GROSS_VALUE_COL}), 0.0) FROM {tabela} {fat_ytd}",
+        f"SELECT 'faturamento_' || {mes(FAT_DATE_COL)}, COALESCE(SUM({FAT_GROSS_VALUE_COL}), 0.0) FROM {tabela} {fat_ytd} GROUP BY 1",
+        f"SELECT 'vendas_total_periodo', COALESCE(SUM({SALES_VALUE_COL}), 0.0) FROM {tabela} {vendas_ytd}",
+        f"SELECT 'vendas_' || {mes(SALES_DATE_COL)}, COALESCE(SUM({SALES_VALUE_COL}), 0.0) FROM {tabela} {vendas_ytd} GROUP BY 1",
+        f"SELECT 'bm_pendente_itens_total_periodo', COUNT(*) FROM {tabela} {bm_ytd}",
+        f"SELECT 'bm_pendente_valor_total_periodo', COALESCE(SUM({SALES_VALUE_COL}), 0.0) FROM {tabela} {bm_ytd}",
+        f"SELECT 'bm_pendente_' || {mes(BM_DATE_COL)}, COUNT(*) FROM {tabela} {bm_ytd} GROUP BY 1",
+        f"SELECT 'bm_pendente_valor_total_historico', COALESCE(SUM({SALES_VALUE_COL}), 0.0) FROM {tabela} {bm_hist}",
+        f"SELECT 'relatorios_pendentes_itens_total_periodo', COUNT(*) FROM {tabela} {rp_ytd}",
+        f"SELECT 'relatorios_pendentes_valor_total_periodo', COALESCE(SUM({SALES_VALUE_COL}), 0.0) FROM {tabela} {rp_ytd}",
+        f"SELECT 'relatorios_pendentes_' || {mes(REPORT_DATE_COL)}, COUNT(*) FROM {tabela} {rp_ytd} GROUP BY 1",
+        f"SELECT 'relatorios_pendentes_valor_total_historico', COALESCE(SUM({SALES_VALUE_COL}), 0.0) FROM {tabela} {rp_hist}",
+    ]
+    return "\nUNION ALL\n".join(partes) + ";"
+
+
+CONSULTA_RELATORIO_GERENCIAL = _sql_relatorio_gerencial()
+
+
+def params_relatorio_gerencial(inicio: str, fim: str, inicio_historico: str = INICIO_HISTORICO_RELATORIO) -> dict:
+    return {'inicio': inicio, 'fim': fim, 'inicio_historico': inicio_historico}
+
+
+# --- Cubo de Métricas ---
+# Uma linha por (métrica, regime, ano-mês, tem_data) com SUM e COUNT já calculados.
+# 'regime' é o valor bruto de servico_regime (o filtro das ferramentas é por igualdade).
+# 'ano_mes' é strftime('%Y-%m', data): NULL quando a data é nula OU é um texto que não é
+# data (ex: '30/02'); 'tem_data' separa os dois casos (as consultas por período exigem
+# data não nula, e o agrupamento mensal mostra o grupo NULL dos textos inválidos).
+# Ano/mês no cubo comparam 'ano_mes'; na tabela bruta comparam o texto da data. Os dois
+# só divergiriam para um texto inválido dentro da faixa (ex: '2024-05-99'): ver
+# verificar_consistencia_cubo().
+
+def _sql_construir_cubo(nome: str, metrica: Metrica) -> str:
+    soma = metrica.agregacao if metrica.agregacao.startswith("SUM") else "NULL"
+    where = "WHERE " + " AND ".join(metrica.condicoes)
+    return (f"INSERT INTO {NOME_TABELA_CUBO} (metrica, regime, ano_mes, tem_data, valor, qtd) "
+            f"SELECT '{nome}', {REGIME_COL}, strftime('%Y-%m', {metrica.coluna_data}), {metrica.coluna_data} IS NOT NULL, "
+            f"{soma}, COUNT(*) FROM {NOME_TABELA_PRINCIPAL_SQL} {where} GROUP BY 2, 3, 4;")
+
+
+def preencher_cubo_metricas(conn: sqlite3.Connection) -> int:
+    """
+    (Re)cria o cubo a partir da tabela principal, sem commit: roda dentro da transação de quem
+    chama (a carga grava tabela e cubo juntos). Retorna o número de linhas do cubo.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {NOME_TABELA_CUBO}")
+    conn.execute(f"CREATE TABLE {NOME_TABELA_CUBO} (metrica TEXT NOT NULL, regime TEXT, ano_mes TEXT, "
+                 f"tem_data INTEGER NOT NULL, valor REAL, qtd INTEGER NOT NULL)")
+    for nome, metrica in METRICAS.items():
+        conn.execute(_sql_construir_cubo(nome, metrica))
+    conn.execute(f"CREATE INDEX idx_{NOME_TABELA_CUBO} ON {NOME_TABELA_CUBO} (metrica, regime, ano_mes, tem_data, valor, qtd)")
+    return conn.execute(f"SELECT COUNT(*) FROM {NOME_TABELA_CUBO}").fetchone()[0]
+
+
+def construir_cubo_metricas(conn: sqlite3.Connection) -> int:
+    """(Re)cria o cubo a partir da tabela principal, numa transação própria. Retorna o número de linhas do cubo."""
+    conn.execute("BEGIN IMMEDIATE") # Sem isso o sqlite3 roda DROP/CREATE fora da transação e o agente pode ver o cubo vazio
+    with conn:
+        return preencher_cubo_metricas(conn)
+
+
+def _sql_metrica_cubo(metrica: Metrica, periodo: str, com_regime: bool) -> str:
+    # COUNT(*) vira SUM(qtd); COALESCE mantém o 0 inteiro quando não há linhas (igual ao COUNT)
+    agregacao = "SUM(valor)" if metrica.agregacao.startswith("SUM") else "COALESCE(SUM(qtd), 0)"
+    condicoes = ["metrica = ?"]
+    if periodo != 'total' and (metrica.condicoes_periodo or periodo == 'por_mes'):
+        condicoes.append("tem_data = 1")
+    if periodo in ('ano', 'mes'):
+        condicoes += ["ano_mes >= ?", "ano_mes <= ?"]
+    if com_regime:
+        condicoes.append("regime = ?")
+    where = "WHERE " + " AND ".join(condicoes)
+    if periodo == 'por_mes':
+        return f"SELECT ano_mes AS Mes, {agregacao} AS Total FROM {NOME_TABELA_CUBO} {where} GROUP BY ano_mes ORDER BY ano_mes;"
+    return f"SELECT {agregacao} FROM {NOME_TABELA_CUBO} {where};"
+
+
+CONSULTAS_CUBO = {(nome, periodo, com_regime): _sql_metrica_cubo(metrica, periodo, com_regime)
+                  for nome, metrica in METRICAS.items() for periodo in PERIODOS for com_regime in (False, True)}
+
+
+def consulta_metrica_cubo(metrica: str, periodo: str = 'total', regime: str | None = None,
+                          ano: int | None = None, mes: int | None = None) -> tuple[str, list]:
+    """Mesmo contrato de consulta_metrica(), respondendo pelo cubo (resultado equivalente)."""
+    if metrica not in METRICAS:
+        raise ValueError(f"Métrica desconhecida: {metrica}")
+    if periodo not in PERIODOS:
+        raise ValueError(f"Período desconhecido: {periodo}")
+    params = [metrica]
+    if periodo == 'ano':
+        params += [f"{int(ano):04d}-01", f"{int(ano):04d}-12"]
+    elif periodo == 'mes':
+        params += [f"{int(ano):04d}-{int(mes):02d}"] * 2
+    if regime:
+        params.append(regime)
+    return CONSULTAS_CUBO[(metrica, periodo, bool(regime))], params
+
+
+def valores_iguais(a, b) -> bool:
+    """Igualdade de resultados de consulta (floats com tolerância de arredondamento)."""
+    if isinstance(a, float) or isinstance(b, float):
+        return a is not None and b is not None and math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
+def casos_verificacao(anos_meses: list[str]) -> list[tuple[str, dict]]:
+    """(periodo, args) de todos os períodos a comparar: total, cada ano e cada mês de 'anos_meses' ('YYYY-MM') e por_mes."""
+    anos = sorted({int(am[:4]) for am in anos_meses})
+    return ([('total', {})] + [('ano', {'ano': a}) for a in anos]
+            + [('mes', {'ano': int(am[:4]), 'mes': int(am[5:7])}) for am in anos_meses] + [('por_mes', {})])
+
+
+def verificar_consistencia_cubo(conn: sqlite3.Connection) -> list[str]:
+    """
+    Compara cubo x tabela bruta em todas as métricas/períodos/regimes (anos e meses
+    presentes nos dados). Retorna a lista de divergências (vazia = consistente).
+    """
+    anos_meses = [linha[0] for linha in conn.execute(
+        f"SELECT DISTINCT ano_mes FROM {NOME_TABELA_CUBO} WHERE ano_mes IS NOT NULL ORDER BY 1").fetchall()]
+    casos = casos_verificacao(anos_meses)
+    divergencias = []
+    for metrica in METRICAS:
+        for regime in (None,) + REGIMES_VALIDOS:
+            for periodo, args in casos:
+                sql_bruto, params_bruto = consulta_metrica(metrica, periodo, regime, **args)
+                sql_cubo, params_cubo = consulta_metrica_cubo(metrica, periodo, regime, **args)
+                bruto = conn.execute(sql_bruto, params_bruto).fetchall()
+                cubo = conn.execute(sql_cubo, params_cubo).fetchall()
+                if bruto == [(None,)] and cubo == [(None,)]:
+                    continue
+                if bruto == [(None,)]: bruto = [(0,)] if "COUNT" in sql_bruto else bruto # COUNT nunca é NULL
+                iguais = len(bruto) == len(cubo) and all(len(lb) == len(lc) and all(valores_iguais(x, y) for x, y in zip(lb, lc))
+                                                          for lb, lc in zip(bruto, cubo))
+                if not iguais:
+                    divergencias.append(f"{metrica}/{periodo}/{regime or 'todos'} {args}: tabela={bruto[:3]} cubo={cubo[:3]}")
+    return divergencias
+
+
+def consultas_para_verificacao() -> dict[str, tuple[str, list]]:
+    """Todas as CONSULTAS com parâmetros de exemplo, no formato de esquema_dados.verificar_planos_consulta."""
+    exemplos = {}
+    for (metrica, periodo, com_regime) in CONSULTAS:
+        nome = f"{metrica}_{periodo}" + ("_regime" if com_regime else "")
+        exemplos[nome] = consulta_metrica(metrica, periodo, 'Naval' if com_regime else None, ano=2024, mes=5)
+    return exemplos
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(NOME_BANCO_SQLITE)
+    try:
+        divergencias = verificar_consistencia_cubo(conn)
+        for d in divergencias:
+            print(f"DIVERGENTE {d}")
+        print("Cubo de métricas consistente com a tabela principal." if not divergencias else f"{len(divergencias)} divergências encontradas.")
+    finally:
+        conn.close()
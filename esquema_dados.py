@@ -0,0 +1,182 @@
+# esquema_dados.py
+# Esquema tipado da tabela principal, índices usados pelas ferramentas do agente
+# e verificação dos planos de consulta (EXPLAIN QUERY PLAN).
+
+import sqlite3
+import math
+from datetime import datetime, date
+
+import pandas as pd
+
+from consultas_metricas import consultas_para_verificacao
+
+# --- Constantes Locais ---
+NOME_BANCO_SQLITE = 'meus_dados.db'
+NOME_TABELA_PRINCIPAL = 'minha_tabela_principal'
+
+# --- Tipos das Colunas ---
+# Datas são gravadas como TEXT no formato ISO 'YYYY-MM-DD' (o SQLite não tem tipo DATE;
+# texto ISO mantém a comparação por faixa e o strftime funcionando).
+COLUNAS_DATA_EXTRAS = {'reagendado_para'} # Datas que não começam com 'data_'
+COLUNAS_REAL = {'desconto_percentual', 'prazo_em_dias'} # Além de todas as 'valor_*'
+COLUNAS_INTEGER = {'atendimento_num', 'atendimento_reagendamento', 'ref_documento'}
+# Formatos aceitos quando a célula de data vem como texto
+FORMATOS_DATA_TEXTO = ('%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y')
+# Planilha usa o formato contábil do Excel: ' R$ -   ' significa zero
+VALORES_ZERO_CONTABIL = {'R$ -', 'R$-', '-'}
+
+
+def eh_coluna_data(coluna: str) -> bool:
+    return coluna.startswith('data_') or coluna in COLUNAS_DATA_EXTRAS
+
+
+def tipo_coluna(coluna: str) -> str:
+    """Tipo SQLite declarado para a coluna. Colunas desconhecidas ficam como TEXT."""
+    if eh_coluna_data(coluna): return 'TEXT'
+    if coluna.startswith('valor_') or coluna in COLUNAS_REAL: return 'REAL'
+    if coluna in COLUNAS_INTEGER: return 'INTEGER'
+    return 'TEXT'
+
+
+def esquema_esperado(colunas: list[str]) -> list[tuple[str, str]]:
+    return [(c, tipo_coluna(c)) for c in colunas]
+
+
+def sql_criar_tabela(colunas: list[str], nome_tabela: str = NOME_TABELA_PRINCIPAL) -> str:
+    definicoes = ", ".join(f'"{c}" {t}' for c, t in esquema_esperado(colunas))
+    return f"CREATE TABLE {nome_tabela} ({definicoes})"
+
+
+def _vazio(valor) -> bool:
+    return valor is None or valor is pd.NaT or (isinstance(valor, float) and math.isnan(valor))
+
+
+def _normalizar_data(valor):
+    """datetime -> 'YYYY-MM-DD'. Texto que não é data é mantido (não vira NULL, para não mudar filtros IS NULL)."""
+    if _vazio(valor): return None
+    if isinstance(valor, (datetime, date, pd.Timestamp)): return valor.strftime('%Y-%m-%d')
+    texto = str(valor).strip()
+    if not texto: return None
+    for formato in FORMATOS_DATA_TEXTO:
+        try: return datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+        except ValueError: continue
+    return texto
+
+
+def _normalizar_real(valor):
+    if _vazio(valor): return None
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool): return float(valor)
+    texto = str(valor).strip()
+    if not texto: return None
+    if texto in VALORES_ZERO_CONTABIL: return 0.0
+    try: return float(texto)
+    except ValueError: return texto # Mantém o original; o SQLite aceita texto em coluna REAL
+
+
+def _normalizar_integer(valor):
+    if _vazio(valor): return None
+    if isinstance(valor, float) and valor.is_integer(): return int(valor)
+    if isinstance(valor, int): return valor
+    texto = str(valor).strip()
+    if not texto: return None
+    try: return int(texto)
+    except ValueError: return texto
+
+
+def _normalizar_texto(valor):
+    if _vazio(valor): return None
+    if isinstance(valor, float) and valor.is_integer(): return str(int(valor))
+    if isinstance(valor, (datetime, date, pd.Timestamp)): return valor.isoformat()
+    return str(valor)
+
+
+NORMALIZADORES = {'TEXT': _normalizar_texto, 'REAL': _normalizar_real, 'INTEGER': _normalizar_integer}
+
+
+def normalizar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte cada coluna do lote para o tipo do esquema. O resultado não depende do dtype
+    que o pandas inferiu para o lote, então lotes diferentes geram os mesmos valores.
+    """
+    colunas = {}
+    for coluna in df.columns:
+        normalizar = _normalizar_data if eh_coluna_data(coluna) else NORMALIZADORES[tipo_coluna(coluna)]
+        colunas[coluna] = pd.Series([normalizar(v) for v in df[coluna].tolist()], index=df.index, dtype=object)
+    return pd.DataFrame(colunas, index=df.index)
+
+
+# --- Índices ---
+# Cada índice começa pelas colunas das condições fixas (IS NULL / IN / faixa de data) e
+# termina com regime e valores, para o SQLite responder só pelo índice (COVERING INDEX),
+# inclusive o GROUP BY strftime('%Y-%m', data) das ferramentas mensais.
+INDICES = {
+    'idx_vendas_data_regime': ['data_recebimento_po', 'servico_regime', 'valor_venda_total'],
+    'idx_faturamento_status_data_regime': ['atendimento_andamento', 'data_faturamento', 'servico_regime', 'valor_venda_total', 'valor_venda_servico_desc'],
+    'idx_bm_pendente_data_regime': ['data_liberacao_bm', 'data_envio_relatorios', 'servico_regime', 'valor_venda_total'],
+    'idx_relatorio_pendente_data_regime': ['data_envio_relatorios', 'data_final_atendimento', 'servico_regime', 'valor_venda_total'],
+}
+
+
+def executar_criacao_indices(conn: sqlite3.Connection, nome_tabela: str = NOME_TABELA_PRINCIPAL) -> None:
+    """Os CREATE INDEX (se as colunas existirem), sem commit: rodam dentro da transação de quem chama."""
+    existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({nome_tabela})").fetchall()}
+    for nome, colunas in INDICES.items():
+        if all(c in existentes for c in colunas):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {nome_tabela} ({', '.join(colunas)})")
+        else:
+            print(f"Aviso: Índice '{nome}' não criado; colunas ausentes: {[c for c in colunas if c not in existentes]}")
+
+
+def criar_indices(conn: sqlite3.Connection, nome_tabela: str = NOME_TABELA_PRINCIPAL) -> None:
+    """Cria os índices (se as colunas existirem) e atualiza as estatísticas do planejador."""
+    with conn:
+        executar_criacao_indices(conn, nome_tabela)
+    conn.execute("ANALYZE")
+
+
+# --- Verificação dos Planos de Consulta ---
+# As consultas verificadas são as mesmas que as ferramentas do agente executam
+# (consultas_metricas.CONSULTAS, com parâmetros de exemplo).
+
+
+def plano_consulta(conn: sqlite3.Connection, sql: str, params: tuple | list = ()) -> list[str]:
+    """Retorna as linhas de detalhe do EXPLAIN QUERY PLAN."""
+    return [linha[-1] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def usa_indice(plano: list[str], nome_tabela: str = NOME_TABELA_PRINCIPAL) -> bool:
+    """True se nenhum passo faz SCAN completo da tabela (SCAN ... USING INDEX conta como índice)."""
+    for passo in plano:
+        if passo.startswith(f"SCAN {nome_tabela}") and 'INDEX' not in passo:
+            return False
+    return any('INDEX' in passo for passo in plano)
+
+
+def verificar_planos_consulta(conn: sqlite3.Connection, consultas: dict | None = None) -> dict[str, tuple[bool, list[str]]]:
+    """
+    Roda EXPLAIN QUERY PLAN em cada consulta e informa se ela usa índice.
+    'consultas' é {nome: sql} ou {nome: (sql, params)}; padrão: todas as consultas de métricas.
+    """
+    resultado = {}
+    for nome, consulta in (consultas or consultas_para_verificacao()).items():
+        sql, params = consulta if isinstance(consulta, tuple) else (consulta, ())
+        plano = plano_consulta(conn, sql, params)
+        resultado[nome] = (usa_indice(plano), plano)
+    return resultado
+
+
+def imprimir_verificacao(resultado: dict[str, tuple[bool, list[str]]]) -> bool:
+    todas_ok = True
+    for nome, (ok, plano) in resultado.items():
+        todas_ok = todas_ok and ok
+        print(f"{'OK   ' if ok else 'SCAN!'} {nome}: {' | '.join(plano)}")
+    return todas_ok
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect(NOME_BANCO_SQLITE)
+    try:
+        if not imprimir_verificacao(verificar_planos_consulta(conn)):
+            print("Aviso: Há consultas fazendo SCAN completo. Rode 'python organizador_dados.py --completo' para recriar esquema e índices.")
+    finally:
+        conn.close()
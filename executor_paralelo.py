@@ -0,0 +1,80 @@
+# executor_paralelo.py
+# O agente de tools da OpenAI pode pedir várias ferramentas num mesmo passo ("vendas e
+# faturamento naval 2024 e BMs pendentes" = 3 chamadas independentes). O AgentExecutor roda uma
+# depois da outra; aqui elas rodam ao mesmo tempo num pool de threads, com limite configurável,
+# e os resultados voltam na ordem em que o modelo pediu (o scratchpad do próximo passo não muda).
+# Ganha onde a ferramenta espera fora do Python (SQLite, processo isolado do SQL livre, Chroma).
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentStep
+
+from rastreamento import obter_logger
+
+# --- Constantes ---
+MAX_FERRAMENTAS_PARALELAS = int(os.getenv("MAX_FERRAMENTAS_PARALELAS", "4")) # 1 = uma de cada vez, como no AgentExecutor
+
+log = obter_logger("executor")
+
+_PENDENTE = object() # Observação de uma ferramenta que ainda vai rodar
+_adiar_ferramentas = contextvars.ContextVar("marina_adiar_ferramentas", default=False)
+
+
+def _preparar_thread_streamlit():
+    """
+    Função que liga uma thread do pool à sessão do Streamlit de quem chamou (sem isso, os
+    st.status/st.markdown dos callbacks de progresso são ignorados fora da thread do script).
+    None fora do Streamlit.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return (lambda: add_script_run_ctx(threading.current_thread(), ctx)) if ctx is not None else None
+
+
+class AgentExecutorParalelo(AgentExecutor):
+    """
+    AgentExecutor que executa juntas as chamadas de ferramenta de um mesmo passo.
+    O passo do pai é percorrido com as ferramentas adiadas (_perform_agent_action devolve um
+    marcador); depois as pendentes rodam no pool e cada AgentStep volta para a sua posição.
+    O caminho assíncrono (ainvoke) do AgentExecutor já usa asyncio.gather e não muda.
+    """
+
+    max_ferramentas_paralelas: int = MAX_FERRAMENTAS_PARALELAS
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        if _adiar_ferramentas.get():
+            return AgentStep(action=agent_action, observation=_PENDENTE)
+        return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        marca = _adiar_ferramentas.set(self.max_ferramentas_paralelas > 1)
+        try:
+            itens = list(super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager))
+        finally:
+            _adiar_ferramentas.reset(marca)
+        pendentes = [i for i, item in enumerate(itens) if isinstance(item, AgentStep) and item.observation is _PENDENTE]
+        if len(pendentes) == 1:
+            itens[pendentes[0]] = self._perform_agent_action(name_to_tool_map, color_mapping, itens[pendentes[0]].action, run_manager)
+        elif pendentes:
+            preparar = _preparar_thread_streamlit()
+
+            def executar(acao, contexto):
+                if preparar:
+                    preparar()
+                # Contexto copiado da thread do agente: o span do turno (rastreamento) continua sendo o pai
+                return contexto.run(self._perform_agent_action, name_to_tool_map, color_mapping, acao, run_manager)
+
+            log.debug("Executando %s ferramentas em paralelo (limite %s): %s", len(pendentes), self.max_ferramentas_paralelas,
+                      [itens[i].action.tool for i in pendentes])
+            with ThreadPoolExecutor(max_workers=min(self.max_ferramentas_paralelas, len(pendentes)), thread_name_prefix="ferramenta") as pool:
+                futuros = {i: pool.submit(executar, itens[i].action, contextvars.copy_context()) for i in pendentes}
+                for i, futuro in futuros.items(): # Ordem do modelo; a primeira exceção (nessa ordem) sobe como no executor sequencial
+                    itens[i] = futuro.result()
+        yield from itens
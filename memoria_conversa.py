@@ -0,0 +1,231 @@
+# memoria_conversa.py
+# Memória da conversa com orçamento de tokens, no lugar da janela fixa de 2 turnos (que podia
+# ser quase nada ou duas tabelas enormes). Os turnos mais recentes entram inteiros enquanto
+# cabem; quando não cabem, perdem primeiro o payload das ferramentas (tabelas, HTML, blocos de
+# código) e só depois saem. Os turnos antigos viram um resumo corrido, atualizado numa thread
+# à parte depois da resposta (fora do caminho da próxima pergunta).
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from pydantic import PrivateAttr
+
+from artefatos import PADRAO_TABELA, resumir_tabela
+from rastreamento import obter_logger
+
+# --- Constantes ---
+ORCAMENTO_TOKENS_HISTORICO = int(os.getenv("ORCAMENTO_TOKENS_HISTORICO", "1200")) # Resumo + turnos recentes
+MAX_TOKENS_RESUMO = 300 # Parte do orçamento reservada ao resumo dos turnos antigos
+TURNOS_RECENTES = 3 # Candidatos a entrar inteiros; os anteriores vão para o resumo
+RESUMO_COM_LLM = os.getenv("RESUMO_COM_LLM", "1") != "0" # 0 = só o resumo extrativo (sem chamada extra ao modelo)
+MAX_CARACTERES_RESPOSTA_EXTRATIVA = 200
+CARACTERES_POR_TOKEN = 4 # Estimativa sem o tiktoken
+
+PROMPT_RESUMO = (
+    "Você mantém o resumo de uma conversa entre um usuário e a Marina, assistente de dados da Supply Marine. "
+    "Atualize o resumo com os novos turnos em português, em até {max_tokens} tokens, em tópicos curtos. "
+    "Preserve o que perguntas de acompanhamento podem precisar: métricas, regimes (Naval/Offshore), períodos e os valores "
+    "respondidos. Não copie tabelas nem HTML. Responda só com o resumo."
+)
+PADRAO_HTML = re.compile(r"<!DOCTYPE html>.*?(?:</html>|$)", re.IGNORECASE | re.DOTALL)
+PADRAO_BLOCO_CODIGO = re.compile(r"```.*?```", re.DOTALL)
+
+log = obter_logger("memoria")
+
+# Pool pequeno para os resumos de todas as sessões (cada memória tem no máximo um resumo rodando)
+_pool_resumos = ThreadPoolExecutor(max_workers=2, thread_name_prefix="resumo")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+    log.warning("'tiktoken' não encontrado. Orçamento da memória usa estimativa por caracteres.")
+_codificador = None
+_trava_codificador = threading.Lock()
+
+
+def _obter_codificador():
+    global _codificador, tiktoken
+    if _codificador is None and tiktoken is not None:
+        with _trava_codificador:
+            if _codificador is None:
+                try:
+                    _codificador = tiktoken.get_encoding("cl100k_base") # Mesma codificação do gpt-3.5-turbo
+                except Exception as e: # Primeira vez baixa o arquivo da codificação; sem rede, segue na estimativa
+                    log.warning("tiktoken indisponível (%s); orçamento da memória usa estimativa por caracteres.", e)
+                    tiktoken = None
+    return _codificador
+
+
+@lru_cache(maxsize=4096)
+def contar_tokens(texto: str) -> int:
+    codificador = _obter_codificador()
+    if codificador is None:
+        return len(texto) // CARACTERES_POR_TOKEN + 1
+    return len(codificador.encode(texto, disallowed_special=()))
+
+
+def sem_payload(texto: str) -> str:
+    """Texto da resposta sem o payload das ferramentas: tabelas viram uma linha de resumo, HTML e blocos de código saem."""
+    if not isinstance(texto, str):
+        return str(texto)
+    texto = PADRAO_HTML.sub("[relatório HTML omitido]", texto)
+    texto = PADRAO_BLOCO_CODIGO.sub("[bloco de código omitido]", texto)
+    return PADRAO_TABELA.sub(lambda m: f"[{resumir_tabela(m.group(0))} omitida]\n", texto)
+
+
+def _turnos(mensagens: list) -> list[list]:
+    """
+    Mensagens agrupadas por turno (cada pergunta do usuário abre um; a saudação inicial fica num
+    turno sozinha). Perguntas seguidas sem resposta entre elas ficam no mesmo turno, e a mesma
+    pergunta repetida (o app grava a pergunta antes do agente rodar) conta uma vez só.
+    """
+    turnos = []
+    for mensagem in mensagens:
+        if mensagem.type == "human" and turnos and all(m.type == "human" for m in turnos[-1]):
+            if mensagem.content != turnos[-1][-1].content:
+                turnos[-1].append(mensagem)
+            continue
+        if mensagem.type == "human" or not turnos:
+            turnos.append([])
+        turnos[-1].append(mensagem)
+    return turnos
+
+
+def _linha_extrativa(turno: list) -> str:
+    """'- Usuário: ... → Marina: primeira linha da resposta' (resumo sem LLM). A saudação inicial (sem pergunta) não entra."""
+    pergunta = next((str(m.content) for m in turno if m.type == "human"), "")
+    if not pergunta:
+        return ""
+    resposta = next((sem_payload(m.content).strip() for m in turno if m.type == "ai"), "")
+    resposta = resposta.splitlines()[0] if resposta else ""
+    if not resposta:
+        return f"- Usuário: {pergunta} (sem resposta)"
+    if len(resposta) > MAX_CARACTERES_RESPOSTA_EXTRATIVA:
+        resposta = resposta[:MAX_CARACTERES_RESPOSTA_EXTRATIVA] + "…"
+    return f"- Usuário: {pergunta} → Marina: {resposta}"
+
+
+def _cortar_resumo(resumo: str, max_tokens: int) -> str:
+    """Tira as linhas mais antigas até caber (o resumo extrativo cresce uma linha por turno)."""
+    linhas = resumo.splitlines()
+    while len(linhas) > 1 and contar_tokens("\n".join(linhas)) > max_tokens:
+        linhas.pop(0)
+    return "\n".join(linhas)
+
+
+class MemoriaOrcamentoTokens(BaseChatMemory):
+    """
+    Memória para o AgentExecutor (mesma interface da ConversationBufferWindowMemory).
+    A cada pergunta monta: [resumo dos turnos antigos] + turnos recentes, do mais novo para o
+    mais velho, inteiros se couberem em max_tokens, senão sem payload, senão fora.
+    Depois de cada resposta, os turnos que saíram da janela são resumidos em segundo plano
+    (llm_resumo, ou extrativo); enquanto o resumo não fica pronto, eles entram como uma linha cada.
+    """
+
+    memory_key: str = "chat_history"
+    max_tokens: int = ORCAMENTO_TOKENS_HISTORICO
+    max_tokens_resumo: int = MAX_TOKENS_RESUMO
+    turnos_recentes: int = TURNOS_RECENTES
+    llm_resumo: Any = None
+    resumo: str = ""
+    turnos_resumidos: int = 0 # Quantos turnos (do início) o resumo já cobre
+    ultimo_total_tokens: int = 0
+
+    _trava: Any = PrivateAttr(default_factory=threading.Lock)
+    _resumo_em_andamento: Any = PrivateAttr(default=None)
+
+    @property
+    def memory_variables(self) -> list[str]:
+        return [self.memory_key]
+
+    def _resumo_atual(self, turnos: list[list], inicio_janela: int) -> str:
+        with self._trava:
+            resumo, resumidos = self.resumo, self.turnos_resumidos
+        pendentes = [linha for turno in turnos[resumidos:inicio_janela] if (linha := _linha_extrativa(turno))] # Ainda não entraram no resumo
+        return _cortar_resumo("\n".join(parte for parte in [resumo, *pendentes] if parte), self.max_tokens_resumo)
+
+    def load_memory_variables(self, inputs: dict[str, Any]) -> dict[str, Any]:
+        turnos = _turnos(self.chat_memory.messages)
+        if turnos and all(m.type == "human" for m in turnos[-1]):
+            turnos.pop() # Pergunta em andamento (gravada pelo app): o prompt já a recebe em {input}
+        inicio_janela = max(0, len(turnos) - self.turnos_recentes)
+        resumo = self._resumo_atual(turnos, inicio_janela)
+        restante = self.max_tokens - (contar_tokens(resumo) if resumo else 0)
+        escolhidos, cortados = [], 0
+        for turno in reversed(turnos[inicio_janela:]):
+            inteiro = sum(contar_tokens(str(m.content)) for m in turno)
+            if inteiro <= restante:
+                escolhidos.insert(0, turno); restante -= inteiro
+                continue
+            enxuto = [m.model_copy(update={'content': sem_payload(m.content)}) if m.type == "ai" else m for m in turno]
+            tamanho = sum(contar_tokens(str(m.content)) for m in enxuto)
+            if tamanho > restante:
+                break # Este e os mais antigos da janela não cabem
+            escolhidos.insert(0, enxuto); restante -= tamanho; cortados += 1
+        fora = turnos[inicio_janela:len(turnos) - len(escolhidos)]
+        if fora: # Turnos da janela que não couberam ficam no resumo, uma linha cada
+            resumo = _cortar_resumo("\n".join(parte for parte in [resumo, *map(_linha_extrativa, fora)] if parte), self.max_tokens_resumo)
+        mensagens = ([SystemMessage(content=f"Resumo da conversa anterior:\n{resumo}")] if resumo else []) + [m for turno in escolhidos for m in turno]
+        self.ultimo_total_tokens = sum(contar_tokens(str(m.content)) for m in mensagens)
+        log.debug("Memória: %s tokens (%s turno(s) recentes, %s sem payload, resumo de %s turno(s))",
+                  self.ultimo_total_tokens, len(escolhidos), cortados, inicio_janela)
+        if self.return_messages:
+            return {self.memory_key: mensagens}
+        return {self.memory_key: "\n".join(f"{m.type}: {m.content}" for m in mensagens)}
+
+    def save_context(self, inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        pergunta, resposta = self._get_input_output(inputs, outputs)
+        mensagens = self.chat_memory.messages
+        if mensagens and mensagens[-1].type == "human" and mensagens[-1].content == pergunta:
+            self.chat_memory.add_message(AIMessage(content=resposta)) # O app já gravou a pergunta
+        else:
+            self.chat_memory.add_messages([HumanMessage(content=pergunta), AIMessage(content=resposta)])
+        # Cópia das mensagens aqui: o StreamlitChatMessageHistory só pode ser lido na thread do script
+        self._agendar_resumo(list(self.chat_memory.messages))
+
+    def _agendar_resumo(self, mensagens: list) -> None:
+        turnos = _turnos(mensagens)
+        limite = max(0, len(turnos) - self.turnos_recentes)
+        with self._trava:
+            if limite <= self.turnos_resumidos or self._resumo_em_andamento is not None:
+                return # Nada novo fora da janela, ou já há um resumo rodando (o próximo save_context reagenda)
+            self._resumo_em_andamento = _pool_resumos.submit(self._atualizar_resumo, turnos, limite)
+
+    def _atualizar_resumo(self, turnos: list[list], limite: int) -> None:
+        try:
+            with self._trava:
+                resumo_anterior, inicio = self.resumo, self.turnos_resumidos
+            novos = "\n".join(linha for turno in turnos[inicio:limite] if (linha := _linha_extrativa(turno)))
+            resumo = None
+            if self.llm_resumo is not None and RESUMO_COM_LLM:
+                try:
+                    conteudo = "\n".join(f"{m.type}: {sem_payload(m.content)}" for turno in turnos[inicio:limite] for m in turno)
+                    pedido = f"Resumo atual:\n{resumo_anterior or '(vazio)'}\n\nNovos turnos:\n{conteudo}"
+                    resposta = self.llm_resumo.invoke([SystemMessage(content=PROMPT_RESUMO.format(max_tokens=self.max_tokens_resumo)),
+                                                       HumanMessage(content=pedido)])
+                    resumo = str(resposta.content).strip() or None
+                except Exception as e:
+                    log.warning("Resumo da memória pelo LLM falhou (%s); usando o resumo extrativo.", e)
+            if resumo is None:
+                resumo = "\n".join(parte for parte in (resumo_anterior, novos) if parte)
+            with self._trava:
+                self.resumo = _cortar_resumo(resumo, self.max_tokens_resumo)
+                self.turnos_resumidos = limite
+            log.debug("Resumo da memória atualizado até o turno %s (%s tokens)", limite, contar_tokens(self.resumo))
+        except Exception:
+            log.exception("Falha ao atualizar o resumo da memória")
+        finally:
+            with self._trava:
+                self._resumo_em_andamento = None
+
+    def clear(self) -> None:
+        super().clear()
+        with self._trava:
+            self.resumo, self.turnos_resumidos = "", 0
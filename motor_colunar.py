@@ -0,0 +1,303 @@
+# motor_colunar.py
+# Motor em memória para as métricas do agente: as poucas colunas que as ferramentas usam
+# (datas, valores, status e regime) ficam em arrays NumPy, carregados uma vez por processo.
+# Datas viram número do dia, regime e status viram códigos; cada pergunta é uma máscara
+# vetorizada e o agrupamento mensal é um bincount. Recarrega sozinho quando o banco muda
+# (mesmo token de versão do cache de resultados). Desligado por padrão: as ferramentas leem o
+# cubo de métricas no SQLite, que responde sem carregar a tabela inteira no processo; com
+# MOTOR_COLUNAR=1 o motor responde primeiro e o cubo/tabela viram o plano B. Sem NumPy, tudo segue pelo SQLite.
+
+import os
+import threading
+import time
+import statistics
+
+import pandas as pd
+
+from conexao_sqlite import conexao_leitura, versao_banco
+from consultas_metricas import (
+    NOME_TABELA_PRINCIPAL_SQL, REGIME_COL, SALES_VALUE_COL, SALES_DATE_COL, BM_LIBERACAO_COL, BM_DATE_COL,
+    REPORT_ENVIO_COL, REPORT_DATE_COL, FAT_DATE_COL, FAT_STATUS_COL, FAT_GROSS_VALUE_COL, FAT_NET_VALUE_COL,
+    FAT_VALID_STATUS_LIST, METRICAS, PERIODOS, REGIMES_VALIDOS, MESES_RELATORIO, INICIO_HISTORICO_RELATORIO,
+    intervalo_datas, consulta_metrica, consulta_metrica_cubo, casos_verificacao, valores_iguais,
+)
+from rastreamento import obter_logger
+
+log = obter_logger("motor_colunar")
+
+# numpy é opcional (vem com o pandas, mas o motor não é obrigatório)
+try:
+    import numpy as np
+except ImportError:
+    log.warning("Biblioteca 'numpy' não encontrada. Motor colunar desabilitado (consultas via SQLite).")
+    np = None
+
+# --- Constantes ---
+MOTOR_HABILITADO = os.getenv("MOTOR_COLUNAR", "0") == "1" # MOTOR_COLUNAR=1 liga (senão as métricas saem do cubo no SQLite)
+COLUNAS_DATA = (SALES_DATE_COL, FAT_DATE_COL, BM_LIBERACAO_COL, BM_DATE_COL, REPORT_ENVIO_COL, REPORT_DATE_COL)
+COLUNAS_VALOR = (SALES_VALUE_COL, FAT_GROSS_VALUE_COL, FAT_NET_VALUE_COL)
+COLUNAS_CATEGORIA = (REGIME_COL, FAT_STATUS_COL)
+# Coluna somada por métrica (None = COUNT(*))
+COLUNA_VALOR_METRICA = {'vendas': SALES_VALUE_COL, 'faturamento_bruto': FAT_GROSS_VALUE_COL,
+                        'faturamento_liquido': FAT_NET_VALUE_COL, 'bms_pendentes': None, 'relatorios_pendentes': None}
+REPETICOES_BENCHMARK = 50
+
+
+def _dia(texto: str) -> int:
+    """'2024-05-01' -> número do dia (dias desde 1970-01-01)."""
+    return int(np.datetime64(texto, 'D').astype(np.int64))
+
+
+class MotorColunar:
+    """
+    Colunas da tabela principal em arrays NumPy. Datas: 'dias' (int64, dias desde 1970),
+    'tem_texto' (a coluna não é NULL) e 'valida' (o texto é uma data). Os poucos textos que
+    não são data (ex: '30/02') ficam em 'invalidas' e são comparados como texto nos filtros
+    de período, como o SQL faz; no agrupamento mensal caem no grupo de mês NULL.
+    """
+
+    def __init__(self, linhas: list[tuple], colunas: list[str], versao: tuple):
+        self.versao = versao
+        self.total_linhas = len(linhas)
+        por_coluna = dict(zip(colunas, zip(*linhas))) if linhas else {c: () for c in colunas}
+        self.dias, self.tem_texto, self.valida, self.meses, self.invalidas = {}, {}, {}, {}, {}
+        for col in COLUNAS_DATA:
+            if col in self.dias:
+                continue # BM_DATE_COL e REPORT_ENVIO_COL são a mesma coluna
+            textos = pd.Series(por_coluna[col], dtype=object)
+            datas = pd.to_datetime(textos, format='%Y-%m-%d', errors='coerce')
+            self.tem_texto[col] = textos.notna().to_numpy()
+            self.valida[col] = datas.notna().to_numpy()
+            datas = datas.to_numpy()
+            self.dias[col] = datas.astype('datetime64[D]').astype(np.int64) # NaT -> valor mínimo (filtrado por 'valida')
+            self.meses[col] = datas.astype('datetime64[M]').astype(np.int64) # meses desde 1970-01
+            indices = np.flatnonzero(self.tem_texto[col] & ~self.valida[col])
+            self.invalidas[col] = list(zip(indices.tolist(), textos.iloc[indices].tolist()))
+        self.valores = {col: np.array([np.nan if v is None else v for v in por_coluna[col]], dtype=np.float64)
+                        for col in dict.fromkeys(COLUNAS_VALOR)}
+        self.codigos, self.categorias = {}, {}
+        for col in COLUNAS_CATEGORIA:
+            codigos, categorias = pd.factorize(pd.Series(por_coluna[col], dtype=object)) # NULL -> -1
+            self.codigos[col], self.categorias[col] = codigos, {valor: i for i, valor in enumerate(categorias)}
+        status_validos = [self.categorias[FAT_STATUS_COL][s] for s in FAT_VALID_STATUS_LIST if s in self.categorias[FAT_STATUS_COL]]
+        # Condições fixas de cada métrica (as mesmas de consultas_metricas.METRICAS)
+        self.base = {
+            'vendas': self.tem_texto[SALES_DATE_COL],
+            'faturamento_bruto': self.tem_texto[FAT_DATE_COL] & np.isin(self.codigos[FAT_STATUS_COL], status_validos),
+            'bms_pendentes': ~self.tem_texto[BM_LIBERACAO_COL] & self.tem_texto[BM_DATE_COL],
+            'relatorios_pendentes': ~self.tem_texto[REPORT_ENVIO_COL],
+        }
+        self.base['faturamento_liquido'] = self.base['faturamento_bruto']
+
+    @classmethod
+    def carregar(cls) -> "MotorColunar":
+        versao = versao_banco() # Antes da leitura: uma carga durante a leitura força novo recarregamento
+        colunas = list(dict.fromkeys(COLUNAS_DATA + COLUNAS_VALOR + COLUNAS_CATEGORIA))
+        with conexao_leitura() as conn:
+            linhas = conn.execute(f"SELECT {', '.join(colunas)} FROM {NOME_TABELA_PRINCIPAL_SQL}").fetchall()
+        return cls(linhas, colunas, versao)
+
+    def _intervalo(self, col: str, inicio: str, fim: str | None = None, fim_inclusivo: bool = False):
+        """Linhas com inicio <= col < fim (ou <= fim), datas 'YYYY-MM-DD' como nos parâmetros do SQL."""
+        dias = self.dias[col]
+        mascara = self.valida[col] & (dias >= _dia(inicio))
+        if fim is not None:
+            mascara &= (dias <= _dia(fim)) if fim_inclusivo else (dias < _dia(fim))
+        for i, texto in self.invalidas[col]: # Comparação de texto, igual ao SQLite
+            if texto >= inicio and (fim is None or (texto <= fim if fim_inclusivo else texto < fim)):
+                mascara[i] = True
+        return mascara
+
+    def _mascara(self, metrica: str, periodo: str, regime: str | None, ano: int | None, mes: int | None):
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica desconhecida: {metrica}")
+        if periodo not in PERIODOS:
+            raise ValueError(f"Período desconhecido: {periodo}")
+        col = METRICAS[metrica].coluna_data
+        mascara = self.base[metrica]
+        if periodo != 'total' and METRICAS[metrica].condicoes_periodo:
+            mascara = mascara & self.tem_texto[col]
+        if periodo in ('ano', 'mes'):
+            mascara = mascara & self._intervalo(col, *intervalo_datas(int(ano), int(mes) if periodo == 'mes' else None))
+        elif periodo == 'por_mes':
+            mascara = mascara & self.tem_texto[col]
+        if regime:
+            mascara = mascara & (self.codigos[REGIME_COL] == self.categorias[REGIME_COL].get(regime, -2))
+        return mascara
+
+    def _somar(self, mascara, coluna: str | None):
+        """SUM com a semântica do SQL: None se não há valor não nulo. coluna=None -> COUNT(*)."""
+        if coluna is None:
+            return int(np.count_nonzero(mascara))
+        valores = self.valores[coluna][mascara]
+        validos = valores[~np.isnan(valores)]
+        return float(validos.sum()) if validos.size else None
+
+    def valor(self, metrica: str, periodo: str = 'total', regime: str | None = None,
+              ano: int | None = None, mes: int | None = None) -> float | int | None:
+        """Mesmo resultado de execute_direct_sql(*consulta_metrica(...))."""
+        return self._somar(self._mascara(metrica, periodo, regime, ano, mes), COLUNA_VALOR_METRICA[metrica])
+
+    def _agrupar_por_mes(self, mascara, col: str, coluna_valor: str | None, nulo_vazio: bool):
+        """
+        [(índice do mês desde 1970-01, agregado)] dos meses com linhas, em ordem. Soma com bincount
+        (NULL conta como 0). nulo_vazio=True: mês sem nenhum valor não nulo vira None (SUM do SQL).
+        """
+        selecionadas = mascara & self.valida[col]
+        meses = self.meses[col][selecionadas]
+        if not meses.size:
+            return []
+        menor = meses.min()
+        indices = meses - menor
+        qtd = np.bincount(indices)
+        if coluna_valor is None:
+            agregado = qtd
+        else:
+            valores = self.valores[coluna_valor][selecionadas]
+            nulos = np.isnan(valores)
+            agregado = np.bincount(indices, weights=np.where(nulos, 0.0, valores))
+            if nulo_vazio:
+                agregado = agregado.astype(object)
+                agregado[np.bincount(indices[~nulos], minlength=qtd.size) == 0] = None
+        return [(int(menor + i), agregado[i].item() if hasattr(agregado[i], 'item') else agregado[i]) for i in np.flatnonzero(qtd)]
+
+    def por_mes(self, metrica: str, regime: str | None = None) -> list[tuple]:
+        """Linhas (Mes 'YYYY-MM', Total) na mesma ordem da consulta 'por_mes' (grupo NULL primeiro)."""
+        col, coluna_valor = METRICAS[metrica].coluna_data, COLUNA_VALOR_METRICA[metrica]
+        mascara = self._mascara(metrica, 'por_mes', regime, None, None)
+        linhas = [(f"{1970 + m // 12:04d}-{m % 12 + 1:02d}", total)
+                  for m, total in self._agrupar_por_mes(mascara, col, coluna_valor, nulo_vazio=True)]
+        invalidas = mascara & ~self.valida[col] # Texto que não é data: grupo Mes NULL do strftime
+        if invalidas.any():
+            linhas.insert(0, (None, self._somar(invalidas, coluna_valor)))
+        return linhas
+
+    def tabela_por_mes(self, metrica: str, regime: str | None = None) -> pd.DataFrame:
+        """por_mes() como DataFrame (Mes, Total), com os mesmos tipos do pd.read_sql_query."""
+        return pd.DataFrame.from_records(self.por_mes(metrica, regime), columns=['Mes', 'Total'], coerce_float=True)
+
+    def relatorio_gerencial(self, inicio: str, fim: str, inicio_historico: str = INICIO_HISTORICO_RELATORIO) -> dict:
+        """Mesmos pares (chave, valor) de CONSULTA_RELATORIO_GERENCIAL (YTD com fim inclusivo)."""
+        dados = {}
+        partes = (('faturamento', 'faturamento_bruto', FAT_GROSS_VALUE_COL, False), ('vendas', 'vendas', SALES_VALUE_COL, False),
+                  ('bm_pendente', 'bms_pendentes', SALES_VALUE_COL, True), ('relatorios_pendentes', 'relatorios_pendentes', SALES_VALUE_COL, True))
+        for prefixo, metrica, coluna_valor, pendencia in partes:
+            col = METRICAS[metrica].coluna_data
+            base = self.base[metrica] & self.tem_texto[col]
+            ytd = base & self._intervalo(col, inicio, fim, fim_inclusivo=True)
+            valor_ytd = self._somar(ytd, coluna_valor)
+            if pendencia:
+                dados[f'{prefixo}_itens_total_periodo'] = int(np.count_nonzero(ytd))
+                dados[f'{prefixo}_valor_total_periodo'] = valor_ytd if valor_ytd is not None else 0.0
+                historico = self._somar(base & self._intervalo(col, inicio_historico), coluna_valor)
+                dados[f'{prefixo}_valor_total_historico'] = historico if historico is not None else 0.0
+                mensal = self._agrupar_por_mes(ytd, col, None, nulo_vazio=False)
+            else:
+                dados[f'{prefixo}_total_periodo'] = valor_ytd if valor_ytd is not None else 0.0
+                mensal = self._agrupar_por_mes(ytd, col, coluna_valor, nulo_vazio=False)
+            dados.update({f'{prefixo}_{MESES_RELATORIO[m % 12]}': total for m, total in mensal})
+        return dados
+
+
+# Motor único do processo, trocado quando a versão do banco muda
+_motor = None
+_versao_com_falha = None
+_trava_carga = threading.Lock() # Ferramentas em paralelo (executor_paralelo) não carregam o motor duas vezes
+
+
+def obter_motor() -> MotorColunar | None:
+    """Motor carregado para a versão atual do banco, ou None (desligado, sem NumPy ou falha na carga)."""
+    global _motor, _versao_com_falha
+    if np is None or not MOTOR_HABILITADO:
+        return None
+    versao = versao_banco()
+    motor = _motor
+    if motor is not None and motor.versao == versao:
+        return motor
+    with _trava_carga:
+        motor = _motor # Outra thread pode ter carregado enquanto esperávamos
+        if motor is not None and motor.versao == versao:
+            return motor
+        if versao == _versao_com_falha:
+            return None # Não tenta de novo a cada pergunta; a próxima carga do banco muda a versão
+        try:
+            inicio = time.perf_counter()
+            motor = MotorColunar.carregar()
+            log.debug("Motor colunar carregado: %s linhas em %.1f ms", motor.total_linhas, (time.perf_counter() - inicio) * 1000)
+        except Exception as e_motor:
+            log.warning("Falha ao carregar o motor colunar; consultas seguem pelo SQLite: %s", e_motor)
+            _versao_com_falha = versao
+            return None
+        _motor = motor # Troca atômica: threads que já pegaram o motor antigo terminam com ele
+        return motor
+
+
+def verificar_consistencia_motor(motor: MotorColunar, conn) -> list[str]:
+    """Compara o motor com as consultas SQL em todas as métricas/períodos/regimes. Retorna as divergências."""
+    anos_meses = sorted({f"{1970 + m // 12:04d}-{m % 12 + 1:02d}" for col in motor.meses for m in motor.meses[col][motor.valida[col]]})
+    divergencias = []
+    for metrica in METRICAS:
+        for regime in (None,) + REGIMES_VALIDOS:
+            for periodo, args in casos_verificacao(anos_meses):
+                sql, params = consulta_metrica(metrica, periodo, regime, **args)
+                esperado = conn.execute(sql, params).fetchall()
+                obtido = motor.por_mes(metrica, regime) if periodo == 'por_mes' else [(motor.valor(metrica, periodo, regime, **args),)]
+                iguais = len(esperado) == len(obtido) and all(all(valores_iguais(x, y) for x, y in zip(le, lo)) for le, lo in zip(esperado, obtido))
+                if not iguais:
+                    divergencias.append(f"{metrica}/{periodo}/{regime or 'todos'} {args}: sqlite={esperado[:3]} motor={obtido[:3]}")
+    return divergencias
+
+
+def _mediana_us(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    return statistics.median(tempos)
+
+
+def benchmark(motor: MotorColunar, conn, repeticoes: int = REPETICOES_BENCHMARK) -> list[dict]:
+    """
+    Mediana (µs) por pergunta: motor x SQL na tabela principal x SQL no cubo (se existir),
+    sem o cache de resultados. Uma linha por (métrica, período), com e sem regime.
+    """
+    tem_cubo = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'cubo_metricas'").fetchone()[0] == 1
+    args = {'total': {}, 'ano': {'ano': 2024}, 'mes': {'ano': 2024, 'mes': 5}, 'por_mes': {}}
+    resultados = []
+    for metrica in METRICAS:
+        for periodo in PERIODOS:
+            for regime in (None, 'Naval'):
+                if periodo == 'por_mes':
+                    rodar_motor = lambda: motor.por_mes(metrica, regime) # Linhas, como o fetchall() do SQLite
+                else:
+                    rodar_motor = lambda: motor.valor(metrica, periodo, regime, **args[periodo])
+                sql, params = consulta_metrica(metrica, periodo, regime, **args[periodo])
+                linha = {'metrica': metrica, 'periodo': periodo, 'regime': regime or 'todos',
+                         'motor_us': _mediana_us(rodar_motor, repeticoes),
+                         'sqlite_us': _mediana_us(lambda: conn.execute(sql, params).fetchall(), repeticoes)}
+                if tem_cubo:
+                    sql_cubo, params_cubo = consulta_metrica_cubo(metrica, periodo, regime, **args[periodo])
+                    linha['cubo_us'] = _mediana_us(lambda: conn.execute(sql_cubo, params_cubo).fetchall(), repeticoes)
+                resultados.append(linha)
+    return resultados
+
+
+if __name__ == '__main__':
+    if np is None:
+        raise SystemExit("numpy não instalado.")
+    inicio = time.perf_counter()
+    motor = MotorColunar.carregar()
+    print(f"Motor carregado: {motor.total_linhas} linhas em {(time.perf_counter() - inicio) * 1000:.1f} ms.")
+    with conexao_leitura() as conn:
+        divergencias = verificar_consistencia_motor(motor, conn)
+        for d in divergencias:
+            print(f"DIVERGENTE {d}")
+        print("Motor consistente com o SQLite." if not divergencias else f"{len(divergencias)} divergências encontradas.")
+        resultados = benchmark(motor, conn)
+    print(f"{'métrica':<22}{'período':<9}{'regime':<8}{'motor µs':>10}{'sqlite µs':>11}{'cubo µs':>9}")
+    for r in resultados:
+        print(f"{r['metrica']:<22}{r['periodo']:<9}{r['regime']:<8}{r['motor_us']:>10.1f}{r['sqlite_us']:>11.1f}{r.get('cubo_us', float('nan')):>9.1f}")
+    for chave in ('motor_us', 'sqlite_us', 'cubo_us'):
+        if chave in resultados[0]:
+            print(f"Mediana geral {chave[:-3]}: {statistics.median(r[chave] for r in resultados):.1f} µs")
@@ -1,119 +1,410 @@
 import pandas as pd
 import sqlite3
 import chromadb
-import openpyxl # Mesmo que não use diretamente, precisa estar instalado
+import openpyxl # Leitura da planilha em modo streaming (read_only)
 import re # Importado para limpeza de dados no Chroma se necessário
 import io # Importado para possível parse de markdown (não usado na versão final, mas pode deixar)
+import argparse # Para escolher entre carga completa e incremental
+import hashlib # Para a impressão digital (hash) de cada linha
+import math
+from collections import Counter
+from datetime import datetime, date
+from esquema_dados import normalizar_tipos, esquema_esperado, sql_criar_tabela, executar_criacao_indices, verificar_planos_consulta, imprimir_verificacao
+from snapshot_planilha import procurar_snapshot, iterar_snapshot_em_lotes, GravadorSnapshot
+from conexao_sqlite import resetar_conexoes
+from consultas_metricas import preencher_cubo_metricas, verificar_consistencia_cubo
+from pipeline_embeddings import PipelineEmbeddings, TRABALHADORES_EMBEDDING, id_documento, ids_na_colecao
 
 # --- Constantes ---
 NOME_ARQUIVO_EXCEL = 'zeroteste.xlsx' # Verifique se é o nome correto da sua NOVA planilha
+NOME_ABA_EXCEL = 'Base'
 NOME_BANCO_SQLITE = 'meus_dados.db'
+NOME_TABELA_PRINCIPAL = 'minha_tabela_principal'
 NOME_COLECAO_CHROMA = 'minha_colecao_textos'
+CHROMA_DB_PATH_LOCAL = "./chroma_db_storage"
 # Escolha uma coluna de texto importante para o ChromaDB. 'servico_descricao' é geralmente melhor que 'atendimento_num'.
 COLUNA_TEXTO_IMPORTANTE = 'servico_descricao' # <-- SUGIRO MUDAR PARA ESTA! Mas pode manter 'atendimento_num' se preferir.
 
-print(f"Lendo o arquivo Excel: {NOME_ARQUIVO_EXCEL}...")
-try:
-    # Lê a aba/planilha chamada 'Base'
-    df = pd.read_excel(NOME_ARQUIVO_EXCEL, sheet_name='Base')
-    print("--- DEBUG: Colunas encontradas pelo script ---")
-    print(df.columns.tolist())
-    print("--- FIM DEBUG ---")
-    print("Excel lido com sucesso!")
-
-    # --- FORMATAÇÃO DE DATA 'data_faturamento' ---
-    coluna_data = 'data_faturamento'
-    print(f"Formatando a coluna '{coluna_data}' para texto YYYY-MM-DD...")
-    if coluna_data in df.columns:
-        try:
-            # Converte para datetime, erros viram NaT
-            df[coluna_data] = pd.to_datetime(df[coluna_data], errors='coerce')
-            # Formata como texto YYYY-MM-DD, NaT vira None (NULL no banco)
-            df[coluna_data] = df[coluna_data].dt.strftime('%Y-%m-%d')
-            print(f"Coluna '{coluna_data}' formatada com sucesso.")
-        except Exception as e_date:
-            print(f"Aviso: Ocorreu um erro ao tentar formatar a coluna '{coluna_data}': {e_date}")
-            # Continua mesmo se der erro na formatação da data
+# --- Constantes da Carga Incremental ---
+NOME_TABELA_CONTROLE = 'controle_ingestao' # Guarda chave + hash de cada linha da última carga
+COLUNA_CHAVE_LINHA = 'chave_linha' # Coluna extra gravada na tabela principal para localizar a linha
+# Chave de negócio. 'atendimento_num' se repete (um atendimento pode ter várias linhas),
+# então a chave final é 'atendimento_num#ocorrência' (ex: '20190012#0', '20190012#1').
+COLUNAS_CHAVE_NEGOCIO = ['atendimento_num']
+# Carga completa grava nestas tabelas e só no fim troca pelas de verdade (o agente nunca vê a tabela pela metade)
+NOME_TABELA_PRINCIPAL_CARGA = NOME_TABELA_PRINCIPAL + '_carga'
+NOME_TABELA_CONTROLE_CARGA = NOME_TABELA_CONTROLE + '_carga'
+CHROMA_BATCH_SIZE = 4000 # Tamanho seguro para cada lote de leitura/remoção (embeddings: ver pipeline_embeddings.py)
+
+# --- Constantes da Leitura em Lotes (streaming) ---
+LINHAS_POR_LOTE = 2000 # Tamanho fixo de cada lote lido da planilha
+MEMORIA_MAXIMA_MB = 256 # Teto de memória por lote; reduz LINHAS_POR_LOTE se as linhas forem "pesadas"
+LINHAS_AMOSTRA = 200 # Primeiro lote (pequeno) usado para estimar o tamanho de cada linha
+FATOR_COPIAS_LOTE = 4 # Cópias do lote em memória durante hash/to_sql/Chroma (estimativa conservadora)
+SQLITE_MAX_PARAMS = 900 # Abaixo do limite de variáveis por comando do SQLite
+
+
+def nomes_colunas(cabecalho: tuple) -> list[str]:
+    """Replica os nomes que o pandas dá às colunas (sem nome -> 'Unnamed: N', repetidas -> 'nome.1')."""
+    nomes, vistos = [], Counter()
+    for i, nome in enumerate(cabecalho):
+        nome = f"Unnamed: {i}" if nome is None else str(nome)
+        if vistos[nome]:
+            nome_original = nome
+            nome = f"{nome_original}.{vistos[nome_original]}"
+            vistos[nome_original] += 1
+        vistos[nome] += 1
+        nomes.append(nome)
+    return nomes
+
+
+def linhas_por_lote_para_memoria(df_amostra: pd.DataFrame, linhas_por_lote: int, memoria_max_mb: float) -> int:
+    """Limita o tamanho do lote para que (lote x FATOR_COPIAS_LOTE) caiba em memoria_max_mb."""
+    if df_amostra.empty:
+        return linhas_por_lote
+    bytes_por_linha = df_amostra.memory_usage(deep=True, index=False).sum() / len(df_amostra)
+    limite = int((memoria_max_mb * 1024 * 1024) / (bytes_por_linha * FATOR_COPIAS_LOTE))
+    return max(1, min(linhas_por_lote, limite))
+
+
+def iterar_planilha_em_lotes(caminho: str, linhas_por_lote: int = LINHAS_POR_LOTE, memoria_max_mb: float = MEMORIA_MAXIMA_MB):
+    """
+    Lê a aba 'Base' linha a linha (openpyxl read_only) e entrega DataFrames de no máximo
+    linhas_por_lote linhas. Só um lote fica em memória por vez.
+    O primeiro item entregue é a lista de nomes de colunas.
+    """
+    print(f"Lendo o arquivo Excel em lotes: {caminho}...")
+    wb = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = wb[NOME_ABA_EXCEL].iter_rows(values_only=True)
+        colunas = nomes_colunas(next(linhas))
+        print("--- DEBUG: Colunas encontradas pelo script ---")
+        print(colunas)
+        print("--- FIM DEBUG ---")
+        yield colunas
+
+        tamanho_lote = min(LINHAS_AMOSTRA, linhas_por_lote) # Lote de amostra para calibrar o tamanho
+        lote, primeiro_lote = [], True
+        for linha in linhas:
+            if all(valor is None for valor in linha):
+                continue # Ignora linhas totalmente vazias
+            lote.append(linha)
+            if len(lote) >= tamanho_lote:
+                df_lote = pd.DataFrame(lote, columns=colunas)
+                lote = []
+                if primeiro_lote:
+                    tamanho_lote = linhas_por_lote_para_memoria(df_lote, linhas_por_lote, memoria_max_mb)
+                    print(f"--- DEBUG: Lotes de {tamanho_lote} linhas (teto de {memoria_max_mb} MB). ---")
+                    primeiro_lote = False
+                yield df_lote
+        if lote:
+            yield pd.DataFrame(lote, columns=colunas)
+    finally:
+        wb.close()
+
+
+def iterar_lotes_normalizados(caminho: str, linhas_por_lote: int = LINHAS_POR_LOTE, memoria_max_mb: float = MEMORIA_MAXIMA_MB,
+                              usar_snapshot: bool = True):
+    """
+    Entrega a lista de colunas e depois os lotes já normalizados (normalizar_tipos).
+    Se a planilha não mudou desde a última leitura, os lotes vêm do snapshot colunar
+    (sem abrir o Excel); senão o Excel é lido e o snapshot é regravado em paralelo.
+    """
+    caminho_snapshot = procurar_snapshot(caminho) if usar_snapshot else None
+    if caminho_snapshot:
+        print("Planilha não mudou desde a última leitura. Usando snapshot colunar em vez do Excel.")
+        yield from iterar_snapshot_em_lotes(caminho_snapshot, linhas_por_lote)
+        return
+
+    lotes = iterar_planilha_em_lotes(caminho, linhas_por_lote, memoria_max_mb)
+    colunas = next(lotes)
+    yield colunas
+    gravador = GravadorSnapshot(caminho, colunas) if usar_snapshot else None
+    try:
+        for df_lote in lotes:
+            df_lote = normalizar_tipos(df_lote) # Datas 'YYYY-MM-DD', valores REAL, etc. (ver esquema_dados.py)
+            if gravador: gravador.escrever(df_lote)
+            yield df_lote
+        if gravador: gravador.concluir()
+    finally:
+        if gravador: gravador.descartar() # Não faz nada se já foi concluído
+
+
+def _valor_canonico(valor) -> str:
+    """Representação textual estável de uma célula, independente do dtype inferido em cada lote."""
+    if valor is None or valor is pd.NaT or (isinstance(valor, float) and math.isnan(valor)):
+        return ''
+    if isinstance(valor, (datetime, date, pd.Timestamp)):
+        return valor.isoformat()
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def calcular_impressoes_digitais(df: pd.DataFrame, ocorrencias: Counter) -> pd.Series:
+    """
+    Adiciona a coluna COLUNA_CHAVE_LINHA ao lote e retorna uma Series (indexada pela
+    chave) com o hash do conteúdo de cada linha. 'ocorrencias' é compartilhado entre
+    os lotes para numerar chaves repetidas de forma contínua.
+    """
+    faltando = [c for c in COLUNAS_CHAVE_NEGOCIO if c not in df.columns]
+    if faltando:
+        raise KeyError(f"Colunas da chave de negócio não encontradas na planilha: {faltando}")
+    chaves = []
+    for valores in df[COLUNAS_CHAVE_NEGOCIO].itertuples(index=False):
+        chave_base = '|'.join(_valor_canonico(v) for v in valores)
+        chaves.append(f"{chave_base}#{ocorrencias[chave_base]}")
+        ocorrencias[chave_base] += 1
+    df[COLUNA_CHAVE_LINHA] = chaves
+
+    colunas_conteudo = [c for c in df.columns if c != COLUNA_CHAVE_LINHA]
+    conteudo = df[colunas_conteudo].map(_valor_canonico).agg('\x1f'.join, axis=1)
+    hashes = [hashlib.sha1(linha.encode('utf-8')).hexdigest() for linha in conteudo]
+    return pd.Series(hashes, index=chaves, name='hash_linha')
+
+
+def esquema_tabela_principal(conn: sqlite3.Connection) -> list[tuple[str, str]]:
+    """Lista (coluna, tipo declarado) da tabela principal como está no banco."""
+    return [(linha[1], linha[2]) for linha in conn.execute(f"PRAGMA table_info({NOME_TABELA_PRINCIPAL})").fetchall()]
+
+
+def existe_controle(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (NOME_TABELA_CONTROLE,)).fetchone() is not None
+
+
+def ler_controle_lote(conn: sqlite3.Connection, chaves: list[str]) -> dict[str, str]:
+    """Busca {chave: hash} da última carga apenas para as chaves do lote atual."""
+    controle = {}
+    for i in range(0, len(chaves), SQLITE_MAX_PARAMS):
+        parte = chaves[i:i + SQLITE_MAX_PARAMS]
+        marcadores = ','.join('?' * len(parte))
+        controle.update(conn.execute(f"SELECT {COLUNA_CHAVE_LINHA}, hash_linha FROM {NOME_TABELA_CONTROLE} WHERE {COLUNA_CHAVE_LINHA} IN ({marcadores})", parte).fetchall())
+    return controle
+
+
+def iniciar_carga_completa(conn: sqlite3.Connection, colunas: list[str]) -> None:
+    """
+    Cria vazias as tabelas da carga completa (esquema tipado + controle). As tabelas em uso
+    continuam intactas até trocar_tabelas_carga(); sobras de uma carga interrompida são apagadas.
+    Roda dentro da transação da carga (organizar_dados), como as outras funções de gravação.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {NOME_TABELA_PRINCIPAL_CARGA}")
+    conn.execute(f"DROP TABLE IF EXISTS {NOME_TABELA_CONTROLE_CARGA}")
+    conn.execute(sql_criar_tabela(colunas + [COLUNA_CHAVE_LINHA], NOME_TABELA_PRINCIPAL_CARGA))
+    conn.execute(f"CREATE TABLE {NOME_TABELA_CONTROLE_CARGA} ({COLUNA_CHAVE_LINHA} TEXT PRIMARY KEY, hash_linha TEXT NOT NULL)")
+
+
+def trocar_tabelas_carga(conn: sqlite3.Connection) -> None:
+    """
+    Troca a tabela principal e a de controle pelas da carga completa, já com os índices. Sem
+    commit: faz parte da transação da carga, que também recria o cubo. O pool de leitura, o cache
+    de resultados e o motor colunar veem tabela e cubo antigos até o commit e os novos depois
+    (WAL: a leitura não espera a troca).
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {NOME_TABELA_PRINCIPAL}") # Leva junto os índices antigos
+    conn.execute(f"DROP TABLE IF EXISTS {NOME_TABELA_CONTROLE}")
+    conn.execute(f"ALTER TABLE {NOME_TABELA_PRINCIPAL_CARGA} RENAME TO {NOME_TABELA_PRINCIPAL}")
+    conn.execute(f"ALTER TABLE {NOME_TABELA_CONTROLE_CARGA} RENAME TO {NOME_TABELA_CONTROLE}")
+    conn.execute(f"CREATE INDEX idx_{NOME_TABELA_PRINCIPAL}_{COLUNA_CHAVE_LINHA} ON {NOME_TABELA_PRINCIPAL} ({COLUNA_CHAVE_LINHA})")
+    executar_criacao_indices(conn, NOME_TABELA_PRINCIPAL)
+
+
+def aplicar_lote_sqlite(conn: sqlite3.Connection, df: pd.DataFrame, hashes: pd.Series, incremental: bool) -> tuple[list[str], list[str]]:
+    """
+    Grava um lote na tabela principal (na carga completa, na tabela de carga), sem commit. Na carga
+    incremental só insere/atualiza as linhas cujo hash mudou. Retorna as chaves (inseridas, atualizadas) do lote.
+    """
+    tabela = NOME_TABELA_PRINCIPAL if incremental else NOME_TABELA_PRINCIPAL_CARGA
+    tabela_controle = NOME_TABELA_CONTROLE if incremental else NOME_TABELA_CONTROLE_CARGA
+    novas = hashes.to_dict()
+    chaves = list(novas)
+    controle = ler_controle_lote(conn, chaves) if incremental else {}
+    inseridas = [k for k in chaves if k not in controle]
+    atualizadas = [k for k in chaves if k in controle and controle[k] != novas[k]]
+
+    # Marca as chaves vistas nesta carga (usado depois para achar as removidas)
+    conn.executemany("INSERT OR IGNORE INTO temp.chaves_vistas VALUES (?)", [(k,) for k in chaves])
+    # Atualização = remove a versão antiga e insere a nova
+    if atualizadas:
+        conn.executemany(f"DELETE FROM {tabela} WHERE {COLUNA_CHAVE_LINHA} = ?", [(k,) for k in atualizadas])
+    para_inserir = inseridas + atualizadas
+    if para_inserir:
+        df_novas = df[df[COLUNA_CHAVE_LINHA].isin(set(para_inserir))]
+        # executemany em vez de df.to_sql: o to_sql faz commit e quebraria a transação da carga
+        nomes = ", ".join(f'"{c}"' for c in df_novas.columns)
+        valores = df_novas.astype(object).where(df_novas.notna(), None).itertuples(index=False, name=None)
+        conn.executemany(f"INSERT INTO {tabela} ({nomes}) VALUES ({', '.join('?' * len(df_novas.columns))})", valores)
+        conn.executemany(f"INSERT OR REPLACE INTO {tabela_controle} VALUES (?, ?)", [(k, novas[k]) for k in para_inserir])
+    return inseridas, atualizadas
+
+
+def remover_chaves_ausentes(conn: sqlite3.Connection) -> list[str]:
+    """Remove da tabela principal/controle as chaves que não apareceram nesta carga (sem commit)."""
+    removidas = [linha[0] for linha in conn.execute(
+        f"SELECT {COLUNA_CHAVE_LINHA} FROM {NOME_TABELA_CONTROLE} WHERE {COLUNA_CHAVE_LINHA} NOT IN (SELECT chave FROM temp.chaves_vistas)").fetchall()]
+    if removidas:
+        conn.executemany(f"DELETE FROM {NOME_TABELA_PRINCIPAL} WHERE {COLUNA_CHAVE_LINHA} = ?", [(k,) for k in removidas])
+        conn.executemany(f"DELETE FROM {NOME_TABELA_CONTROLE} WHERE {COLUNA_CHAVE_LINHA} = ?", [(k,) for k in removidas])
+    return removidas
+
+
+def iterar_textos_distintos(conn: sqlite3.Connection, tamanho_lote: int = CHROMA_BATCH_SIZE):
+    """Entrega listas de textos distintos (não nulos) da coluna de texto, já como estão no SQLite."""
+    cursor = conn.execute(f'SELECT DISTINCT "{COLUNA_TEXTO_IMPORTANTE}" FROM {NOME_TABELA_PRINCIPAL} WHERE "{COLUNA_TEXTO_IMPORTANTE}" IS NOT NULL')
+    while True:
+        linhas = cursor.fetchmany(tamanho_lote)
+        if not linhas:
+            return
+        yield [str(linha[0]) for linha in linhas]
+
+
+def remover_do_chroma(collection, ids: list[str]) -> None:
+    if ids:
+        print(f"Removendo {len(ids)} itens do ChromaDB...")
+        for i in range(0, len(ids), CHROMA_BATCH_SIZE):
+            collection.delete(ids=ids[i:i + CHROMA_BATCH_SIZE])
+
+
+def abrir_colecao_chroma(recriar: bool):
+    """Abre a coleção do ChromaDB; com recriar=True ela é apagada antes (ex: troca do modelo de embedding)."""
+    print(f"Conectando ao ChromaDB (local)...")
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH_LOCAL)
+    if recriar:
+        try: client.delete_collection(NOME_COLECAO_CHROMA)
+        except Exception: pass # Coleção ainda não existia
+    return client.get_or_create_collection(NOME_COLECAO_CHROMA)
+
+
+def sincronizar_chroma(conn: sqlite3.Connection, recriar: bool = False, trabalhadores_embedding: int = TRABALHADORES_EMBEDDING) -> None:
+    """
+    Deixa a coleção com exatamente um vetor por texto distinto da tabela principal.
+    O ID é o hash do texto (id_documento): textos que já estão na coleção não são
+    recalculados, textos repetidos viram um só documento e IDs que não correspondem
+    a nenhum texto atual (linhas removidas/alteradas, IDs antigos por linha) são apagados.
+    Se a carga for interrompida, a próxima só calcula o que ainda falta.
+    """
+    collection = abrir_colecao_chroma(recriar)
+    existentes = ids_na_colecao(collection)
+    pipeline = PipelineEmbeddings(collection, ids_existentes=existentes, trabalhadores=trabalhadores_embedding)
+    desejados = set()
+    try:
+        for textos in iterar_textos_distintos(conn):
+            ids = [id_documento(t) for t in textos]
+            desejados.update(ids)
+            pipeline.enviar(ids, textos) # Só os IDs que a coleção ainda não tem passam pelo embedding
+    finally:
+        estatisticas = pipeline.concluir()
+    orfaos = sorted(existentes - desejados)
+    remover_do_chroma(collection, orfaos)
+    if estatisticas['gravados'] == 0 and not orfaos and not estatisticas['lotes_com_erro']:
+        print("ChromaDB já está atualizado: nenhum texto novo.")
     else:
-        print(f"Aviso: Coluna '{coluna_data}' não encontrada. Pulando formatação de data.")
-    # --- FIM DA FORMATAÇÃO DE DATA ---
+        print(f"ChromaDB sincronizado: {estatisticas['gravados']} textos novos, {len(orfaos)} vetores órfãos removidos.")
+    if estatisticas['lotes_com_erro']:
+        print("Aviso: Alguns lotes falharam. A próxima execução envia os textos que ficaram faltando.")
+
 
-    # 1. Salvar no Banco de Dados Estruturado (SQLite)
+def organizar_dados(modo_completo: bool = False, linhas_por_lote: int = LINHAS_POR_LOTE, memoria_max_mb: float = MEMORIA_MAXIMA_MB,
+                    verificar_indices: bool = False, usar_snapshot: bool = True,
+                    trabalhadores_embedding: int = TRABALHADORES_EMBEDDING, recriar_chroma: bool = False) -> None:
+    lotes = iterar_lotes_normalizados(NOME_ARQUIVO_EXCEL, linhas_por_lote, memoria_max_mb, usar_snapshot)
+    colunas = next(lotes)
+    if COLUNA_TEXTO_IMPORTANTE not in colunas:
+        print(f"Erro Crítico: A coluna '{COLUNA_TEXTO_IMPORTANTE}' definida para ChromaDB não existe na planilha!")
+
+    # 1. Preparar o Banco de Dados Estruturado (SQLite)
     print(f"Conectando ao banco de dados SQLite: {NOME_BANCO_SQLITE}...")
     conn = sqlite3.connect(NOME_BANCO_SQLITE)
-    # Salva a tabela, substituindo se já existir. A coluna de data irá como TEXT.
-    df.to_sql('minha_tabela_principal', conn, if_exists='replace', index=False)
-    conn.close()
-    print("Dados salvos no SQLite com sucesso! (Coluna de data como TEXT)")
-
-    # 2. Salvar no Banco de Dados Vetorial (ChromaDB)
-    print("Preparando dados para o ChromaDB...")
-    # Pega os textos da coluna escolhida, remove vazios e converte para string
-    if COLUNA_TEXTO_IMPORTANTE in df.columns:
-      textos = df[COLUNA_TEXTO_IMPORTANTE].dropna().astype(str).tolist()
-      # Cria IDs únicos baseados no índice do DataFrame original
-      ids = df[COLUNA_TEXTO_IMPORTANTE].dropna().index.astype(str).tolist()
-      # Garante que IDs sejam únicos (caso haja índices duplicados por algum motivo)
-      if len(ids) != len(set(ids)):
-          print("Aviso: IDs gerados para ChromaDB não são únicos, usando renumeração simples.")
-          ids = [str(i) for i in range(len(textos))]
+    try:
+        # WAL: o agente continua lendo (conexões do pool) enquanto a carga grava
+        conn.execute("PRAGMA journal_mode=WAL")
+        incremental = not modo_completo and existe_controle(conn)
+        if incremental and esquema_tabela_principal(conn) != esquema_esperado(colunas + [COLUNA_CHAVE_LINHA]):
+            print("Aviso: As colunas (ou os tipos) mudaram desde a última carga. Fazendo carga completa.")
+            incremental = False
+        print("Modo de carga: " + ("INCREMENTAL" if incremental else "COMPLETA"))
 
-    else:
-        print(f"Erro Crítico: A coluna '{COLUNA_TEXTO_IMPORTANTE}' definida para ChromaDB não existe na planilha!")
-        textos = [] # Garante que a lista esteja vazia para não prosseguir
-        ids = []
-
-    # Verifica se a lista 'textos' não está vazia
-    if textos:
-        print(f"Conectando ao ChromaDB (local)...")
-        client = chromadb.PersistentClient(path="./chroma_db_storage")
-        collection = client.get_or_create_collection(NOME_COLECAO_CHROMA)
-
-        # --- Bloco de Batching CORRIGIDO ---
-        total_items = len(textos)
-        batch_size = 4000 # Tamanho seguro para cada lote
-        print(f"Adicionando {total_items} textos ao ChromaDB em lotes de {batch_size}...")
-
-        # Loop para processar em lotes
-        for i in range(0, total_items, batch_size):
-            # Pega o lote atual
-            batch_texts = textos[i:i + batch_size]
-            batch_ids = ids[i:i + batch_size] # Usa os IDs correspondentes ao lote
-
-            if not batch_texts:
-                continue
-
-            print(f"  - Adicionando lote de {len(batch_texts)} itens (começando do item {i})...")
-            try:
-                # Adiciona o lote ao ChromaDB
-                collection.add(
-                    documents=batch_texts,
-                    ids=batch_ids # Corrigido para usar batch_ids
-                )
-            except Exception as e_chroma_batch:
-                print(f"    * Erro ao adicionar lote iniciado em {i}: {e_chroma_batch}")
-                # Continua para o próximo lote
-
-        # Mensagem final DEPOIS do loop
-        print("Textos adicionados/atualizados no ChromaDB!")
-        # --- Fim do Bloco de Batching CORRIGIDO ---
+        # 2. Processar lote a lote no SQLite. A carga inteira (lotes, remoções ou troca de tabelas,
+        # índices e cubo) é uma transação: o agente vê tabela e cubo antigos até o commit e os dois
+        # novos depois, nunca um sem o outro.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not incremental:
+                iniciar_carga_completa(conn, colunas)
+            conn.execute("CREATE TEMP TABLE chaves_vistas (chave TEXT PRIMARY KEY)")
+            ocorrencias = Counter()
+            total_linhas = total_inseridas = total_atualizadas = 0
+            for df_lote in lotes:
+                hashes = calcular_impressoes_digitais(df_lote, ocorrencias)
+                inseridas, atualizadas = aplicar_lote_sqlite(conn, df_lote, hashes, incremental)
+                total_linhas += len(df_lote); total_inseridas += len(inseridas); total_atualizadas += len(atualizadas)
+                print(f"  - Lote de {len(df_lote)} linhas: {len(inseridas)} inseridas, {len(atualizadas)} atualizadas no SQLite.")
 
-    else:
-        print("Nenhum texto válido encontrado na coluna especificada para adicionar ao ChromaDB.")
+            if incremental:
+                removidas = remover_chaves_ausentes(conn)
+                executar_criacao_indices(conn, NOME_TABELA_PRINCIPAL)
+            else:
+                removidas = []
+                trocar_tabelas_carga(conn)
+            linhas_cubo = preencher_cubo_metricas(conn)
+            conn.commit() # Só agora o agente passa a ver os dados novos
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.execute("ANALYZE") # Estatísticas do planejador para a tabela e o cubo novos
+        print(f"Dados salvos no SQLite com sucesso! {total_linhas} linhas lidas: {total_inseridas} inseridas, {total_atualizadas} atualizadas, {len(removidas)} removidas.")
+        print("Índices das ferramentas do agente criados/atualizados.")
+        divergencias = verificar_consistencia_cubo(conn)
+        print(f"Cubo de métricas recriado ({linhas_cubo} linhas).")
+        for divergencia in divergencias:
+            print(f"Aviso: Cubo diverge da tabela principal em {divergencia}")
+        if verificar_indices:
+            print("--- Verificação dos planos de consulta (EXPLAIN QUERY PLAN) ---")
+            imprimir_verificacao(verificar_planos_consulta(conn))
+
+        # 3. ChromaDB: um vetor por texto distinto, reaproveitando os que já existem
+        if COLUNA_TEXTO_IMPORTANTE in colunas:
+            sincronizar_chroma(conn, recriar=recriar_chroma, trabalhadores_embedding=trabalhadores_embedding)
+    finally:
+        conn.close()
+        resetar_conexoes() # Se o agente estiver no mesmo processo, as conexões de leitura são reabertas
 
     print("\nOrganização dos dados concluída!")
 
-# Blocos de tratamento de erro principal
-except FileNotFoundError:
-    print(f"Erro CRÍTICO: Arquivo Excel '{NOME_ARQUIVO_EXCEL}' não encontrado!")
-    print("Verifique o nome e o local do arquivo.")
-except ImportError as e_import:
-     print(f"Erro CRÍTICO de importação: {e_import}")
-     print("Verifique se todas as bibliotecas (pandas, openpyxl, sqlite3, chromadb) estão instaladas no venv com 'pip install ...'")
-except KeyError as e_key:
-     print(f"Erro CRÍTICO: A coluna '{COLUNA_TEXTO_IMPORTANTE}' não foi encontrada no Excel durante a preparação para o ChromaDB!")
-     print("Verifique o nome da coluna na constante COLUNA_TEXTO_IMPORTANTE e na sua planilha Excel.")
-except Exception as e:
-    print(f"Ocorreu um erro inesperado CRÍTICO durante a execução: {e}")
-    import traceback
-    traceback.print_exc() # Imprime mais detalhes do erro
\ No newline at end of file
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Carrega a planilha no SQLite e no ChromaDB.")
+    parser.add_argument('--completo', action='store_true',
+                        help="Ignora a carga incremental e recria a tabela do zero (vetores do ChromaDB com o mesmo texto são reaproveitados).")
+    parser.add_argument('--linhas-por-lote', type=int, default=LINHAS_POR_LOTE,
+                        help=f"Linhas lidas da planilha por lote (padrão: {LINHAS_POR_LOTE}).")
+    parser.add_argument('--memoria-max-mb', type=float, default=MEMORIA_MAXIMA_MB,
+                        help=f"Teto aproximado de memória por lote, em MB (padrão: {MEMORIA_MAXIMA_MB}).")
+    parser.add_argument('--verificar-indices', action='store_true',
+                        help="Ao final, mostra o EXPLAIN QUERY PLAN das consultas das ferramentas e se usam índice.")
+    parser.add_argument('--sem-snapshot', action='store_true',
+                        help="Lê o Excel mesmo que exista snapshot colunar válido (e não grava snapshot).")
+    parser.add_argument('--trabalhadores-embedding', type=int, default=TRABALHADORES_EMBEDDING,
+                        help=f"Threads que calculam embeddings em paralelo (padrão: {TRABALHADORES_EMBEDDING}).")
+    parser.add_argument('--recriar-chroma', action='store_true',
+                        help="Apaga a coleção do ChromaDB e recalcula todos os embeddings (ex: ao trocar o modelo).")
+    args = parser.parse_args()
+
+    try:
+        organizar_dados(modo_completo=args.completo, linhas_por_lote=args.linhas_por_lote, memoria_max_mb=args.memoria_max_mb,
+                        verificar_indices=args.verificar_indices, usar_snapshot=not args.sem_snapshot,
+                        trabalhadores_embedding=args.trabalhadores_embedding, recriar_chroma=args.recriar_chroma)
+    # Blocos de tratamento de erro principal
+    except FileNotFoundError:
+        print(f"Erro CRÍTICO: Arquivo Excel '{NOME_ARQUIVO_EXCEL}' não encontrado!")
+        print("Verifique o nome e o local do arquivo.")
+    except ImportError as e_import:
+         print(f"Erro CRÍTICO de importação: {e_import}")
+         print("Verifique se todas as bibliotecas (pandas, openpyxl, sqlite3, chromadb) estão instaladas no venv com 'pip install ...'")
+    except KeyError as e_key:
+         print(f"Erro CRÍTICO: Coluna não encontrada no Excel: {e_key}")
+         print("Verifique o nome da coluna nas constantes COLUNA_TEXTO_IMPORTANTE/COLUNAS_CHAVE_NEGOCIO e na sua planilha Excel.")
+    except Exception as e:
+        print(f"Ocorreu um erro inesperado CRÍTICO durante a execução: {e}")
+        import traceback
+        traceback.print_exc() # Imprime mais detalhes do erro
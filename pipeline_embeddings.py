@@ -0,0 +1,104 @@
+# pipeline_embeddings.py
+# Envio de textos ao ChromaDB com embeddings calculados num pool de threads,
+# gravação em paralelo com o cálculo do próximo lote. Os IDs vêm do hash do texto,
+# então textos já gravados são reconhecidos e não passam pelo embedding de novo.
+
+import os
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Constantes ---
+TAMANHO_LOTE_EMBEDDING = 256 # Documentos por lote (unidade de trabalho do pool)
+TAMANHO_PAGINA_IDS = 5000 # IDs lidos por chamada ao listar a coleção
+TRABALHADORES_EMBEDDING = max(1, (os.cpu_count() or 2) - 1)
+
+
+def id_documento(texto: str) -> str:
+    """ID endereçado pelo conteúdo: o mesmo texto sempre tem o mesmo ID, em qualquer linha ou ordem."""
+    return "desc_" + hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def ids_na_colecao(collection, pagina: int = TAMANHO_PAGINA_IDS) -> set[str]:
+    """Todos os IDs gravados na coleção (sem documentos nem embeddings), lidos em páginas."""
+    ids, inicio = set(), 0
+    while True:
+        parte = collection.get(include=[], limit=pagina, offset=inicio)['ids']
+        ids.update(parte)
+        if len(parte) < pagina:
+            return ids
+        inicio += pagina
+
+
+class PipelineEmbeddings:
+    """
+    Recebe (ids, textos) aos poucos e envia ao ChromaDB em lotes de TAMANHO_LOTE_EMBEDDING.
+    Os embeddings são calculados em 'trabalhadores' threads (o ONNX libera o GIL) enquanto
+    a thread principal grava no Chroma os lotes já prontos, na ordem de chegada.
+    IDs em 'ids_existentes' (já na coleção) ou já enviados nesta carga são pulados.
+    """
+
+    def __init__(self, collection, funcao_embedding=None, ids_existentes: set[str] | None = None,
+                 trabalhadores: int = TRABALHADORES_EMBEDDING, tamanho_lote: int = TAMANHO_LOTE_EMBEDDING):
+        if funcao_embedding is None:
+            from chromadb.utils import embedding_functions
+            funcao_embedding = embedding_functions.DefaultEmbeddingFunction() # Mesma função padrão da coleção
+        self.collection = collection
+        self.funcao_embedding = funcao_embedding
+        self.ids_conhecidos = set(ids_existentes or ()) # Cresce com os IDs enviados (deduplica textos repetidos)
+        self.tamanho_lote = tamanho_lote
+        self.pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="embedding")
+        self.max_em_voo = trabalhadores + 1 # Lotes calculando + 1 pronto esperando gravação
+        self.em_voo = deque()
+        self.pendente_ids, self.pendente_textos = [], []
+        self.docs_gravados = self.docs_pulados = self.lotes_com_erro = 0
+        self.inicio = None
+
+    def enviar(self, ids: list[str], textos: list[str]) -> None:
+        for id_doc, texto in zip(ids, textos):
+            if id_doc in self.ids_conhecidos:
+                self.docs_pulados += 1
+                continue
+            self.ids_conhecidos.add(id_doc)
+            self.pendente_ids.append(id_doc); self.pendente_textos.append(texto)
+            if len(self.pendente_ids) >= self.tamanho_lote:
+                self._submeter_lote()
+
+    def _submeter_lote(self) -> None:
+        ids, textos = self.pendente_ids, self.pendente_textos
+        self.pendente_ids, self.pendente_textos = [], []
+        if self.inicio is None:
+            self.inicio = time.perf_counter()
+        while len(self.em_voo) >= self.max_em_voo:
+            self._gravar_mais_antigo()
+        self.em_voo.append((ids, textos, self.pool.submit(self.funcao_embedding, textos)))
+
+    def _gravar_mais_antigo(self) -> None:
+        ids, textos, futuro = self.em_voo.popleft()
+        try:
+            embeddings = futuro.result()
+            self.collection.upsert(ids=ids, documents=textos, embeddings=embeddings)
+        except Exception as e_chroma_batch:
+            self.lotes_com_erro += 1
+            print(f"    * Erro ao gravar lote de {len(ids)} itens (primeiro ID {ids[0]}): {e_chroma_batch}")
+            return # IDs não chegaram à coleção: a próxima carga tenta de novo
+        self.docs_gravados += len(ids)
+        decorrido = time.perf_counter() - self.inicio
+        print(f"  - Lote de {len(ids)} itens gravado no ChromaDB ({self.docs_gravados} no total, {self.docs_gravados / decorrido:.1f} docs/s).")
+
+    def concluir(self) -> dict:
+        """Envia o que sobrou, espera todos os lotes e retorna as estatísticas da carga."""
+        try:
+            if self.pendente_ids:
+                self._submeter_lote()
+            while self.em_voo:
+                self._gravar_mais_antigo()
+        finally:
+            self.pool.shutdown(wait=True)
+        decorrido = (time.perf_counter() - self.inicio) if self.inicio else 0.0
+        vazao = self.docs_gravados / decorrido if decorrido > 0 else 0.0
+        print(f"ChromaDB: {self.docs_gravados} documentos gravados em {decorrido:.1f}s ({vazao:.1f} docs/s), "
+              f"{self.docs_pulados} pulados (já na coleção ou repetidos), {self.lotes_com_erro} lotes com erro.")
+        return {'gravados': self.docs_gravados, 'pulados': self.docs_pulados, 'lotes_com_erro': self.lotes_com_erro,
+                'segundos': decorrido, 'docs_por_segundo': vazao}
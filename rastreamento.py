@@ -0,0 +1,324 @@
+# rastreamento.py
+# Para onde foi o tempo de uma resposta: cada pergunta ao agente vira um rastro com spans
+# (chamadas ao LLM, ferramentas, SQL, gráficos) com duração, linhas, acerto de cache e tokens.
+# Os spans vão para um JSONL (um por linha) e alimentam métricas no formato texto do Prometheus.
+# Aqui também fica o logging dos módulos (obter_logger), no lugar dos print("--- DEBUG ...").
+#
+#   LOG_LEVEL=DEBUG streamlit run assistente_app.py     -> mostra as mensagens de depuração
+#   RASTREAMENTO_ARQUIVO=./rastros.jsonl RASTREAMENTO_METRICAS=./metricas_marina.prom
+#                                                       -> grava spans e métricas em disco (padrão: só na memória)
+#   RASTREAMENTO=0                                      -> desliga spans e métricas
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# --- Constantes ---
+NIVEL_LOG = os.getenv("LOG_LEVEL", "INFO").upper()
+RASTREAMENTO = os.getenv("RASTREAMENTO", "1") != "0"
+ARQUIVO_RASTROS = os.getenv("RASTREAMENTO_ARQUIVO", "") # Ex: ./rastros.jsonl; "" = spans só na memória
+ARQUIVO_METRICAS = os.getenv("RASTREAMENTO_METRICAS", "") # Ex: ./metricas_marina.prom, reescrito ao fim de cada turno; "" = não grava
+MAX_BYTES_RASTROS = 50 * 1024 * 1024 # Acima disso o JSONL vira .1 e começa de novo
+MAX_SPANS_MEMORIA = 2000 # Últimos spans guardados para inspeção (rastreador.recentes)
+MAX_CARACTERES_SQL = 300
+LIMITES_HISTOGRAMA_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ATRIBUTOS_SOMADOS = ('linhas', 'bytes', 'tokens_entrada', 'tokens_saida') # Viram contadores marina_<atributo>_total
+
+
+def configurar_logging(nivel: str = NIVEL_LOG) -> logging.Logger:
+    """Logger 'marina' (pai dos loggers dos módulos) escrevendo no terminal. Pode ser chamado de novo para mudar o nível."""
+    raiz = logging.getLogger("marina")
+    if not raiz.handlers:
+        saida = logging.StreamHandler()
+        saida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s", "%H:%M:%S"))
+        raiz.addHandler(saida)
+        raiz.propagate = False
+    raiz.setLevel(nivel)
+    return raiz
+
+
+def obter_logger(modulo: str) -> logging.Logger:
+    """logging.getLogger('marina.<modulo>'). Use argumentos (log.debug('x=%s', x)), não f-strings: desligado, não formata nada."""
+    return logging.getLogger(f"marina.{modulo}")
+
+
+log = obter_logger("rastreamento")
+
+
+class Span:
+    """Um trecho medido. 'rastro' agrupa os spans de uma mesma pergunta; 'pai' é o span que o chamou."""
+
+    __slots__ = ('tipo', 'nome', 'rastro', 'id', 'pai', 'inicio', 'duracao_ms', 'atributos', 'erro', '_t0')
+
+    def __init__(self, tipo: str, nome: str, pai: 'Span | None', atributos: dict):
+        self.tipo, self.nome, self.atributos = tipo, nome, atributos
+        self.pai = pai.id if pai else None
+        self.rastro = pai.rastro if pai else uuid.uuid4().hex[:16]
+        self.id = uuid.uuid4().hex[:16]
+        self.inicio = time.time()
+        self.duracao_ms = None
+        self.erro = None
+        self._t0 = time.perf_counter()
+
+    def como_dict(self) -> dict:
+        return {'rastro': self.rastro, 'span': self.id, 'pai': self.pai, 'tipo': self.tipo, 'nome': self.nome,
+                'inicio': round(self.inicio, 6), 'duracao_ms': self.duracao_ms, 'erro': self.erro, **self.atributos}
+
+
+# Span aberto no contexto atual: os spans de SQL/gráfico abertos dentro de uma ferramenta viram filhos dela
+_span_atual = contextvars.ContextVar("marina_span_atual", default=None)
+
+
+def _rotulo_prometheus(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Rastreador:
+    """
+    Recebe os spans fechados: guarda os últimos na memória, grava no JSONL e acumula as métricas
+    (histograma de duração por tipo/nome e contadores de linhas, tokens, cache e erros).
+    """
+
+    def __init__(self, ativo: bool = RASTREAMENTO, arquivo: str = ARQUIVO_RASTROS, arquivo_metricas: str = ARQUIVO_METRICAS):
+        self.ativo = ativo
+        self.arquivo = arquivo
+        self.arquivo_metricas = arquivo_metricas
+        self.recentes = deque(maxlen=MAX_SPANS_MEMORIA)
+        self._trava = threading.Lock()
+        self._saida = None
+        self._duracoes = {} # (tipo, nome) -> [contagem por limite..., +Inf, soma_s]
+        self._contadores = {} # (métrica, rótulos ordenados) -> valor
+
+    # --- Spans ---
+    def iniciar(self, tipo: str, nome: str, pai: Span | None = None, **atributos) -> Span:
+        return Span(tipo, nome, pai if pai is not None else _span_atual.get(), atributos)
+
+    def encerrar(self, span: Span, erro: BaseException | str | None = None) -> None:
+        span.duracao_ms = round((time.perf_counter() - span._t0) * 1000, 3)
+        if erro is not None and span.erro is None:
+            span.erro = erro if isinstance(erro, str) else f"{type(erro).__name__}: {erro}"
+        with self._trava:
+            self.recentes.append(span)
+            self._acumular(span)
+            self._gravar(span)
+        if span.pai is None: # Fim do turno: métricas atualizadas no disco
+            self.gravar_metricas()
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("span %s/%s %.1f ms %s", span.tipo, span.nome, span.duracao_ms, span.atributos)
+
+    @contextmanager
+    def span(self, tipo: str, nome: str, **atributos):
+        """with rastreador.span('grafico', 'vendas'): ...  (entrega o Span, ou None com o rastreamento desligado)"""
+        if not self.ativo:
+            yield None
+            return
+        span = self.iniciar(tipo, nome, **atributos)
+        marca = _span_atual.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.encerrar(span, e)
+            raise
+        else:
+            self.encerrar(span)
+        finally:
+            _span_atual.reset(marca)
+
+    # --- Saídas ---
+    def _gravar(self, span: Span) -> None:
+        if not self.arquivo:
+            return
+        try:
+            if self._saida is None:
+                self._saida = open(self.arquivo, "a", encoding="utf-8")
+            self._saida.write(json.dumps(span.como_dict(), ensure_ascii=False, default=str) + "\n")
+            if span.pai is None:
+                self._saida.flush()
+                if self._saida.tell() > MAX_BYTES_RASTROS:
+                    self._saida.close(); self._saida = None
+                    os.replace(self.arquivo, self.arquivo + ".1")
+        except OSError as e:
+            log.warning("Rastros não gravados em '%s' (%s); seguindo só na memória.", self.arquivo, e)
+            self.arquivo, self._saida = "", None
+
+    def _somar(self, metrica: str, valor: float, **rotulos) -> None:
+        chave = (metrica, tuple(sorted(rotulos.items())))
+        self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def _acumular(self, span: Span) -> None:
+        baldes = self._duracoes.setdefault((span.tipo, span.nome), [0] * (len(LIMITES_HISTOGRAMA_S) + 2))
+        segundos = span.duracao_ms / 1000
+        for i, limite in enumerate(LIMITES_HISTOGRAMA_S):
+            if segundos <= limite:
+                baldes[i] += 1
+        baldes[-2] += 1
+        baldes[-1] += segundos
+        for atributo in ATRIBUTOS_SOMADOS:
+            if isinstance(span.atributos.get(atributo), (int, float)):
+                self._somar(f"marina_{atributo}_total", span.atributos[atributo], tipo=span.tipo, nome=span.nome)
+        if 'cache' in span.atributos:
+            self._somar("marina_cache_total", 1, tipo=span.tipo, nome=span.nome, resultado=span.atributos['cache'])
+        if span.erro:
+            self._somar("marina_erros_total", 1, tipo=span.tipo, nome=span.nome)
+
+    def metricas_prometheus(self) -> str:
+        """Métricas acumuladas no formato texto do Prometheus (para um node_exporter textfile ou um /metrics)."""
+        linhas = ["# HELP marina_span_duracao_segundos Duração dos spans (turno, llm, ferramenta, sql, grafico).",
+                  "# TYPE marina_span_duracao_segundos histogram"]
+        with self._trava:
+            duracoes = {chave: list(baldes) for chave, baldes in self._duracoes.items()}
+            contadores = dict(self._contadores)
+        for (tipo, nome), baldes in sorted(duracoes.items()):
+            rotulos = f'tipo="{_rotulo_prometheus(tipo)}",nome="{_rotulo_prometheus(nome)}"'
+            for limite, quantidade in zip(LIMITES_HISTOGRAMA_S, baldes):
+                linhas.append(f'marina_span_duracao_segundos_bucket{{{rotulos},le="{limite}"}} {quantidade}')
+            linhas.append(f'marina_span_duracao_segundos_bucket{{{rotulos},le="+Inf"}} {baldes[-2]}')
+            linhas.append(f'marina_span_duracao_segundos_sum{{{rotulos}}} {baldes[-1]:.6f}')
+            linhas.append(f'marina_span_duracao_segundos_count{{{rotulos}}} {baldes[-2]}')
+        metrica_anterior = None
+        for (metrica, rotulos), valor in sorted(contadores.items()):
+            if metrica != metrica_anterior:
+                linhas.append(f"# TYPE {metrica} counter")
+                metrica_anterior = metrica
+            texto_rotulos = ",".join(f'{chave}="{_rotulo_prometheus(v)}"' for chave, v in rotulos)
+            linhas.append(f"{metrica}{{{texto_rotulos}}} {valor}")
+        return "\n".join(linhas) + "\n"
+
+    def gravar_metricas(self, caminho: str | None = None) -> None:
+        caminho = caminho if caminho is not None else self.arquivo_metricas
+        if not caminho:
+            return
+        try:
+            temporario = caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                arquivo.write(self.metricas_prometheus())
+            os.replace(temporario, caminho) # Quem lê o arquivo nunca vê metade dele
+        except OSError as e:
+            log.warning("Métricas não gravadas em '%s': %s", caminho, e)
+
+    def limpar(self) -> None:
+        with self._trava:
+            self.recentes.clear(); self._duracoes.clear(); self._contadores.clear()
+
+
+# Rastreador único do processo
+rastreador = Rastreador()
+
+
+def anotar(erro: str | None = None, **atributos) -> None:
+    """Acrescenta atributos (linhas=, cache='acerto'/'falha', bytes=...) ao span aberto no contexto atual; erro= marca o span como falho."""
+    span = _span_atual.get()
+    if span is not None:
+        span.atributos.update(atributos)
+        if erro is not None:
+            span.erro = str(erro)
+
+
+def resumir_sql(query) -> str:
+    """Comando SQL numa linha, cortado em MAX_CARACTERES_SQL (atributo 'sql' dos spans)."""
+    return " ".join(str(query).split())[:MAX_CARACTERES_SQL]
+
+
+def rastrear(tipo: str, nome=None):
+    """
+    Decorador: cada chamada da função vira um span. Para SQL, o texto do comando (primeiro
+    argumento) vai no atributo 'sql'; o nome do span continua sendo o da função (rótulo curto nas métricas).
+    """
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not rastreador.ativo:
+                return funcao(*args, **kwargs)
+            atributos = {'sql': resumir_sql(args[0])} if tipo == 'sql' and args else {}
+            with rastreador.span(tipo, rotulo, **atributos):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+class RastreamentoCallback(BaseCallbackHandler):
+    """
+    Spans do LangChain: o executor (turno), cada chamada ao modelo (com tokens) e cada ferramenta.
+    Registrado uma vez para o processo (ver o fim do módulo): vale para toda invoke(), sem
+    precisar passar em config={"callbacks": ...}.
+    """
+
+    def __init__(self):
+        self._spans = {} # run_id -> (span, span que estava aberto antes)
+
+    def _abrir(self, run_id, parent_run_id, tipo: str, nome: str, **atributos) -> None:
+        pai = self._spans[parent_run_id][0] if parent_run_id in self._spans else _span_atual.get()
+        span = rastreador.iniciar(tipo, nome, pai=pai, **atributos)
+        self._spans[run_id] = (span, _span_atual.get())
+        _span_atual.set(span) # SQL e gráficos da ferramenta viram filhos deste span
+
+    def _fechar(self, run_id, erro=None, **atributos) -> None:
+        aberto = self._spans.pop(run_id, None)
+        if aberto is None:
+            return
+        span, anterior = aberto
+        span.atributos.update(atributos)
+        _span_atual.set(anterior)
+        rastreador.encerrar(span, erro)
+
+    # Turno: só o executor de fora (sem pai); as chains internas do agente não viram spans
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs) -> None:
+        if parent_run_id is None:
+            pergunta = inputs.get('input') if isinstance(inputs, dict) else None
+            self._abrir(run_id, None, 'turno', kwargs.get('name') or (serialized or {}).get('name') or 'agente',
+                        **({'pergunta': str(pergunta)[:200]} if pergunta else {}))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._fechar(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._fechar(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs) -> None:
+        parametros = kwargs.get('invocation_params') or {}
+        modelo = parametros.get('model_name') or parametros.get('model') or (serialized or {}).get('name') or 'llm'
+        self._abrir(run_id, parent_run_id, 'llm', modelo, mensagens=sum(len(lista) for lista in messages))
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        uso = (response.llm_output or {}).get('token_usage') or {}
+        tokens_entrada, tokens_saida = uso.get('prompt_tokens'), uso.get('completion_tokens')
+        if tokens_entrada is None: # Com streaming, o uso vem na mensagem (usage_metadata)
+            for geracoes in response.generations:
+                for geracao in geracoes:
+                    metadados = getattr(getattr(geracao, 'message', None), 'usage_metadata', None)
+                    if metadados:
+                        tokens_entrada, tokens_saida = metadados.get('input_tokens'), metadados.get('output_tokens')
+        self._fechar(run_id, **{chave: valor for chave, valor in (('tokens_entrada', tokens_entrada), ('tokens_saida', tokens_saida)) if valor is not None})
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._fechar(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._abrir(run_id, parent_run_id, 'ferramenta', (serialized or {}).get('name') or 'ferramenta')
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        conteudo = getattr(output, 'content', output)
+        self._fechar(run_id, bytes=len(str(conteudo)))
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._fechar(run_id, error)
+
+
+configurar_logging()
+
+# Um handler para todas as execuções do LangChain no processo (inclusive nas threads do Streamlit:
+# o valor padrão da ContextVar vale em qualquer contexto)
+_callback_processo = contextvars.ContextVar("marina_rastreamento_callback", default=RastreamentoCallback() if RASTREAMENTO else None)
+register_configure_hook(_callback_processo, inheritable=True)
@@ -0,0 +1,57 @@
+# registro_recursos.py
+# Recursos pesados compartilhados por todas as sessões do Streamlit no mesmo processo (cliente
+# do LLM, Chroma, ferramentas, agente, plotly). Cada recurso é construído uma vez, por quem
+# pedir primeiro; as sessões só guardam o que é delas (memória/histórico da conversa).
+
+import threading
+import time
+
+from rastreamento import obter_logger
+
+log = obter_logger("recursos")
+
+
+class RegistroRecursos:
+    """
+    {nome: recurso} do processo, com construção preguiçosa e segura entre threads.
+    Cada nome tem a sua trava: enquanto o Chroma é construído, quem já usa o LLM não espera.
+    Uma construção que falha fica guardada como None (não é repetida a cada sessão).
+    """
+
+    def __init__(self):
+        self._recursos = {}
+        self._travas = {}
+        self._trava = threading.Lock() # Protege só o dicionário de travas
+        self.tempos_ms = {}
+        self.pedidos = 0
+
+    def obter(self, nome: str, construir):
+        self.pedidos += 1 # Só estatística: não precisa ser exato entre threads
+        if nome in self._recursos: # Caminho comum (recurso pronto), sem trava
+            return self._recursos[nome]
+        with self._trava:
+            trava = self._travas.setdefault(nome, threading.Lock())
+        with trava:
+            if nome not in self._recursos: # Outra thread pode ter construído enquanto esperávamos
+                inicio = time.perf_counter()
+                recurso = construir()
+                self.tempos_ms[nome] = (time.perf_counter() - inicio) * 1000
+                self._recursos[nome] = recurso
+                log.debug("Recurso '%s' pronto em %.0f ms (compartilhado pelas sessões).", nome, self.tempos_ms[nome])
+            return self._recursos[nome]
+
+    def descartar(self, nome: str | None = None) -> None:
+        """Esquece um recurso (ou todos): o próximo obter() constrói de novo. Quem já tem a referência continua usando a antiga."""
+        with self._trava:
+            if nome is None:
+                self._recursos.clear(); self.tempos_ms.clear()
+            else:
+                self._recursos.pop(nome, None); self.tempos_ms.pop(nome, None)
+
+    def estatisticas(self) -> dict:
+        return {'recursos': {nome: (type(recurso).__name__ if recurso is not None else None) for nome, recurso in list(self._recursos.items())},
+                'tempos_ms': dict(self.tempos_ms), 'pedidos': self.pedidos}
+
+
+# Registro único do processo (os módulos importados sobrevivem aos reruns do Streamlit)
+registro = RegistroRecursos()
@@ -0,0 +1,225 @@
+# roteador_intencoes.py
+# Atalho determinístico para as perguntas de métrica mais comuns ("vendas naval 2023",
+# "faturamento líquido maio 2024", "BMs pendentes por mes"): extrai métrica, período e regime
+# do texto em português e chama a ferramenta certa direto, sem passar pelo LLM. Qualquer
+# palavra que o roteador não entende (cliente, comparar, deste ano...) baixa a confiança e a
+# pergunta segue para o agente.
+
+import re
+import time
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+
+from consultas_metricas import MESES_PT
+from rastreamento import obter_logger
+
+# --- Constantes ---
+LIMIAR_CONFIANCA = 1.0 # Fração das palavras reconhecidas para responder sem o agente (1.0 = todas)
+MAX_PALAVRAS_PERGUNTA = 15 # Perguntas mais longas vão direto para o agente
+
+# Ferramentas em agente.py: get_metric(metric, year, month, regime, group_by) cobre todas as
+# métricas e períodos; o relatório gerencial tem a sua (sempre YTD, sem parâmetros)
+FERRAMENTA_METRICAS = 'get_metric'
+FERRAMENTA_RELATORIO = 'generate_daily_management_report'
+
+# Palavras (sem acento) -> métrica
+PALAVRAS_METRICA = {
+    **dict.fromkeys(('venda', 'vendas', 'vendido', 'vendidos', 'vendeu', 'vendemos'), 'vendas'),
+    **dict.fromkeys(('faturamento', 'faturamentos', 'faturado', 'faturou', 'faturamos'), 'faturamento'),
+    **dict.fromkeys(('bm', 'bms', 'boletim', 'boletins'), 'bms_pendentes'),
+    **dict.fromkeys(('relatorios',), 'relatorios_pendentes'),
+    **dict.fromkeys(('gerencial', 'consolidado'), 'relatorio_gerencial'),
+}
+PALAVRAS_LIQUIDO = {'liquido', 'liquida'}
+PALAVRAS_BRUTO = {'bruto', 'bruta'}
+PALAVRAS_PENDENTE = {'pendente', 'pendentes', 'pendencia', 'pendencias', 'aberto', 'abertos', 'medicao', 'medicoes'}
+PALAVRAS_POR_MES = {'mensal', 'mensais', 'mensalmente'}
+PALAVRAS_REGIME = {'naval': 'Naval', 'navais': 'Naval', 'offshore': 'Offshore'}
+# Palavras neutras: não mudam a consulta. 'ano' e 'mes' só contam quando há ano/mês na pergunta.
+PALAVRAS_NEUTRAS = {
+    'qual', 'quais', 'quanto', 'quantos', 'quanta', 'quantas', 'o', 'a', 'os', 'as', 'de', 'do', 'da', 'dos', 'das',
+    'em', 'no', 'na', 'nos', 'nas', 'e', 'foi', 'foram', 'sao', 'valor', 'valores', 'numero', 'quantidade', 'me', 'mostre',
+    'mostrar', 'mostra', 'informe', 'diga', 'ver', 'veja', 'liste', 'listar', 'lista', 'traga', 'saber', 'quero', 'gostaria',
+    'preciso', 'por', 'favor', 'regime', 'para', 'pra', 'total', 'totais', 'geral', 'tabela', 'resumo', 'relatorio', 'itens',
+    'marina', 'ola', 'oi', 'dia', 'diario', 'ytd', 'cada',
+}
+# Relatório gerencial: 'relatorio do dia' / 'relatorio diario' também valem (sem 'gerencial')
+PADRAO_RELATORIO_DIA = re.compile(r'\brelatorio (do )?(dia|diario)\b')
+PADRAO_POR_MES = re.compile(r'\b(por|cada) mes(es)?\b|\bmes a mes\b')
+PADRAO_MES_ANO = re.compile(r'\b(\d{1,2})\s*/\s*((?:19|20)\d{2})\b') # 05/2024
+PADRAO_ANO = re.compile(r'\b((?:19|20)\d{2})\b')
+MESES_SEM_ACENTO = {unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode(): numero for nome, numero in MESES_PT.items()}
+
+log = obter_logger("roteador")
+
+
+def normalizar_texto(texto: str) -> str:
+    """'Faturamento Líquido, Maio/2024?' -> 'faturamento liquido maio/2024' (sem acento, minúsculas, sem pontuação)."""
+    texto = unicodedata.normalize('NFKD', texto.lower()).encode('ascii', 'ignore').decode()
+    texto = re.sub(r"[^a-z0-9/ ]+", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def extrair_filtros(texto: str) -> dict:
+    """
+    Filtros de um texto já normalizado: {'regimes', 'anos', 'meses', 'por_mes'} (conjuntos,
+    exceto por_mes) e 'palavras', as palavras do texto que viraram filtro.
+    """
+    palavras = texto.replace('/', ' ').split()
+    anos, meses, usadas = set(PADRAO_ANO.findall(texto)), set(), set()
+    for mes_txt, _ in PADRAO_MES_ANO.findall(texto):
+        if 1 <= int(mes_txt) <= 12:
+            meses.add(int(mes_txt)); usadas.add(mes_txt)
+    for palavra in palavras:
+        if palavra in MESES_SEM_ACENTO:
+            meses.add(MESES_SEM_ACENTO[palavra]); usadas.add(palavra)
+    regimes = {PALAVRAS_REGIME[p] for p in palavras if p in PALAVRAS_REGIME}
+    usadas.update(anos); usadas.update(p for p in palavras if p in PALAVRAS_REGIME)
+    por_mes = bool(PADRAO_POR_MES.search(texto)) or any(p in PALAVRAS_POR_MES for p in palavras)
+    return {'regimes': regimes, 'anos': anos, 'meses': meses, 'por_mes': por_mes, 'palavras': usadas}
+
+
+@dataclass
+class Rota:
+    ferramenta: str | None # None = repassar ao agente
+    argumentos: dict = field(default_factory=dict)
+    confianca: float = 0.0
+    motivo: str = '' # Por que não roteou (vazio quando roteou)
+
+
+def interpretar(pergunta: str) -> Rota:
+    """Extrai (métrica, período, regime, ano, mês) e escolhe a ferramenta. Não executa nada."""
+    texto = normalizar_texto(pergunta or '')
+    palavras = texto.replace('/', ' ').split()
+    if not palavras:
+        return Rota(None, motivo='vazia')
+    if len(palavras) > MAX_PALAVRAS_PERGUNTA:
+        return Rota(None, motivo='longa')
+    reconhecidas = set()
+
+    filtros = extrair_filtros(texto)
+    anos, meses, por_mes, regimes = filtros['anos'], filtros['meses'], filtros['por_mes'], filtros['regimes']
+    reconhecidas.update(filtros['palavras'])
+    if anos: reconhecidas.add('ano')
+    if meses or por_mes: reconhecidas.update(('mes', 'meses', 'a'))
+    reconhecidas.update(p for p in palavras if p in PALAVRAS_POR_MES)
+
+    metricas = {PALAVRAS_METRICA[p] for p in palavras if p in PALAVRAS_METRICA}
+    reconhecidas.update(p for p in palavras if p in PALAVRAS_METRICA)
+    if PADRAO_RELATORIO_DIA.search(texto):
+        metricas.add('relatorio_gerencial')
+    if 'relatorio' in palavras and 'relatorio_gerencial' not in metricas:
+        if any(p in PALAVRAS_PENDENTE for p in palavras):
+            metricas.add('relatorios_pendentes')
+        else:
+            return Rota(None, motivo='ambigua') # 'relatorio' sozinho: pendentes ou gerencial?
+    if 'relatorio_gerencial' in metricas:
+        metricas.discard('relatorios_pendentes') # 'relatorios gerenciais'
+    if 'faturamento' in metricas:
+        liquido, bruto = any(p in PALAVRAS_LIQUIDO for p in palavras), any(p in PALAVRAS_BRUTO for p in palavras)
+        if liquido and bruto:
+            return Rota(None, motivo='multiplas_metricas')
+        metricas.discard('faturamento')
+        metricas.add('faturamento_liquido' if liquido else 'faturamento_bruto') # 'faturamento' sozinho = bruto (como no relatório)
+        reconhecidas.update(p for p in palavras if p in PALAVRAS_LIQUIDO | PALAVRAS_BRUTO)
+    reconhecidas.update(p for p in palavras if p in PALAVRAS_PENDENTE)
+
+    reconhecidas.update(p for p in palavras if p in PALAVRAS_NEUTRAS)
+
+    confianca = sum(1 for p in palavras if p in reconhecidas) / len(palavras)
+    if len(metricas) != 1:
+        return Rota(None, confianca=confianca, motivo='sem_metrica' if not metricas else 'multiplas_metricas')
+    if len(regimes) > 1 or len(anos) > 1 or len(meses) > 1:
+        return Rota(None, confianca=confianca, motivo='multiplos_filtros')
+    metrica = metricas.pop()
+    if por_mes:
+        periodo = 'por_mes' if not (anos or meses) else None # As tabelas mensais não filtram por ano
+    elif meses:
+        periodo = 'mes' if anos else None # Mês sem ano: o agente pergunta qual ano
+    else:
+        periodo = 'ano' if anos else 'total'
+    if metrica == 'relatorio_gerencial' and (regimes or periodo != 'total'):
+        periodo = None # O relatório é sempre YTD, sem regime
+    if periodo is None:
+        return Rota(None, confianca=confianca, motivo='periodo_sem_ferramenta')
+    ferramenta = FERRAMENTA_RELATORIO if metrica == 'relatorio_gerencial' else FERRAMENTA_METRICAS
+    if confianca < LIMIAR_CONFIANCA:
+        return Rota(None, confianca=confianca, motivo='palavras_desconhecidas')
+
+    if ferramenta == FERRAMENTA_RELATORIO:
+        return Rota(ferramenta, {}, confianca)
+    argumentos = {'metric': metrica}
+    if regimes:
+        argumentos['regime'] = regimes.pop()
+    if periodo in ('ano', 'mes'):
+        argumentos['year'] = int(anos.pop())
+    if periodo == 'mes':
+        argumentos['month'] = str(meses.pop())
+    if periodo == 'por_mes':
+        argumentos['group_by'] = 'mes'
+    return Rota(ferramenta, argumentos, confianca)
+
+
+class RoteadorIntencoes:
+    """
+    Responde pelas ferramentas (dict nome -> tool do LangChain) quando interpretar() tem
+    confiança; senão devolve None e o chamador segue para o agente. Guarda a taxa de acerto.
+    """
+
+    def __init__(self, ferramentas: dict):
+        self.ferramentas = ferramentas
+        self._trava = threading.Lock()
+        self.perguntas = self.roteadas = 0
+        self.segundos_roteadas = 0.0
+        self.por_ferramenta, self.motivos_repasse = {}, {}
+
+    def responder(self, pergunta: str) -> str | None:
+        inicio = time.perf_counter()
+        rota = interpretar(pergunta)
+        resposta = None
+        if rota.ferramenta in self.ferramentas:
+            try:
+                resposta = self.ferramentas[rota.ferramenta].invoke(rota.argumentos)
+            except Exception as e_ferramenta:
+                log.warning("%s falhou (%s); repassando ao agente.", rota.ferramenta, e_ferramenta)
+                rota.motivo = 'erro_ferramenta'
+        elif rota.ferramenta:
+            rota.motivo = 'ferramenta_indisponivel'
+        decorrido = time.perf_counter() - inicio
+        with self._trava:
+            self.perguntas += 1
+            if resposta is not None:
+                self.roteadas += 1; self.segundos_roteadas += decorrido
+                self.por_ferramenta[rota.ferramenta] = self.por_ferramenta.get(rota.ferramenta, 0) + 1
+            else:
+                self.motivos_repasse[rota.motivo] = self.motivos_repasse.get(rota.motivo, 0) + 1
+        if resposta is not None:
+            log.debug("'%s' -> %s(%s) em %.1f ms (taxa de roteamento %.0f%%)", pergunta, rota.ferramenta, rota.argumentos,
+                      decorrido * 1000, self.taxa_roteamento() * 100)
+        else:
+            log.debug("'%s' repassada ao agente (%s, confiança %.2f)", pergunta, rota.motivo, rota.confianca)
+        return resposta
+
+    def taxa_roteamento(self) -> float:
+        return self.roteadas / self.perguntas if self.perguntas else 0.0
+
+    def estatisticas(self) -> dict:
+        with self._trava:
+            return {'perguntas': self.perguntas, 'roteadas': self.roteadas, 'repassadas': self.perguntas - self.roteadas,
+                    'taxa_roteamento': self.taxa_roteamento(),
+                    'ms_medio_roteadas': (self.segundos_roteadas / self.roteadas * 1000) if self.roteadas else 0.0,
+                    'por_ferramenta': dict(self.por_ferramenta), 'motivos_repasse': dict(self.motivos_repasse)}
+
+
+# Roteador único do processo (o Streamlit reexecuta o script a cada interação; as estatísticas ficam)
+_roteador = None
+_trava_roteador = threading.Lock()
+
+
+def obter_roteador(ferramentas: list) -> RoteadorIntencoes:
+    global _roteador
+    with _trava_roteador:
+        if _roteador is None:
+            _roteador = RoteadorIntencoes({f.name: f for f in ferramentas})
+        return _roteador
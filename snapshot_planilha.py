@@ -0,0 +1,146 @@
+# snapshot_planilha.py
+# Cache colunar (Arrow IPC) da aba 'Base' já normalizada, para não reprocessar o .xlsx
+# quando a planilha não mudou. O arquivo é lido com memory map, lote a lote.
+
+import os
+import json
+import hashlib
+
+from esquema_dados import tipo_coluna
+
+# pyarrow é opcional: sem ele o organizador sempre lê o Excel
+try:
+    import pyarrow as pa
+except ImportError:
+    print("--- AVISO: Biblioteca 'pyarrow' não encontrada. Snapshot da planilha desabilitado. Instale com 'pip install pyarrow' ---")
+    pa = None
+
+# --- Constantes ---
+DIRETORIO_SNAPSHOTS = "./cache_planilha"
+ARQUIVO_META_SNAPSHOT = os.path.join(DIRETORIO_SNAPSHOTS, "snapshot_base.json")
+# Aumente quando mudar a normalização em esquema_dados.py (invalida snapshots antigos)
+VERSAO_SNAPSHOT = 1
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+TIPOS_ARROW = {'TEXT': 'string', 'REAL': 'float64', 'INTEGER': 'int64'}
+
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-256 do conteúdo do arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _ler_meta() -> dict | None:
+    try:
+        with open(ARQUIVO_META_SNAPSHOT, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _gravar_meta(meta: dict) -> None:
+    temporario = ARQUIVO_META_SNAPSHOT + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(temporario, ARQUIVO_META_SNAPSHOT)
+
+
+def procurar_snapshot(caminho_excel: str) -> str | None:
+    """
+    Retorna o caminho do snapshot válido para a planilha, ou None se for preciso ler o Excel.
+    Mesmo mtime e tamanho: usa direto, sem calcular hash. mtime diferente: calcula o hash
+    e só descarta o snapshot se o conteúdo realmente mudou.
+    """
+    if pa is None:
+        return None
+    meta = _ler_meta()
+    if not meta or meta.get('versao') != VERSAO_SNAPSHOT or meta.get('arquivo') != os.path.abspath(caminho_excel):
+        return None
+    caminho_snapshot = os.path.join(DIRETORIO_SNAPSHOTS, meta['snapshot'])
+    if not os.path.exists(caminho_snapshot):
+        return None
+    info = os.stat(caminho_excel)
+    if meta.get('mtime_ns') == info.st_mtime_ns and meta.get('tamanho') == info.st_size:
+        return caminho_snapshot
+    if hash_arquivo(caminho_excel) != meta.get('hash'):
+        return None
+    # Conteúdo igual (ex: arquivo copiado/tocado): atualiza o mtime para a próxima vez
+    meta.update({'mtime_ns': info.st_mtime_ns, 'tamanho': info.st_size})
+    _gravar_meta(meta)
+    return caminho_snapshot
+
+
+def iterar_snapshot_em_lotes(caminho_snapshot: str, linhas_por_lote: int):
+    """
+    Mesmo contrato de organizador_dados.iterar_planilha_em_lotes: primeiro entrega a lista
+    de colunas, depois DataFrames de até linhas_por_lote linhas (já normalizados).
+    """
+    print(f"Lendo snapshot colunar (memory map): {caminho_snapshot}...")
+    with pa.memory_map(caminho_snapshot, 'r') as origem:
+        tabela = pa.ipc.open_file(origem).read_all()
+        yield tabela.column_names
+        for inicio in range(0, tabela.num_rows, linhas_por_lote):
+            # integer_object_nulls: inteiros com NULL continuam int/None (não viram float)
+            yield tabela.slice(inicio, linhas_por_lote).to_pandas(integer_object_nulls=True)
+
+
+class GravadorSnapshot:
+    """Grava os lotes normalizados num arquivo Arrow IPC e só publica o snapshot em concluir()."""
+
+    def __init__(self, caminho_excel: str, colunas: list[str]):
+        self.caminho_excel = caminho_excel
+        self.ativo = pa is not None
+        self.escritor = None
+        if not self.ativo:
+            return
+        os.makedirs(DIRETORIO_SNAPSHOTS, exist_ok=True)
+        info = os.stat(caminho_excel) # Antes de ler: se mudar durante a leitura, o mtime não vai bater
+        self.meta = {'versao': VERSAO_SNAPSHOT, 'arquivo': os.path.abspath(caminho_excel),
+                     'mtime_ns': info.st_mtime_ns, 'tamanho': info.st_size, 'hash': hash_arquivo(caminho_excel)}
+        self.nome_snapshot = f"base_{self.meta['hash'][:16]}.arrow"
+        self.caminho_temporario = os.path.join(DIRETORIO_SNAPSHOTS, self.nome_snapshot + ".tmp")
+        self.esquema = pa.schema([(c, TIPOS_ARROW[tipo_coluna(c)]) for c in colunas])
+
+    def escrever(self, df) -> None:
+        if not self.ativo:
+            return
+        try:
+            lote = pa.RecordBatch.from_pandas(df, schema=self.esquema, preserve_index=False)
+            if self.escritor is None:
+                self.escritor = pa.ipc.new_file(self.caminho_temporario, self.esquema)
+            self.escritor.write_batch(lote)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e_arrow:
+            # Ex: texto que sobrou numa coluna REAL. A carga segue, só sem snapshot.
+            print(f"Aviso: Snapshot da planilha desabilitado nesta execução: {e_arrow}")
+            self.descartar()
+
+    def concluir(self) -> None:
+        if not self.ativo or self.escritor is None:
+            return
+        self.escritor.close(); self.escritor = None
+        os.replace(self.caminho_temporario, os.path.join(DIRETORIO_SNAPSHOTS, self.nome_snapshot))
+        self.meta['snapshot'] = self.nome_snapshot
+        _gravar_meta(self.meta)
+        # Mantém só o snapshot atual
+        for nome in os.listdir(DIRETORIO_SNAPSHOTS):
+            if nome.endswith('.arrow') and nome != self.nome_snapshot:
+                try: os.remove(os.path.join(DIRETORIO_SNAPSHOTS, nome))
+                except OSError: pass
+        self.ativo = False
+        print(f"Snapshot colunar da planilha salvo em '{DIRETORIO_SNAPSHOTS}'.")
+
+    def descartar(self) -> None:
+        """Abandona o snapshot em andamento (erro ou leitura interrompida)."""
+        if not self.ativo:
+            return
+        if self.escritor is not None:
+            try: self.escritor.close()
+            except Exception: pass
+            self.escritor = None
+        try: os.remove(self.caminho_temporario)
+        except OSError: pass
+        self.ativo = False
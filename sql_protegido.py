@@ -0,0 +1,236 @@
+# sql_protegido.py
+# Execução protegida do SQL livre escrito pelo LLM (sql_database_query_tool): só leitura
+# (authorizer), custo estimado pelo EXPLAIN QUERY PLAN antes de rodar, tempo máximo via
+# progress handler do SQLite e limite de linhas/bytes no resultado. Opcionalmente roda num
+# processo separado com limite de memória, para uma consulta ruim não derrubar o app.
+
+import os
+import time
+import sqlite3
+import threading
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotadoFuturo
+from concurrent.futures.process import BrokenProcessPool
+
+from conexao_sqlite import conexao_leitura, versao_banco
+from rastreamento import obter_logger
+
+# resource só existe em Unix: sem ele o processo isolado roda sem limite de memória
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# --- Constantes ---
+TEMPO_MAXIMO_CONSULTA_S = 5.0 # Tempo de parede máximo de uma consulta (progress handler)
+INSTRUCOES_POR_VERIFICACAO = 10000 # Instruções da VM do SQLite entre duas checagens do relógio
+MAX_CUSTO_ESTIMADO = 10_000_000 # Linhas visitadas estimadas pelo plano (ex: produto cartesiano da tabela principal ~42M)
+FATOR_BUSCA_INDICE = 10 # Linhas estimadas por SEARCH (acesso por índice) dentro de um laço
+MAX_LINHAS_RESULTADO = 200
+MAX_BYTES_RESULTADO = 16 * 1024 # Tamanho aproximado (texto) do resultado que vai para o prompt
+MAX_CARACTERES_VALOR = 300 # Textos longos são cortados (mesmo limite do SQLDatabase do LangChain)
+LINHAS_POR_FETCH = 100
+PROCESSO_ISOLADO = os.getenv("SQL_PROCESSO_ISOLADO", "0") == "1" # SQL_PROCESSO_ISOLADO=1 liga o processo separado
+LIMITE_MEMORIA_PROCESSO_BYTES = 1024 * 1024 * 1024 # RLIMIT_AS do processo isolado
+MARGEM_TEMPO_PROCESSO_S = 10.0 # Além do TEMPO_MAXIMO_CONSULTA_S (inicialização do processo)
+
+# Ações que uma consulta de leitura precisa; qualquer outra (PRAGMA, ATTACH, escrita...) é negada
+ACOES_PERMITIDAS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+log = obter_logger("sql_protegido")
+
+
+class ConsultaRecusada(Exception):
+    """Consulta não executada (não é leitura, custo alto demais ou tempo esgotado). A mensagem vai para o LLM."""
+
+
+@dataclass
+class ResultadoConsulta:
+    colunas: list[str]
+    linhas: list[tuple] = field(default_factory=list)
+    truncado: str | None = None # Limite que cortou o resultado (ex: '200 linhas'), None se veio tudo
+    custo_estimado: int = 0
+    segundos: float = 0.0
+
+    def como_texto(self) -> str:
+        """Formato entregue ao LLM: colunas + lista de tuplas (como o QuerySQLDataBaseTool) + aviso de corte."""
+        if not self.linhas:
+            return f"Nenhuma linha retornada. Colunas: {', '.join(self.colunas)}"
+        texto = f"Colunas: {', '.join(self.colunas)}\n{self.linhas}"
+        if self.truncado:
+            texto += (f"\n(Resultado truncado em {len(self.linhas)} linhas por limite de {self.truncado}. "
+                      f"Use filtros, agregações (SUM/COUNT/GROUP BY) ou LIMIT para reduzir o resultado.)")
+        return texto
+
+
+# Linhas por tabela, para o custo do plano (recontadas quando o banco muda)
+_linhas_por_tabela = {'versao': None, 'linhas': {}}
+
+
+def _contar_tabelas(conn: sqlite3.Connection) -> dict[str, int]:
+    versao = versao_banco()
+    if _linhas_por_tabela['versao'] != versao:
+        tabelas = [t[0] for t in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        _linhas_por_tabela['linhas'] = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tabelas}
+        _linhas_por_tabela['versao'] = versao
+    return _linhas_por_tabela['linhas']
+
+
+def custo_estimado(plano: list[tuple], linhas_por_tabela: dict[str, int]) -> int:
+    """
+    Linhas visitadas estimadas a partir do EXPLAIN QUERY PLAN (id, pai, _, detalhe).
+    Em cada nível, os SCAN/SEARCH irmãos são laços aninhados (multiplicam); subconsultas,
+    CTEs e partes de UNION somam; subconsulta CORRELATED roda uma vez por linha do laço de fora.
+    SCAN de um alias/subconsulta (nome que não é tabela) conta como a maior tabela do banco.
+    """
+    filhos = {}
+    for id_no, pai, _, detalhe in plano:
+        filhos.setdefault(pai, []).append((id_no, detalhe))
+    maior_tabela = max(linhas_por_tabela.values(), default=1)
+
+    def custo_no(pai: int) -> int:
+        lacos, soma = 1, 0
+        for id_no, detalhe in filhos.get(pai, []):
+            if detalhe.startswith('SCAN CONSTANT ROW'):
+                continue
+            if detalhe.startswith('SCAN '):
+                nome = detalhe.split()[1]
+                lacos *= max(1, linhas_por_tabela.get(nome, maior_tabela))
+            elif detalhe.startswith('SEARCH '):
+                lacos *= FATOR_BUSCA_INDICE
+            elif detalhe.startswith('CORRELATED'):
+                soma += custo_no(id_no) * lacos # Aproximação: laços listados antes da subconsulta
+            else:
+                soma += custo_no(id_no) # MATERIALIZE, CO-ROUTINE, SCALAR SUBQUERY, partes de UNION...
+        return soma + (lacos if lacos > 1 else 0)
+
+    return custo_no(0)
+
+
+def _autorizar(acao, *_):
+    return sqlite3.SQLITE_OK if acao in ACOES_PERMITIDAS else sqlite3.SQLITE_DENY
+
+
+def _tamanho_linha(linha: tuple) -> int:
+    return sum(len(str(valor)) for valor in linha) + 2 * len(linha)
+
+
+def _cortar_valores(linha: tuple) -> tuple:
+    return tuple(v[:MAX_CARACTERES_VALOR] + '...' if isinstance(v, str) and len(v) > MAX_CARACTERES_VALOR else v for v in linha)
+
+
+def consultar(query: str, tempo_maximo_s: float = TEMPO_MAXIMO_CONSULTA_S, max_linhas: int = MAX_LINHAS_RESULTADO,
+              max_bytes: int = MAX_BYTES_RESULTADO, max_custo: int = MAX_CUSTO_ESTIMADO) -> ResultadoConsulta:
+    """Executa a consulta com todas as proteções (neste processo). Levanta ConsultaRecusada ou sqlite3.Error."""
+    query = query.strip().rstrip(';').strip()
+    if not query:
+        raise ConsultaRecusada("Consulta vazia.")
+    inicio = time.perf_counter()
+    limite = time.monotonic() + tempo_maximo_s
+    with conexao_leitura() as conn:
+        conn.set_authorizer(_autorizar) # Vale para os statements preparados daqui em diante (o SQLite expira os antigos)
+        conn.set_progress_handler(lambda: time.monotonic() > limite, INSTRUCOES_POR_VERIFICACAO)
+        try:
+            try:
+                plano = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+            except sqlite3.DatabaseError as e_plano:
+                if 'not authorized' in str(e_plano):
+                    raise ConsultaRecusada("Apenas consultas SELECT de leitura são permitidas.") from e_plano
+                raise
+            custo = custo_estimado(plano, _contar_tabelas(conn))
+            if custo > max_custo:
+                raise ConsultaRecusada(f"Consulta recusada: custo estimado de ~{custo:,} linhas visitadas (limite {max_custo:,}). "
+                                       f"Provável produto cartesiano ou subconsulta correlacionada sem índice; adicione condições de junção/filtros.")
+            cursor = conn.execute(query)
+            resultado = ResultadoConsulta(colunas=[d[0] for d in cursor.description or ()], custo_estimado=custo)
+            total_bytes = 0
+            while resultado.truncado is None:
+                lote = cursor.fetchmany(LINHAS_POR_FETCH)
+                if not lote:
+                    break
+                for linha in lote:
+                    linha = _cortar_valores(linha)
+                    total_bytes += _tamanho_linha(linha)
+                    if len(resultado.linhas) >= max_linhas:
+                        resultado.truncado = f"{max_linhas} linhas"; break
+                    if total_bytes > max_bytes:
+                        resultado.truncado = f"{max_bytes} bytes"; break
+                    resultado.linhas.append(linha)
+            cursor.close() # Não lê o resto: o resultado cortado não passa pela memória
+        except sqlite3.OperationalError as e_sql:
+            if 'interrupted' in str(e_sql):
+                raise ConsultaRecusada(f"Consulta interrompida: passou de {tempo_maximo_s:.0f}s. Simplifique a consulta ou adicione filtros.") from e_sql
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.set_authorizer(None)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+# --- Processo isolado (opcional) ---
+_executor_isolado = None
+_trava_executor = threading.Lock()
+
+
+def _limitar_memoria(limite_bytes: int) -> None:
+    """Inicializador do processo isolado: RLIMIT_AS (estouro vira MemoryError lá dentro, não no app)."""
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (limite_bytes, limite_bytes))
+
+
+def _obter_executor() -> ProcessPoolExecutor:
+    global _executor_isolado
+    with _trava_executor:
+        if _executor_isolado is None:
+            if resource is None:
+                log.warning("Módulo 'resource' indisponível nesta plataforma. Processo de SQL isolado roda sem limite de memória.")
+            # spawn: processo novo e limpo (fork de um processo com threads do Streamlit não é seguro)
+            _executor_isolado = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_limitar_memoria, initargs=(LIMITE_MEMORIA_PROCESSO_BYTES,))
+        return _executor_isolado
+
+
+def _descartar_executor() -> None:
+    """Mata o processo isolado (travado ou quebrado); o próximo pedido cria outro."""
+    global _executor_isolado
+    with _trava_executor:
+        executor, _executor_isolado = _executor_isolado, None
+    if executor is not None:
+        for processo in list(getattr(executor, '_processes', {}).values()): # API interna: shutdown() não mata tarefa em andamento
+            processo.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def consultar_isolado(query: str, tempo_maximo_s: float = TEMPO_MAXIMO_CONSULTA_S, **limites) -> ResultadoConsulta:
+    """consultar() num processo separado com RLIMIT_AS; o pai também aplica um tempo máximo."""
+    futuro = _obter_executor().submit(consultar, query, tempo_maximo_s, **limites)
+    try:
+        return futuro.result(timeout=tempo_maximo_s + MARGEM_TEMPO_PROCESSO_S)
+    except TempoEsgotadoFuturo:
+        _descartar_executor()
+        raise ConsultaRecusada(f"Consulta interrompida: passou de {tempo_maximo_s:.0f}s.")
+    except BrokenProcessPool:
+        _descartar_executor()
+        raise ConsultaRecusada("Consulta abortada: o processo de consulta terminou de forma inesperada (provável excesso de memória).")
+    except MemoryError:
+        raise ConsultaRecusada(f"Consulta abortada: passou do limite de memória de {LIMITE_MEMORIA_PROCESSO_BYTES // (1024 * 1024)} MB.")
+
+
+def executar_sql_protegido(query: str, isolado: bool = PROCESSO_ISOLADO) -> str:
+    """Entrada da ferramenta do agente: texto do resultado ou mensagem de erro/recusa (nunca levanta exceção)."""
+    try:
+        resultado = consultar_isolado(query) if isolado else consultar(query)
+        log.debug("%s linhas, custo ~%s, %.1f ms%s", len(resultado.linhas), resultado.custo_estimado, resultado.segundos * 1000,
+                  f", truncado ({resultado.truncado})" if resultado.truncado else "")
+        return resultado.como_texto()
+    except ConsultaRecusada as e_recusa:
+        log.warning("%s\nQuery: %s", e_recusa, query)
+        return f"Erro: {e_recusa}"
+    except sqlite3.Error as e_sql:
+        log.warning("Erro SQL: %s\nQuery: %s", e_sql, query)
+        return f"Erro: {e_sql}"
+    except MemoryError:
+        log.warning("Falta de memória.\nQuery: %s", query)
+        return "Erro: A consulta usou memória demais. Reduza o resultado com filtros, agregações ou LIMIT."
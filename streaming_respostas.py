@@ -0,0 +1,109 @@
+# streaming_respostas.py
+# Mostra a resposta do agente enquanto ela é gerada: cada chamada de ferramenta vira uma linha
+# de progresso ("Consultando faturamento bruto Naval 2024…") num st.status e os tokens do
+# modelo aparecem no st.chat_message à medida que chegam. O texto final NÃO é gravado aqui:
+# a memória do AgentExecutor já grava a resposta uma vez no StreamlitChatMessageHistory.
+
+import os
+import time
+
+import streamlit as st
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agente import METRIC_TEXTS
+from rastreamento import obter_logger
+
+log = obter_logger("app")
+
+# --- Constantes ---
+STREAMING_RESPOSTAS = os.getenv("STREAMING_RESPOSTAS", "1") != "0" # 0 = volta ao spinner até o fim da execução
+INTERVALO_ATUALIZACAO_S = 0.05 # Redesenha o texto no máximo a cada 50 ms (cada st.markdown vai pelo websocket)
+CURSOR = "▌"
+CONTEUDO_NAO_LEGIVEL = ("<", "[artefato:") # HTML do relatório ou referência ao armazém: o app mostra depois do rerun
+
+DESCRICOES_FERRAMENTAS = {
+    'generate_daily_management_report': "Gerando o relatório gerencial",
+    'sql_database_query_tool': "Consultando o banco de dados (SQL)",
+    'busca_documentos_supply_marine': "Buscando nos documentos",
+    'get_agent_capabilities': "Listando as funções da Marina",
+}
+
+
+def descrever_chamada(ferramenta: str, argumentos: dict | None) -> str:
+    """'get_metric', {'metric': 'faturamento_bruto', 'year': 2024, 'regime': 'Naval'} -> 'Consultando faturamento bruto Naval 2024…'"""
+    argumentos = argumentos if isinstance(argumentos, dict) else {}
+    if ferramenta == 'get_metric' and argumentos.get('metric') in METRIC_TEXTS:
+        partes = [f"Consultando {METRIC_TEXTS[argumentos['metric']]['nome']}"]
+        if argumentos.get('regime'):
+            partes.append(str(argumentos['regime']).capitalize())
+        if argumentos.get('group_by'):
+            partes.append("por mês")
+        elif argumentos.get('month') and argumentos.get('year'):
+            partes.append(f"{argumentos['month']}/{argumentos['year']}")
+        elif argumentos.get('year'):
+            partes.append(str(argumentos['year']))
+        return " ".join(partes) + "…"
+    return DESCRICOES_FERRAMENTAS.get(ferramenta, f"Executando {ferramenta}") + "…"
+
+
+class StreamlitRespostaHandler(BaseCallbackHandler):
+    """
+    Callback do LangChain que desenha o progresso dentro do container atual (st.chat_message).
+    Passe em agent_executor.invoke(..., config={"callbacks": [handler]}); o LLM precisa ter streaming=True.
+    """
+
+    def __init__(self, container=None):
+        container = container or st.container()
+        self.status = container.status("Marina está pensando…", expanded=False)
+        self.area_texto = container.empty()
+        self.texto = ""
+        self.etapas = 0
+        self.inicio = time.perf_counter()
+        self.primeira_saida_s = None # Tempo até o primeiro token/etapa visível
+        self._ultimo_desenho = 0.0
+
+    def _marcar_saida(self) -> None:
+        if self.primeira_saida_s is None:
+            self.primeira_saida_s = time.perf_counter() - self.inicio
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        # Cada passo do agente é uma nova chamada ao modelo: o texto de um passo anterior
+        # (ex: "Vou consultar...") é substituído pelo do passo atual
+        self.texto = ""
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if not token:
+            return # Chunks de tool call chegam sem conteúdo
+        self._marcar_saida()
+        self.texto += token
+        agora = time.perf_counter()
+        if agora - self._ultimo_desenho < INTERVALO_ATUALIZACAO_S:
+            return
+        self._ultimo_desenho = agora
+        if self.texto.lstrip().startswith(CONTEUDO_NAO_LEGIVEL):
+            # Relatório HTML (ou a referência ao artefato): o texto parcial não é legível, só o aviso de progresso
+            self.status.update(label="Montando o relatório…")
+        else:
+            self.area_texto.markdown(self.texto + CURSOR)
+
+    def on_tool_start(self, serialized, input_str: str, *, inputs: dict | None = None, **kwargs) -> None:
+        self._marcar_saida()
+        self.etapas += 1
+        descricao = descrever_chamada((serialized or {}).get('name', ''), inputs)
+        self.status.update(label=descricao)
+        self.status.write(descricao)
+
+    def on_tool_error(self, error: BaseException, **kwargs) -> None:
+        self.status.write(f"Falha na ferramenta: {type(error).__name__}")
+
+    def finalizar(self, erro: bool = False) -> None:
+        """Fecha o st.status e tira o cursor. O texto definitivo vem do histórico no próximo rerun."""
+        if erro:
+            self.status.update(label="Não foi possível concluir a resposta", state="error")
+        else:
+            total_s = time.perf_counter() - self.inicio
+            etapas = f"{self.etapas} consulta(s), " if self.etapas else ""
+            self.status.update(label=f"Concluído ({etapas}{total_s:.1f} s)", state="complete")
+        if self.texto and not self.texto.lstrip().startswith(CONTEUDO_NAO_LEGIVEL):
+            self.area_texto.markdown(self.texto)
+        log.debug("Primeira saída visível em %.2f s; %s ferramenta(s)", self.primeira_saida_s if self.primeira_saida_s is not None else -1, self.etapas)
@@ -0,0 +1,84 @@
+# test_artefatos.py
+# Armazém de artefatos da sessão: o que sai da conversa, o que fica, e como o app volta ao conteúdo.
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+
+from artefatos import (
+    MIN_CARACTERES_TABELA, ArmazemArtefatos, HistoricoComArtefatos, definir_armazem, guardar_artefato, resumir_tabela,
+)
+
+RELATORIO = "<!DOCTYPE html><html><head><title>Relatório Gerencial Diário</title></head><body>" + "x" * 5000 + "</body></html>"
+
+
+def _tabela(linhas: int) -> str:
+    return "| Mes | Total |\n|---|---|\n" + "".join(f"| 2023-{(i % 12) + 1:02d} | R$ {i:,.2f} |\n" for i in range(linhas))
+
+
+def test_relatorio_html_vira_referencia():
+    armazem = ArmazemArtefatos()
+    texto = armazem.externalizar(RELATORIO)
+    assert texto.startswith("[artefato:") and "Relatório Gerencial Diário (HTML, 4 KB)" in texto
+    (tipo, artefato), = armazem.partes(texto)
+    assert tipo == 'artefato' and artefato.tipo == 'html' and artefato.conteudo == RELATORIO
+    assert armazem.expandir(texto) == RELATORIO
+
+
+def test_tabela_longa_sai_e_texto_em_volta_fica():
+    armazem = ArmazemArtefatos()
+    tabela = _tabela(100)
+    assert len(tabela) >= MIN_CARACTERES_TABELA
+    original = "Vendas por mês:\n" + tabela + "Total no período acima."
+    texto = armazem.externalizar(original)
+    assert "2023-05" not in texto and "tabela com 100 linhas (Mes, Total)" in texto
+    assert [tipo for tipo, _ in armazem.partes(texto)] == ['texto', 'artefato', 'texto']
+    assert armazem.expandir(texto) == original
+
+
+def test_texto_pequeno_volta_o_mesmo_objeto():
+    armazem = ArmazemArtefatos()
+    texto = "Vendas Naval 2023:\n" + _tabela(3)
+    assert armazem.externalizar(texto) is texto
+    assert armazem.partes(texto) == [('texto', texto)]
+    assert not armazem.itens
+
+
+def test_limite_de_itens_descarta_os_mais_antigos():
+    armazem = ArmazemArtefatos(max_itens=2)
+    ids = [armazem.guardar('tabela', f"conteudo {i}", f"resumo {i}") for i in range(3)]
+    assert list(armazem.itens) == ids[1:]
+    assert armazem.partes(f"[artefato:{ids[0]}] resumo 0") == [('ausente', ids[0])]
+
+
+def test_limite_de_bytes():
+    armazem = ArmazemArtefatos(max_bytes=100)
+    armazem.guardar('tabela', "a" * 60, "a")
+    ultimo = armazem.guardar('tabela', "b" * 60, "b")
+    assert list(armazem.itens) == [ultimo] and armazem.bytes == 60
+
+
+def test_resumir_tabela():
+    assert resumir_tabela(_tabela(3)) == "tabela com 3 linhas (Mes, Total); de 2023-01 (R$ 0.00) a 2023-03 (R$ 2.00)"
+
+
+def test_historico_externaliza_so_as_respostas():
+    armazem = ArmazemArtefatos()
+    historico = HistoricoComArtefatos(InMemoryChatMessageHistory(), armazem)
+    historico.add_user_message("relatório gerencial")
+    historico.add_ai_message(RELATORIO)
+    pergunta, resposta = historico.messages
+    assert pergunta.content == "relatório gerencial"
+    assert resposta.content.startswith("[artefato:") and len(armazem.itens) == 1
+    historico.clear()
+    assert historico.messages == [] and not armazem.itens
+
+
+def test_guardar_artefato_sem_armazem_devolve_o_conteudo():
+    definir_armazem(None)
+    assert guardar_artefato('html', RELATORIO, "Relatório") == RELATORIO
+    armazem = ArmazemArtefatos()
+    definir_armazem(armazem)
+    try:
+        referencia = guardar_artefato('html', RELATORIO, "Relatório")
+    finally:
+        definir_armazem(None)
+    assert referencia.endswith("] Relatório") and armazem.expandir(referencia) == RELATORIO
@@ -0,0 +1,63 @@
+# test_cache_respostas.py
+# Chave do cache de respostas: perguntas equivalentes batem, perguntas diferentes não colidem.
+
+import pytest
+
+from cache_respostas import CacheRespostas, texto_canonico
+from roteador_intencoes import normalizar_texto
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheRespostas(caminho=str(tmp_path / "cache.db"), funcao_versao=lambda: (1,))
+
+
+@pytest.mark.parametrize("pergunta_a, pergunta_b", [
+    ("top 5 clientes em maio de 2023", "top clientes em maio de 2023"),
+    ("vendas offshore 2023 e naval 2024", "vendas naval 2023 e offshore 2024"),
+    ("faturamento 2023 menos 2024", "faturamento 2024 menos 2023"),
+    ("vendas naval naval 2023", "vendas naval 2023"),
+])
+def test_perguntas_diferentes_nao_colidem(cache, pergunta_a, pergunta_b):
+    assert cache.chave(pergunta_a) != cache.chave(pergunta_b)
+
+
+@pytest.mark.parametrize("pergunta_a, pergunta_b", [
+    ("Quanto vendemos em Maio de 2024?", "vendas maio 2024"),
+    ("Faturamento Líquido Naval 2023", "faturamento liquido naval 2023"),
+])
+def test_perguntas_equivalentes_mesma_chave(cache, pergunta_a, pergunta_b):
+    assert cache.chave(pergunta_a) == cache.chave(pergunta_b)
+
+
+def test_texto_canonico_mantem_ordem():
+    assert texto_canonico(normalizar_texto("Quanto vendemos em Maio de 2024?")) == "vendas mes_5 2024"
+
+
+def test_versao_dos_dados_muda_a_chave(tmp_path):
+    versao = [1]
+    cache = CacheRespostas(caminho=str(tmp_path / "cache.db"), funcao_versao=lambda: tuple(versao))
+    chave = cache.chave("vendas naval 2023")
+    versao[0] = 2
+    assert cache.chave("vendas naval 2023") != chave
+
+
+def test_pergunta_de_continuacao_nao_usa_cache(cache):
+    assert cache.chave("e em 2023?", turnos_anteriores=1) is None
+    assert cache.chave("compare isso com naval", turnos_anteriores=2) is None
+    assert cache.chave("vendas naval 2023", turnos_anteriores=1) is not None
+
+
+def test_guardar_e_obter(cache):
+    chave = cache.chave("vendas naval 2023")
+    assert cache.obter(chave) is None
+    assert cache.guardar(chave, "vendas naval 2023", "As vendas Naval em 2023 foram R$ 10,00.")
+    assert cache.obter(chave) == "As vendas Naval em 2023 foram R$ 10,00."
+    assert not cache.guardar(chave, "vendas naval 2023", "Desculpe, encontrei um erro técnico.")
+
+
+def test_resposta_expirada_sai(tmp_path):
+    cache = CacheRespostas(caminho=str(tmp_path / "cache.db"), ttl_s=-1, funcao_versao=lambda: (1,))
+    chave = cache.chave("vendas naval 2023")
+    cache.guardar(chave, "vendas naval 2023", "R$ 10,00")
+    assert cache.obter(chave) is None
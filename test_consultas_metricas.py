@@ -0,0 +1,67 @@
+# test_consultas_metricas.py
+# Cubo de métricas x tabela principal: o cubo montado na ingestão responde igual às consultas
+# na tabela bruta, e a verificação aponta quando não responde.
+
+import sqlite3
+
+import pytest
+
+from consultas_metricas import (
+    NOME_TABELA_CUBO, NOME_TABELA_PRINCIPAL_SQL, consulta_metrica, consulta_metrica_cubo, construir_cubo_metricas,
+    verificar_consistencia_cubo,
+)
+
+COLUNAS = ('servico_regime', 'valor_venda_total', 'valor_venda_servico_desc', 'atendimento_andamento', 'data_recebimento_po',
+           'data_faturamento', 'data_liberacao_bm', 'data_envio_relatorios', 'data_final_atendimento')
+LINHAS = [
+    ('Naval', 100.0, 90.0, 'Finalizado Com Faturamento', '2023-01-10', '2023-02-01', None, '2023-01-20', '2023-01-15'),
+    ('Naval', 250.5, 200.0, 'Falta Recebimento', '2023-05-03', '2023-05-30', '2023-06-01', '2023-05-10', '2023-05-05'),
+    ('Offshore', 80.0, 70.0, 'Em Andamento', '2024-05-07', '2024-06-02', None, '2024-05-20', '2024-05-12'),
+    ('Offshore', 40.25, 40.25, 'Finalizado Com Faturamento', None, '2024-05-15', None, None, '2024-04-01'),
+    (None, 10.0, 10.0, 'Finalizado Com Faturamento', '2024-01-02', '2024-01-05', None, '2024-01-03', None),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(f"CREATE TABLE {NOME_TABELA_PRINCIPAL_SQL} ({', '.join(COLUNAS)})")
+    conn.executemany(f"INSERT INTO {NOME_TABELA_PRINCIPAL_SQL} VALUES ({', '.join('?' * len(COLUNAS))})", LINHAS)
+    conn.commit()
+    construir_cubo_metricas(conn)
+    yield conn
+    conn.close()
+
+
+def test_cubo_consistente_com_a_tabela(conn):
+    assert verificar_consistencia_cubo(conn) == []
+
+
+@pytest.mark.parametrize("metrica, periodo, regime, args", [
+    ('vendas', 'total', None, {}),
+    ('vendas', 'ano', 'Naval', {'ano': 2023}),
+    ('faturamento_bruto', 'mes', 'Offshore', {'ano': 2024, 'mes': 5}),
+    ('faturamento_liquido', 'por_mes', None, {}),
+    ('bms_pendentes', 'total', None, {}),
+    ('relatorios_pendentes', 'ano', None, {'ano': 2024}),
+])
+def test_cubo_responde_igual_a_tabela(conn, metrica, periodo, regime, args):
+    bruto = conn.execute(*consulta_metrica(metrica, periodo, regime, **args)).fetchall()
+    cubo = conn.execute(*consulta_metrica_cubo(metrica, periodo, regime, **args)).fetchall()
+    assert [tuple(linha) for linha in cubo] == [tuple(pytest.approx(v) if isinstance(v, float) else v for v in linha) for linha in bruto]
+
+
+def test_verificacao_aponta_cubo_divergente(conn):
+    conn.execute(f"UPDATE {NOME_TABELA_CUBO} SET valor = valor + 1 WHERE metrica = 'vendas' AND regime = 'Naval'")
+    divergencias = verificar_consistencia_cubo(conn)
+    assert divergencias
+    assert all(d.startswith('vendas/') for d in divergencias)
+
+
+def test_reconstruir_cubo_acompanha_a_tabela(conn):
+    conn.execute(f"DELETE FROM {NOME_TABELA_PRINCIPAL_SQL} WHERE servico_regime = 'Offshore'")
+    conn.commit()
+    assert verificar_consistencia_cubo(conn) # Cubo antigo ainda tem Offshore
+    construir_cubo_metricas(conn)
+    assert verificar_consistencia_cubo(conn) == []
+    assert conn.execute(f"SELECT COUNT(*) FROM {NOME_TABELA_CUBO} WHERE regime = 'Offshore'").fetchone()[0] == 0
@@ -0,0 +1,77 @@
+# test_memoria_conversa.py
+# Memória com orçamento de tokens, alimentada como o assistente_app alimenta: o app grava a
+# pergunta no histórico, o agente lê a memória e o AgentExecutor chama save_context no fim.
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+
+from memoria_conversa import MemoriaOrcamentoTokens, _turnos
+
+SAUDACAO = "Olá! Eu sou a Marina, sua assistente de dados da Supply Marine. Como posso te ajudar hoje?"
+
+
+def _nova_memoria(**kwargs):
+    historico = InMemoryChatMessageHistory()
+    historico.add_ai_message(SAUDACAO)
+    return MemoriaOrcamentoTokens(chat_memory=historico, memory_key="chat_history", return_messages=True, **kwargs)
+
+
+def _turno_do_app(memoria, pergunta, resposta):
+    """Mesma sequência do app: add_user_message, leitura da memória pelo agente, save_context."""
+    memoria.chat_memory.add_user_message(pergunta)
+    carregado = memoria.load_memory_variables({"input": pergunta})["chat_history"]
+    memoria.save_context({"input": pergunta}, {"output": resposta})
+    if memoria._resumo_em_andamento is not None:
+        memoria._resumo_em_andamento.result()
+    return carregado
+
+
+def test_pergunta_gravada_pelo_app_nao_duplica():
+    memoria = _nova_memoria()
+    _turno_do_app(memoria, "pergunta 0", "resposta 0")
+    tipos = [m.type for m in memoria.chat_memory.messages]
+    assert tipos == ["ai", "human", "ai"]
+
+
+def test_turnos_recentes_inteiros_e_pergunta_atual_fora():
+    memoria = _nova_memoria()
+    for i in range(4):
+        _turno_do_app(memoria, f"pergunta {i}", f"resposta {i}")
+    memoria.chat_memory.add_user_message("pergunta 4")
+    carregado = memoria.load_memory_variables({"input": "pergunta 4"})["chat_history"]
+    conteudos = [m.content for m in carregado if m.type != "system"]
+    assert conteudos == ["pergunta 1", "resposta 1", "pergunta 2", "resposta 2", "pergunta 3", "resposta 3"]
+    assert "pergunta 4" not in " ".join(str(m.content) for m in carregado)
+
+
+def test_resumo_sem_linhas_vazias():
+    memoria = _nova_memoria()
+    for i in range(5):
+        _turno_do_app(memoria, f"pergunta {i}", f"resposta {i}")
+    assert memoria.turnos_resumidos == 3 # Saudação + perguntas 0 e 1
+    assert memoria.resumo.splitlines() == ["- Usuário: pergunta 0 → Marina: resposta 0",
+                                           "- Usuário: pergunta 1 → Marina: resposta 1"]
+    carregado = memoria.load_memory_variables({"input": "pergunta 5"})["chat_history"]
+    assert carregado[0].type == "system" and "pergunta 1 → Marina: resposta 1" in carregado[0].content
+
+
+def test_historico_antigo_com_pergunta_duplicada_vira_um_turno():
+    historico = InMemoryChatMessageHistory()
+    historico.add_ai_message(SAUDACAO)
+    for i in range(2):
+        historico.add_user_message(f"pergunta {i}")
+        historico.add_user_message(f"pergunta {i}")
+        historico.add_ai_message(f"resposta {i}")
+    turnos = _turnos(historico.messages)
+    assert [[m.content for m in turno] for turno in turnos[1:]] == [["pergunta 0", "resposta 0"], ["pergunta 1", "resposta 1"]]
+
+
+def test_tabela_grande_perde_payload_antes_de_sair():
+    tabela = "| Mes | Total |\n|---|---|\n" + "".join(f"| 2023-{m:02d} | R$ {m * 1000:,.2f} |\n" for m in range(1, 13)) * 20
+    memoria = _nova_memoria(max_tokens=400)
+    _turno_do_app(memoria, "vendas por mês", "Aqui estão as vendas:\n" + tabela)
+    _turno_do_app(memoria, "e o total?", "O total é R$ 78.000,00.")
+    carregado = memoria.load_memory_variables({"input": "outra"})["chat_history"]
+    textos = [str(m.content) for m in carregado]
+    assert "vendas por mês" in textos
+    assert any("omitida" in t for t in textos) and not any("2023-07" in t for t in textos)
+    assert memoria.ultimo_total_tokens <= 400
@@ -0,0 +1,82 @@
+# test_roteador_intencoes.py
+# Roteador de intenções: quais perguntas viram chamada direta de ferramenta e quais seguem para o agente.
+
+import pytest
+
+from roteador_intencoes import FERRAMENTA_METRICAS, FERRAMENTA_RELATORIO, RoteadorIntencoes, interpretar, normalizar_texto
+
+
+@pytest.mark.parametrize("pergunta, argumentos", [
+    ("vendas naval 2023", {'metric': 'vendas', 'regime': 'Naval', 'year': 2023}),
+    ("Quanto vendemos em 2024?", {'metric': 'vendas', 'year': 2024}),
+    ("Faturamento Líquido, Maio/2024?", {'metric': 'faturamento_liquido', 'year': 2024, 'month': '5'}),
+    ("faturamento offshore 05/2023", {'metric': 'faturamento_bruto', 'regime': 'Offshore', 'year': 2023, 'month': '5'}),
+    ("BMs pendentes por mês", {'metric': 'bms_pendentes', 'group_by': 'mes'}),
+    ("relatórios pendentes naval", {'metric': 'relatorios_pendentes', 'regime': 'Naval'}),
+])
+def test_perguntas_roteadas_para_get_metric(pergunta, argumentos):
+    rota = interpretar(pergunta)
+    assert rota.ferramenta == FERRAMENTA_METRICAS
+    assert rota.argumentos == argumentos
+    assert rota.confianca == 1.0
+
+
+@pytest.mark.parametrize("pergunta", ["relatório gerencial", "Marina, relatório do dia"])
+def test_relatorio_gerencial(pergunta):
+    rota = interpretar(pergunta)
+    assert (rota.ferramenta, rota.argumentos) == (FERRAMENTA_RELATORIO, {})
+
+
+@pytest.mark.parametrize("pergunta, motivo", [
+    ("", 'vazia'),
+    ("top clientes de vendas em 2023", 'palavras_desconhecidas'),
+    ("faturamento liquido e bruto 2023", 'multiplas_metricas'),
+    ("vendas e faturamento 2023", 'multiplas_metricas'),
+    ("vendas naval 2023 e 2024", 'multiplos_filtros'),
+    ("vendas em maio", 'periodo_sem_ferramenta'),
+    ("relatorio naval 2023", 'ambigua'),
+    ("qual o cliente com mais atendimentos", 'sem_metrica'),
+    ("vendas " * 16, 'longa'),
+])
+def test_perguntas_repassadas_ao_agente(pergunta, motivo):
+    rota = interpretar(pergunta)
+    assert rota.ferramenta is None
+    assert rota.motivo == motivo
+
+
+def test_normalizar_texto():
+    assert normalizar_texto("Faturamento Líquido, Maio/2024?") == "faturamento liquido maio/2024"
+
+
+class _Ferramenta:
+    def __init__(self, resposta=None, erro=None):
+        self.resposta, self.erro, self.chamadas = resposta, erro, []
+
+    def invoke(self, argumentos):
+        self.chamadas.append(argumentos)
+        if self.erro:
+            raise self.erro
+        return self.resposta
+
+
+def test_roteador_chama_a_ferramenta_e_conta():
+    ferramenta = _Ferramenta("Vendas Naval em 2023: R$ 10,00")
+    roteador = RoteadorIntencoes({FERRAMENTA_METRICAS: ferramenta})
+    assert roteador.responder("vendas naval 2023") == "Vendas Naval em 2023: R$ 10,00"
+    assert roteador.responder("top clientes de vendas em 2023") is None
+    assert ferramenta.chamadas == [{'metric': 'vendas', 'regime': 'Naval', 'year': 2023}]
+    estatisticas = roteador.estatisticas()
+    assert (estatisticas['perguntas'], estatisticas['roteadas']) == (2, 1)
+    assert estatisticas['motivos_repasse'] == {'palavras_desconhecidas': 1}
+
+
+def test_falha_da_ferramenta_repassa_ao_agente():
+    roteador = RoteadorIntencoes({FERRAMENTA_METRICAS: _Ferramenta(erro=RuntimeError("banco indisponível"))})
+    assert roteador.responder("vendas naval 2023") is None
+    assert roteador.estatisticas()['motivos_repasse'] == {'erro_ferramenta': 1}
+
+
+def test_ferramenta_ausente_repassa_ao_agente():
+    roteador = RoteadorIntencoes({})
+    assert roteador.responder("relatório gerencial") is None
+    assert roteador.estatisticas()['motivos_repasse'] == {'ferramenta_indisponivel': 1}
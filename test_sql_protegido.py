@@ -0,0 +1,110 @@
+# test_sql_protegido.py
+# Custo estimado pelo EXPLAIN QUERY PLAN (o que decide se o SQL livre do LLM roda) e as
+# proteções de leitura/tamanho, em bases SQLite de teste (memória e arquivo temporário).
+
+import sqlite3
+
+import pytest
+
+import sql_protegido
+from conexao_sqlite import PoolConexoesLeitura
+from sql_protegido import FATOR_BUSCA_INDICE, ResultadoConsulta, _autorizar, consultar, custo_estimado, executar_sql_protegido
+
+LINHAS = {'t': 1000, 'u': 500}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+    conn.execute("CREATE TABLE u (a INTEGER, b TEXT)")
+    conn.execute("CREATE INDEX iu ON u (a)")
+    yield conn
+    conn.close()
+
+
+def _custo(conn, query):
+    return custo_estimado(conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall(), LINHAS)
+
+
+def test_scan_simples(conn):
+    assert _custo(conn, "SELECT * FROM t WHERE b = 'x'") == 1000
+
+
+def test_produto_cartesiano_multiplica(conn):
+    assert _custo(conn, "SELECT * FROM t, u") == 1000 * 500
+
+
+def test_alias_conta_como_a_maior_tabela(conn):
+    assert _custo(conn, "SELECT * FROM t, t AS t2") == 1000 * 1000
+
+
+def test_busca_por_indice_no_laco(conn):
+    assert _custo(conn, "SELECT * FROM t JOIN u ON u.a = t.a") == 1000 * FATOR_BUSCA_INDICE
+
+
+def test_partes_de_union_somam(conn):
+    assert _custo(conn, "SELECT b FROM t UNION ALL SELECT b FROM u") == 1000 + 500
+
+
+def test_subconsulta_correlacionada_roda_por_linha(conn):
+    assert _custo(conn, "SELECT (SELECT COUNT(*) FROM u WHERE u.b = t.b) FROM t") == 500 * 1000 + 1000
+
+
+def test_linha_constante_nao_custa(conn):
+    assert _custo(conn, "SELECT 1") == 0
+
+
+def test_autorizador_so_permite_leitura(conn):
+    conn.set_authorizer(_autorizar)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    for comando in ("DELETE FROM t", "PRAGMA query_only = 0", "ATTACH ':memory:' AS outro", "CREATE TABLE v (a)"):
+        with pytest.raises(sqlite3.DatabaseError, match="not authorized"):
+            conn.execute(comando)
+
+
+def test_texto_do_resultado_avisa_corte():
+    resultado = ResultadoConsulta(colunas=['a'], linhas=[(1,), (2,)], truncado='2 linhas')
+    texto = resultado.como_texto()
+    assert texto.startswith("Colunas: a\n[(1,), (2,)]")
+    assert "truncado em 2 linhas" in texto
+    assert ResultadoConsulta(colunas=['a', 'b']).como_texto() == "Nenhuma linha retornada. Colunas: a, b"
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco em arquivo com 3000 linhas, lido pelo pool de leitura de verdade (só o caminho muda)."""
+    caminho = str(tmp_path / "dados.db")
+    with sqlite3.connect(caminho) as escrita:
+        escrita.execute("CREATE TABLE t (a INTEGER, b TEXT)")
+        escrita.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"linha {i}") for i in range(3000)])
+    pool = PoolConexoesLeitura(caminho)
+    monkeypatch.setattr(sql_protegido, 'conexao_leitura', pool.conexao)
+    monkeypatch.setattr(sql_protegido, 'versao_banco', pool.versao_banco)
+    monkeypatch.setitem(sql_protegido._linhas_por_tabela, 'versao', None)
+    yield caminho
+    pool.reset()
+
+
+def test_consulta_dentro_dos_limites(banco):
+    resultado = consultar("SELECT COUNT(*), SUM(a) FROM t")
+    assert resultado.linhas == [(3000, sum(range(3000)))]
+    assert resultado.truncado is None
+    assert resultado.custo_estimado == 3000
+
+
+def test_resultado_cortado_em_linhas(banco):
+    resultado = consultar("SELECT a FROM t", max_linhas=50)
+    assert len(resultado.linhas) == 50
+    assert resultado.truncado == "50 linhas"
+
+
+def test_produto_cartesiano_recusado_antes_de_rodar(banco):
+    texto = executar_sql_protegido("SELECT COUNT(*) FROM t, t AS t2, t AS t3", isolado=False)
+    assert texto.startswith("Erro: Consulta recusada: custo estimado")
+
+
+def test_escrita_recusada(banco):
+    assert executar_sql_protegido("DELETE FROM t", isolado=False) == "Erro: Apenas consultas SELECT de leitura são permitidas."
+    with sqlite3.connect(banco) as leitura:
+        assert leitura.execute("SELECT COUNT(*) FROM t").fetchone() == (3000,)